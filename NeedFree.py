@@ -2,14 +2,16 @@ from concurrent.futures import ThreadPoolExecutor, wait, ALL_COMPLETED
 import requests
 import datetime
 import queue
-import time
 import json
 import pytz
-import bs4
+
+from search_parser import parse_search_results
+from rate_limiter import get_host_limiter
 
 
 API_URL_TEMPLATE = "https://store.steampowered.com/search/results/?query&start={pos}&count=100&infinite=1"
 THREAD_CNT = 8
+FETCH_MAX_ATTEMPTS = 10
 
 free_list = queue.Queue()
 
@@ -17,17 +19,23 @@ def fetch_Steam_json_response(url):
     ''' Fetch json response from Steam API
     URL:            Steam WebAPI url
 
-    return:         json content
+    return:         json content, None after FETCH_MAX_ATTEMPTS failed attempts
     '''
-    while True:
+    limiter = get_host_limiter(url)
+    for attempt in range(FETCH_MAX_ATTEMPTS):
+        # Вместо фиксированной паузы 10 с частоту повторов задает общий AIMD-ограничитель хоста
+        limiter.acquire_blocking()
         try:
             with requests.get(url, timeout = 5) as response:
+                limiter.observe(response.status_code, response.headers.get('Retry-After'))
                 ret_json = response.json()
             return ret_json
         except Exception as e:
+            # Ошибка сети или ответ не в JSON (например, страница ошибки): снижаем частоту
             print(e)
-            time.sleep(10)
-            continue
+            limiter.observe_error()
+    print("fetch_Steam_json_response: giving up on %s after %d attempts" % (url, FETCH_MAX_ATTEMPTS))
+    return None
 
 def get_free_goods(start, append_list = False):
     ''' Extract 100%-discount goods list in a list of 100 products
@@ -45,13 +53,9 @@ def get_free_goods(start, append_list = False):
         try:
             goods_count = response_json["total_count"]
             goods_html = response_json["results_html"]
-            page_parser = bs4.BeautifulSoup(goods_html, "html.parser")
-            full_discounts_div = page_parser.find_all(name = "div", attrs = {"class":"search_discount_block", "data-discount":"100"})
             sub_free_list = [
-                [
-                    div.parent.parent.parent.parent.find(name = "span", attrs = {"class":"title"}).get_text(),
-                    div.parent.parent.parent.parent.get("href"),
-                ] for div in full_discounts_div
+                [row["title"], row["url"]]
+                for row in parse_search_results(goods_html) if row["discount"] == 100
             ]
 
             if append_list:
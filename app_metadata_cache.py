@@ -0,0 +1,159 @@
+"""
+Кэш метаданных игр Steam (название, жанры, цена)
+Держит горячие записи в памяти (LRU) поверх таблицы app_metadata в SQLite.
+Название и жанры меняются редко и живут APP_METADATA_STATIC_TTL,
+цена - APP_METADATA_PRICE_TTL и привязана к региону (cc)
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+from config import APP_METADATA_CACHE_SIZE, APP_METADATA_STATIC_TTL, APP_METADATA_PRICE_TTL
+from database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+
+class AppMetadataCache:
+    """LRU-кэш метаданных игр с сохранением в SQLite"""
+
+    def __init__(self, db: DatabaseManager, max_entries: int = APP_METADATA_CACHE_SIZE,
+                 static_ttl: int = APP_METADATA_STATIC_TTL, price_ttl: int = APP_METADATA_PRICE_TTL):
+        self.db = db
+        self.max_entries = max_entries
+        self.static_ttl = static_ttl
+        self.price_ttl = price_ttl
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        # Кэш используется и из потока планировщика, и из основного event loop
+        self._lock = threading.Lock()
+
+    def _remember(self, app_id: str, entry: Dict):
+        """Кладет запись в память и вытесняет самые старые"""
+        with self._lock:
+            self._entries[app_id] = entry
+            self._entries.move_to_end(app_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_entries(self, app_ids: List[str]) -> Dict[str, Dict]:
+        """Записи из памяти, недостающие - из базы данных"""
+        found = {}
+        missing = []
+        with self._lock:
+            for app_id in app_ids:
+                entry = self._entries.get(app_id)
+                if entry is None:
+                    missing.append(app_id)
+                else:
+                    self._entries.move_to_end(app_id)
+                    found[app_id] = entry
+
+        if missing:
+            for app_id, entry in self.db.get_app_metadata(missing).items():
+                self._remember(app_id, entry)
+                found[app_id] = entry
+        return found
+
+    def _is_static_fresh(self, entry: Dict, now: float) -> bool:
+        return bool(entry.get('name')) and now - (entry.get('static_updated_at') or 0) < self.static_ttl
+
+    def _is_price_fresh(self, entry: Dict, cc: str, now: float, ttl: float) -> bool:
+        return entry.get('price_cc') == cc and now - (entry.get('volatile_updated_at') or 0) < ttl
+
+    def get_static(self, app_ids: List[str]) -> Dict[str, Dict]:
+        """Свежие название и жанры: app_id -> {'name', 'genres'}"""
+        now = time.time()
+        return {
+            app_id: {'name': entry['name'], 'genres': entry.get('genres') or []}
+            for app_id, entry in self._get_entries([str(a) for a in app_ids]).items()
+            if self._is_static_fresh(entry, now)
+        }
+
+    def get_names(self, app_ids: List[str]) -> Dict[str, str]:
+        """Свежие названия игр: app_id -> название"""
+        return {app_id: entry['name'] for app_id, entry in self.get_static(app_ids).items()}
+
+    def get_prices(self, app_ids: List[str], cc: str = 'ru', max_age: Optional[float] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Свежие цены для региона cc
+
+        Игры без цены (бесплатные) тоже возвращаются - со значением None,
+        чтобы не запрашивать их у Steam повторно до истечения TTL.
+        max_age сокращает TTL цены для вызывающего, которому нужны более свежие данные.
+        """
+        now = time.time()
+        ttl = self.price_ttl if max_age is None else min(self.price_ttl, max_age)
+        return {
+            app_id: entry.get('price')
+            for app_id, entry in self._get_entries([str(a) for a in app_ids]).items()
+            if self._is_price_fresh(entry, cc, now, ttl)
+        }
+
+    def find_by_name(self, name: str) -> Optional[Dict]:
+        """Ищет игру по точному названию: {'app_id', 'name', 'genres'} или None"""
+        if not name:
+            return None
+        found = self.db.find_app_metadata_by_name(name.strip())
+        if not found:
+            return None
+        app_id, entry = found
+        if not self._is_static_fresh(entry, time.time()):
+            return None
+        self._remember(app_id, entry)
+        return {'app_id': app_id, 'name': entry['name'], 'genres': entry.get('genres') or []}
+
+    def update_static(self, entries: Dict[str, Dict]):
+        """Сохраняет название и жанры: app_id -> {'name', 'genres'}"""
+        entries = {str(app_id): data for app_id, data in entries.items() if data.get('name')}
+        if not entries:
+            return
+
+        now = time.time()
+        existing = self._get_entries(list(entries))
+        for app_id, data in entries.items():
+            entry = dict(existing.get(app_id, {}))
+            entry['name'] = data['name']
+            if data.get('genres') is not None:
+                entry['genres'] = data['genres']
+            entry['static_updated_at'] = now
+            self._remember(app_id, entry)
+
+        self.db.save_app_static_metadata(entries, now)
+
+    def update_prices(self, prices: Dict[str, Optional[Dict]], cc: str = 'ru'):
+        """Сохраняет цены для региона cc (None - у игры нет цены)"""
+        prices = {str(app_id): price for app_id, price in prices.items()}
+        if not prices:
+            return
+
+        now = time.time()
+        existing = self._get_entries(list(prices))
+        for app_id, price in prices.items():
+            entry = dict(existing.get(app_id, {}))
+            entry['price'] = price
+            entry['price_cc'] = cc
+            entry['volatile_updated_at'] = now
+            self._remember(app_id, entry)
+
+        self.db.save_app_prices(prices, cc, now)
+
+
+_shared_cache: Optional[AppMetadataCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_app_metadata_cache(db: Optional[DatabaseManager] = None) -> AppMetadataCache:
+    """
+    Общий для всего бота экземпляр кэша метаданных
+
+    Бот передает свой DatabaseManager при старте, чтобы кэш не открывал
+    второй набор соединений и не запускал миграции повторно. Без него
+    (скрипты, тесты) кэш создает собственную базу.
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None or (db is not None and _shared_cache.db is not db):
+            _shared_cache = AppMetadataCache(db or DatabaseManager())
+        return _shared_cache
@@ -0,0 +1,67 @@
+"""
+Асинхронная обертка над DatabaseManager
+Все запросы к SQLite выполняются в отдельном потоке базы данных,
+поэтому обработчики бота не блокируют event loop на дисковом I/O
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict
+
+from config import SUBSCRIBERS_BATCH_SIZE
+from database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabase:
+    """
+    Awaitable-версии методов DatabaseManager
+
+    await async_db.get_user_language(user_id) вызывает db.get_user_language
+    в потоке базы данных. Поток один: запросы выполняются по очереди
+    и используют одно соединение из пула DatabaseManager.
+    """
+
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='database')
+
+    def __getattr__(self, name: str):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        async def wrapper(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
+
+        wrapper.__name__ = name
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+
+    async def iter_subscribers_with_settings(self, batch_size: int = SUBSCRIBERS_BATCH_SIZE) -> AsyncIterator[Dict]:
+        """
+        Асинхронно перебирает подписчиков с настройками
+
+        Следующая пачка читается из базы только когда предыдущая обработана,
+        поэтому рассылка на 100k подписчиков не держит их всех в памяти.
+        """
+        loop = asyncio.get_running_loop()
+        batches = self.db.iter_subscriber_batches(batch_size)
+        try:
+            while True:
+                batch = await loop.run_in_executor(self._executor, next, batches, None)
+                if batch is None:
+                    break
+                for subscriber in batch:
+                    yield subscriber
+        finally:
+            await loop.run_in_executor(self._executor, batches.close)
+
+    async def close(self):
+        """Дожидается незавершенных запросов и закрывает соединения"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.db.close)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк отзывчивости бота во время рендера графиков цен:
+задержка обработки простых обновлений (p50/p99), пока рисуются 20 графиков,
+при рендере прямо в event loop и в пуле процессов ChartRenderPool
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from chart_renderer import ChartRenderPool
+from price_chart_generator import PriceChartGenerator
+from test_chart_renderer import sample_price_data
+
+UPDATE_INTERVAL = 0.005  # Обновления Telegram приходят каждые 5 мс
+
+
+async def handler_latencies(render_all):
+    """Задержки обработки обновлений, пока выполняется render_all()"""
+    latencies = []
+    done = False
+
+    async def updates():
+        while not done:
+            expected = time.perf_counter() + UPDATE_INTERVAL
+            await asyncio.sleep(UPDATE_INTERVAL)
+            # Простой обработчик: задержка - насколько позже срока он начал работу
+            latencies.append(time.perf_counter() - expected)
+
+    updates_task = asyncio.create_task(updates())
+    started = time.perf_counter()
+    await render_all()
+    elapsed = time.perf_counter() - started
+    done = True
+    await updates_task
+    return latencies, elapsed
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(name, latencies, elapsed, charts):
+    print(f"   {name:>16}: p50 {percentile(latencies, 0.5) * 1000:7.1f} мс, "
+          f"p99 {percentile(latencies, 0.99) * 1000:7.1f} мс, "
+          f"макс. {max(latencies) * 1000:7.1f} мс, {charts} графиков за {elapsed:.1f} с")
+
+
+async def main():
+    charts = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    price_data = sample_price_data(180)
+    print(f"📊 Графиков одновременно: {charts}, обновления каждые {UPDATE_INTERVAL * 1000:.0f} мс")
+
+    generator = PriceChartGenerator()
+
+    async def inline():
+        for i in range(charts):
+            generator.create_price_chart(f'Game {i}', price_data)
+            await asyncio.sleep(0)
+
+    latencies, elapsed = await handler_latencies(inline)
+    report('в event loop', latencies, elapsed, charts)
+
+    pool = ChartRenderPool(max_pending=charts)
+    pool.start()
+    # Прогрев: процессы уже импортировали matplotlib
+    await asyncio.gather(*(pool.render_chart('warm-up', price_data) for _ in range(pool.workers)))
+
+    async def in_pool():
+        await asyncio.gather(*(pool.render_chart(f'Game {i}', price_data) for i in range(charts)))
+
+    latencies, elapsed = await handler_latencies(in_pool)
+    report(f'пул ({pool.workers} проц.)', latencies, elapsed, charts)
+    print(f"   Средняя задержка в пуле: {statistics.mean(latencies) * 1000:.1f} мс")
+    await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк рейтинга игр для еженедельного дайджеста на 10k синтетических скидок:
+прежний построчный алгоритм, GameScorer.score и пакетный GameScorer.score_many
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from game_scorer import GameScorer
+from test_game_scorer import reference_score, synthetic_deals
+
+
+def measure(name, func, deals, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func(deals)
+    elapsed = (time.perf_counter() - started) / rounds
+    print(f"   {name:>22}: {elapsed * 1000:8.1f} мс - {len(deals) / elapsed:,.0f} игр/с")
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    deals = synthetic_deals(count)
+    scorer = GameScorer()
+
+    print(f"📊 Игр: {count}, повторов: {rounds}")
+    reference = measure('прежний алгоритм', lambda d: [reference_score(deal) for deal in d], deals, rounds)
+    measure('GameScorer.score', lambda d: [scorer.score(deal) for deal in d], deals, rounds)
+    batch = measure('GameScorer.score_many', scorer.score_many, deals, rounds)
+    print(f"🚀 score_many быстрее прежнего алгоритма в {reference / batch:.1f} раз")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк разбора результатов поиска Steam
+Печатает скорость (строк в секунду) каждого доступного бэкенда
+на сохраненных страницах из test_fixtures/steam_search, а также
+объем загруженных страниц на одну подходящую скидку при поиске
+в порядке релевантности и с сортировкой по убыванию скидки
+"""
+
+import asyncio
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rate_limiter import TokenBucket
+from search_parser import BeautifulSoupSearchParser, LXML_AVAILABLE, get_search_parser
+from steam_scraper import SteamScraper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_fixtures', 'steam_search')
+
+
+def load_pages():
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.json'))):
+        with open(path, encoding='utf-8') as fp:
+            pages.append(json.load(fp)['results_html'])
+    return pages
+
+
+def benchmark(parser, pages, rounds):
+    rows = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            rows += len(parser.parse(html))
+    elapsed = time.perf_counter() - started
+    return rows, elapsed
+
+
+class CatalogResponse:
+    def __init__(self, payload):
+        self.status = 200
+        self.payload = payload
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def read(self):
+        return json.dumps(self.payload).encode('utf-8')
+
+
+class CatalogSession:
+    """Постраничная выдача каталога из сохраненных строк поиска"""
+
+    def __init__(self, pages, copies=20):
+        rows = []
+        for html in pages:
+            for row in re.split(r'\n(?=<a )', html):
+                match = re.search(r'data-discount="(\d+)"', row)
+                if match:
+                    rows.append((row, int(match.group(1))))
+        self.rows = rows * copies
+
+    def get(self, url, params=None):
+        rows = self.rows
+        if params['sort_by'] == 'Discount_DESC':
+            rows = sorted(rows, key=lambda row: row[1], reverse=True)
+        page = rows[params['start']:params['start'] + params['count']]
+        return CatalogResponse({'results_html': '\n'.join(row for row, _ in page), 'total_count': len(rows)})
+
+
+def benchmark_bytes_per_deal(pages, min_discount, max_results):
+    """Байт страниц поиска на одну подходящую скидку для разных sort_by"""
+    session = CatalogSession(pages)
+    for sort_by in ('_ASC', 'Discount_DESC'):
+        scraper = SteamScraper()
+        scraper.session = session
+        scraper.search_limiter = TokenBucket(rate=1000, burst=100)
+        original_get = session.get
+        session.get = lambda url, params=None: original_get(url, dict(params, sort_by=sort_by))
+        deals = asyncio.run(scraper._fetch_discounted_games(min_discount, max_results))
+        session.get = original_get
+        per_deal = scraper.bytes_fetched / max(1, len(deals))
+        print(f"   {sort_by:>13}: {len(deals)} скидок от {min_discount}%, "
+              f"{scraper.bytes_fetched / 1024:,.0f} KB - {per_deal / 1024:.1f} KB на скидку")
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    pages = load_pages()
+    parsers = [BeautifulSoupSearchParser()]
+    if LXML_AVAILABLE:
+        parsers.append(get_search_parser('lxml'))
+
+    print(f"📊 Страниц: {len(pages)}, повторов: {rounds}")
+    results = {}
+    for parser in parsers:
+        rows, elapsed = benchmark(parser, pages, rounds)
+        results[parser.name] = rows / elapsed
+        print(f"   {parser.name:>5}: {rows} строк за {elapsed:.2f} с - {rows / elapsed:,.0f} строк/с")
+
+    if 'lxml' in results:
+        print(f"🚀 lxml быстрее в {results['lxml'] / results['bs4']:.1f} раз")
+
+    print("📦 Объем страниц поиска на одну скидку:")
+    benchmark_bytes_per_deal(pages, min_discount=70, max_results=100)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Рассылки сообщений подписчикам
+Получатели группируются по варианту сообщения (язык, профиль фильтров):
+каждый вариант рендерится и разбивается на части один раз, а готовый
+список частей переиспользуется для всех получателей этого варианта.
+BroadcastEngine отправляет сообщения параллельно под общим лимитом Telegram
+через очередь в базе данных, поэтому прерванная рассылка продолжается
+после перезапуска
+"""
+import asyncio
+import json
+import logging
+from datetime import timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from config import (
+    BROADCAST_RATE, BROADCAST_WORKERS, BROADCAST_PER_CHAT_INTERVAL,
+    BROADCAST_MAX_RETRIES, BROADCAST_RETRY_BACKOFF, SUBSCRIBERS_BATCH_SIZE
+)
+from rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MESSAGE_LIMIT = 4000  # Запас до лимита Telegram в 4096 символов
+
+
+def language_key(subscriber: Dict) -> str:
+    """Вариант сообщения, зависящий только от языка"""
+    return subscriber['language']
+
+
+def filter_profile_key(subscriber: Dict) -> Tuple[str, int, Tuple[str, ...]]:
+    """Вариант сообщения по языку, минимальной скидке и жанрам"""
+    return subscriber['language'], subscriber['min_discount'], tuple(sorted(subscriber['genres']))
+
+
+class BroadcastRenderer:
+    """Рендерит каждый вариант сообщения рассылки один раз"""
+
+    def __init__(self, render: Callable[[Hashable], Awaitable[Optional[str]]],
+                 split: Callable[[str, int], List[str]], max_length: int = TELEGRAM_MESSAGE_LIMIT):
+        """
+        Args:
+            render: корутина, возвращающая текст варианта (None - нечего отправлять)
+            split: функция разбиения длинного сообщения на части
+            max_length: максимальная длина одной части
+        """
+        self.render = render
+        self.split = split
+        self.max_length = max_length
+        self._variants: Dict[Hashable, asyncio.Task] = {}
+
+    async def _render_chunks(self, key: Hashable) -> List[str]:
+        message = await self.render(key)
+        if not message:
+            return []
+        if len(message) > self.max_length:
+            return self.split(message, self.max_length)
+        return [message]
+
+    async def get_chunks(self, key: Hashable) -> List[str]:
+        """
+        Части сообщения для варианта key
+
+        Параллельные запросы одного варианта ждут один и тот же рендер.
+        """
+        task = self._variants.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render_chunks(key))
+            self._variants[key] = task
+        return await task
+
+    @property
+    def variant_count(self) -> int:
+        return len(self._variants)
+
+
+# Ошибки BadRequest, после которых писать в чат бессмысленно
+PERMANENT_BAD_REQUESTS = ('chat not found', 'user is deactivated', 'peer_id_invalid')
+
+
+class BroadcastEngine:
+    """
+    Отправка рассылок с общим лимитом скорости, повторами и очередью в базе
+
+    Статусы получателя в очереди: pending - ждет отправки, sent - отправлено,
+    skipped - для его фильтров нечего отправлять, failed - временная ошибка
+    не прошла после повторов, blocked - бот заблокирован (подписка снимается).
+    """
+
+    def __init__(self, bot, async_db, rate: float = BROADCAST_RATE, workers: int = BROADCAST_WORKERS,
+                 per_chat_interval: float = BROADCAST_PER_CHAT_INTERVAL):
+        self.bot = bot
+        self.async_db = async_db
+        self.workers = workers
+        self.per_chat_interval = per_chat_interval
+        # Один лимит на все рассылки бота
+        self.limiter = TokenBucket(rate, burst=int(rate))
+
+    async def run(self, kind: str, recipients: Callable[[], AsyncIterator[Dict]],
+                  variant_key: Callable[[Dict], Any], render: Callable[[Any], Awaitable[Optional[str]]],
+                  split: Callable[[str, int], List[str]]) -> Dict[str, int]:
+        """
+        Выполняет (или продолжает после перезапуска) рассылку типа kind
+
+        Args:
+            recipients: функция, возвращающая поток подписчиков с настройками
+            variant_key: ключ варианта сообщения для подписчика (сериализуется в JSON)
+            render: корутина, формирующая текст варианта по ключу
+            split: функция разбиения длинного сообщения на части
+
+        Returns:
+            Количество получателей по статусам
+        """
+        broadcast = await self.async_db.get_unfinished_broadcast(kind)
+        if broadcast:
+            broadcast_id = broadcast['id']
+            logger.info(f"Resuming {kind} broadcast {broadcast_id} ({broadcast['status']})")
+        else:
+            broadcast_id = await self.async_db.create_broadcast(kind)
+            broadcast = {'id': broadcast_id, 'status': 'enqueuing'}
+            if broadcast_id is None:
+                return {}
+
+        if broadcast['status'] == 'enqueuing':
+            await self._enqueue(broadcast_id, recipients(), variant_key)
+            await self.async_db.set_broadcast_status(broadcast_id, 'sending')
+
+        async def render_variant(key: str):
+            return await render(json.loads(key))
+
+        renderer = BroadcastRenderer(render_variant, split)
+        await self._send_pending(broadcast_id, renderer)
+        await self.async_db.set_broadcast_status(broadcast_id, 'done')
+
+        stats = await self.async_db.get_broadcast_stats(broadcast_id)
+        logger.info(f"{kind} broadcast {broadcast_id} finished: {stats} ({renderer.variant_count} message variants)")
+        return stats
+
+    async def _enqueue(self, broadcast_id: int, recipients: AsyncIterator[Dict], variant_key: Callable[[Dict], Any]):
+        """Записывает получателей в очередь пачками"""
+        batch: List[Tuple[int, str]] = []
+        async for subscriber in recipients:
+            batch.append((subscriber['user_id'], json.dumps(variant_key(subscriber), ensure_ascii=False)))
+            if len(batch) >= SUBSCRIBERS_BATCH_SIZE:
+                await self.async_db.enqueue_broadcast_recipients(broadcast_id, batch)
+                batch = []
+        if batch:
+            await self.async_db.enqueue_broadcast_recipients(broadcast_id, batch)
+
+    async def _send_pending(self, broadcast_id: int, renderer: BroadcastRenderer):
+        """Раздает неотправленные сообщения воркерам"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+
+        async def worker():
+            while True:
+                entry = await queue.get()
+                try:
+                    if entry is None:
+                        return
+                    await self._deliver(broadcast_id, entry, renderer)
+                except Exception as e:
+                    logger.error(f"Broadcast worker error for user {entry['user_id']}: {e}")
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            after_user_id = 0
+            while True:
+                entries = await self.async_db.get_pending_outbox(broadcast_id, after_user_id)
+                if not entries:
+                    break
+                for entry in entries:
+                    await queue.put(entry)
+                after_user_id = entries[-1]['user_id']
+
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+    async def _deliver(self, broadcast_id: int, entry: Dict, renderer: BroadcastRenderer):
+        """Отправляет все части сообщения одному получателю"""
+        user_id = entry['user_id']
+        chunks_sent = entry['chunks_sent']
+        attempts = entry['attempts']
+        chunks = await renderer.get_chunks(entry['variant_key'])
+
+        if not chunks:
+            await self.async_db.update_outbox_entry(broadcast_id, user_id, 'skipped', chunks_sent, attempts)
+            return
+
+        while chunks_sent < len(chunks):
+            await self.limiter.acquire()
+            try:
+                await self.bot.send_message(chat_id=user_id, text=chunks[chunks_sent], parse_mode='HTML')
+            except RetryAfter as e:
+                # Лимит Telegram: ждут все воркеры, сообщение повторяется,
+                # но не бесконечно - повтор считается попыткой, как и ошибка сети
+                attempts += 1
+                if attempts > BROADCAST_MAX_RETRIES:
+                    logger.warning(f"Giving up on user {user_id} after {attempts} attempts: {e}")
+                    await self.async_db.update_outbox_entry(broadcast_id, user_id, 'failed', chunks_sent, attempts, str(e))
+                    return
+                self.limiter.pause(self._retry_after_seconds(e.retry_after))
+                continue
+            except Forbidden as e:
+                await self._mark_blocked(broadcast_id, user_id, chunks_sent, attempts, str(e))
+                return
+            except BadRequest as e:
+                if any(reason in str(e).lower() for reason in PERMANENT_BAD_REQUESTS):
+                    await self._mark_blocked(broadcast_id, user_id, chunks_sent, attempts, str(e))
+                else:
+                    logger.error(f"Broadcast message rejected for user {user_id}: {e}")
+                    await self.async_db.update_outbox_entry(broadcast_id, user_id, 'failed', chunks_sent, attempts, str(e))
+                return
+            except NetworkError as e:
+                attempts += 1
+                if attempts > BROADCAST_MAX_RETRIES:
+                    logger.warning(f"Giving up on user {user_id} after {attempts} attempts: {e}")
+                    await self.async_db.update_outbox_entry(broadcast_id, user_id, 'failed', chunks_sent, attempts, str(e))
+                    return
+                await asyncio.sleep(BROADCAST_RETRY_BACKOFF * (2 ** (attempts - 1)))
+                continue
+            except TelegramError as e:
+                logger.error(f"Broadcast message failed for user {user_id}: {e}")
+                await self.async_db.update_outbox_entry(broadcast_id, user_id, 'failed', chunks_sent, attempts, str(e))
+                return
+
+            chunks_sent += 1
+            if chunks_sent < len(chunks):
+                # Ограничение Telegram на частоту сообщений в один чат
+                await self.async_db.update_outbox_entry(broadcast_id, user_id, 'pending', chunks_sent, attempts)
+                await asyncio.sleep(self.per_chat_interval)
+
+        await self.async_db.update_outbox_entry(broadcast_id, user_id, 'sent', chunks_sent, attempts)
+
+    async def _mark_blocked(self, broadcast_id: int, user_id: int, chunks_sent: int, attempts: int, error: str):
+        """Пользователь заблокировал бота или удален - снимаем подписку"""
+        logger.info(f"User {user_id} is unreachable ({error}), unsubscribing")
+        await self.async_db.update_outbox_entry(broadcast_id, user_id, 'blocked', chunks_sent, attempts, error)
+        await self.async_db.unsubscribe_user(user_id)
+
+    @staticmethod
+    def _retry_after_seconds(retry_after) -> float:
+        if isinstance(retry_after, timedelta):
+            return retry_after.total_seconds()
+        return float(retry_after)
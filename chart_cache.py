@@ -0,0 +1,113 @@
+"""
+Дисковый кэш готовых графиков цен
+PNG хранится по ключу (app_id, время последнего изменения цены, язык, день):
+пока цена игры не менялась, повторный запрос графика в тот же день - это
+чтение файла вместо рендера matplotlib. День входит в ключ, потому что
+окно дневных агрегатов графика сдвигается каждый день. Общий размер кэша ограничен CHART_CACHE_MAX_BYTES,
+при переполнении удаляются давно не запрашивавшиеся графики (LRU)
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from config import CHART_CACHE_DIR, CHART_CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+def chart_cache_key(app_id: str, last_price_change: str, language: str, day: str) -> str:
+    """Имя файла графика; при изменении цены или смене дня (UTC) получается новый ключ"""
+    version = hashlib.sha1(f"{last_price_change}|{day}".encode('utf-8')).hexdigest()[:12]
+    return f"{app_id}-{version}-{language}.png"
+
+
+class ChartImageCache:
+    """LRU-кэш PNG-графиков в каталоге на диске"""
+
+    def __init__(self, directory: str = CHART_CACHE_DIR, max_bytes: int = CHART_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Имя файла -> размер, от давно запрошенных к недавним
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        # После перезапуска порядок LRU восстанавливается по времени изменения файлов
+        files = []
+        for name in os.listdir(directory):
+            if name.endswith('.png'):
+                stat = os.stat(os.path.join(directory, name))
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+        self._evict()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self):
+        """Удаляет самые старые графики, пока кэш больше max_bytes"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError as e:
+                logger.error(f"Error removing cached chart {name}: {e}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """PNG из кэша или None"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            path = os.path.join(self.directory, key)
+            try:
+                with open(path, 'rb') as fp:
+                    data = fp.read()
+                # Время изменения - порядок LRU для следующего запуска
+                os.utime(path)
+            except OSError as e:
+                logger.error(f"Error reading cached chart {key}: {e}")
+                self._total_bytes -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: bytes):
+        """Сохраняет PNG и вытесняет давно не запрашивавшиеся графики"""
+        with self._lock:
+            path = os.path.join(self.directory, key)
+            try:
+                # Запись через временный файл: читатель не увидит недописанный PNG
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'wb') as fp:
+                    fp.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.error(f"Error caching chart {key}: {e}")
+                return
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+
+_shared_cache: Optional[ChartImageCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_chart_cache() -> ChartImageCache:
+    """Общий для всего бота кэш графиков"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ChartImageCache()
+        return _shared_cache
@@ -0,0 +1,147 @@
+"""
+Рендер графиков цен в отдельных процессах
+matplotlib - это CPU-bound работа: отрисовка в event loop останавливает
+обработку всех остальных обновлений Telegram. Пул процессов с заранее
+импортированным matplotlib (backend Agg) рисует графики параллельно,
+а ограниченная очередь не дает накопить бесконечный хвост запросов
+"""
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from config import CHART_RENDER_WORKERS, CHART_RENDER_QUEUE_SIZE, CHART_RENDER_QUEUE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker():
+    """Импортирует matplotlib и прогревает шрифты при старте процесса"""
+    import matplotlib
+    matplotlib.use('Agg')
+    from datetime import datetime, timedelta
+    from price_chart_generator import PriceChartGenerator
+
+    now = datetime.now()
+    PriceChartGenerator().create_price_chart('warm-up', [
+        {'date': now - timedelta(days=1), 'price': 100, 'original_price': 100},
+        {'date': now, 'price': 50, 'original_price': 100},
+    ])
+
+
+def _ping() -> bool:
+    return True
+
+
+def _render(game_name: str, price_data: List[Dict], language: str) -> Optional[bytes]:
+    """Рисует график в процессе пула"""
+    from price_chart_generator import PriceChartGenerator
+
+    chart = PriceChartGenerator().create_price_chart(game_name, price_data, language)
+    return chart.getvalue() if chart is not None else None
+
+
+class ChartRenderPool:
+    """Пул процессов для рендера графиков с ограниченной очередью"""
+
+    def __init__(self, workers: int = CHART_RENDER_WORKERS, max_pending: int = CHART_RENDER_QUEUE_SIZE,
+                 queue_timeout: float = CHART_RENDER_QUEUE_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop = None
+        self.pending = 0
+
+    def start(self):
+        """Запускает процессы пула заранее, чтобы первый график не ждал импорта matplotlib"""
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: процессы не наследуют потоки и соединения бота
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+                for _ in range(self.workers):
+                    self._executor.submit(_ping)
+                logger.info(f"Chart render pool started with {self.workers} workers")
+            return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_pending)
+            self._slots_loop = loop
+        return self._slots
+
+    async def render_chart(self, game_name: str, price_data: List[Dict], language: str = 'ru') -> Optional[bytes]:
+        """
+        PNG графика цен или None
+
+        Если в работе и в очереди уже max_pending графиков, запрос ждет
+        освобождения места не дольше queue_timeout секунд.
+        """
+        slots = self._get_slots()
+        if slots.locked():
+            try:
+                await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Chart render queue is full ({self.max_pending} charts), dropping chart for {game_name}")
+                return None
+        else:
+            await slots.acquire()
+
+        self.pending += 1
+        try:
+            executor = self.start()
+            return await asyncio.wrap_future(executor.submit(_render, game_name, price_data, language))
+        except BrokenProcessPool as e:
+            # Процесс пула упал: следующий запрос создаст пул заново
+            logger.error(f"Chart render pool is broken: {e}")
+            with self._executor_lock:
+                if self._executor is executor:
+                    self._executor = None
+            return None
+        except Exception as e:
+            logger.error(f"Error rendering chart for {game_name}: {e}")
+            return None
+        finally:
+            self.pending -= 1
+            slots.release()
+
+    async def close(self):
+        """Дожидается начатых графиков и останавливает процессы"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+
+_shared_pool: Optional[ChartRenderPool] = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_chart_renderer() -> ChartRenderPool:
+    """Общий для всего бота пул рендера графиков"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ChartRenderPool()
+        return _shared_pool
+
+
+async def render_chart(game_name: str, price_data: List[Dict], language: str = 'ru') -> Optional[bytes]:
+    """PNG графика цен из общего пула процессов"""
+    return await get_chart_renderer().render_chart(game_name, price_data, language)
+
+
+async def shutdown_chart_renderer():
+    """Останавливает общий пул, если он запускался"""
+    if _shared_pool is not None:
+        await _shared_pool.close()
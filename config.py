@@ -16,6 +16,28 @@ SHOW_PLATFORMS = True  # Показывать поддерживаемые пл
 # Интервал отправки уведомлений (в часах)
 NOTIFICATION_INTERVAL = 6
 
+# Настройки планировщика
+SCHEDULER_TIMEZONE = "Europe/Moscow"  # Часовой пояс для cron-расписаний
+WEEKLY_DIGEST_CRON = "0 18 * * 0"  # Еженедельный дайджест: воскресенье 18:00
+SCHEDULER_JITTER = 60  # Случайный сдвиг запуска рассылок (в секундах)
+STATES_CLEANUP_INTERVAL = 5  # Очистка просроченных состояний пользователей (в минутах)
+WEEKLY_TOP_SIZE = 15  # Игр в еженедельном топе
+WEEKLY_TOP_FLUSH_INTERVAL = 5  # Сохранение еженедельного топа в базу (в минутах)
+
+# Настройки истории цен
+PRICE_HISTORY_RAW_RETENTION_DAYS = 90     # Хранить каждое изменение цены (в днях)
+PRICE_HISTORY_DAILY_RETENTION_DAYS = 365  # Хранить дневные агрегаты цен (в днях), недельные - бессрочно
+PRICE_HISTORY_RETENTION_INTERVAL = 24     # Очистка старой истории цен (в часах)
+PRICE_RECENT_LOW_DAYS = 90                # Окно недавнего минимума цены (в днях)
+
+# Настройки графиков цен
+CHART_DPI = 100  # Разрешение графика: 12x7 дюймов -> 1200x700 пикселей, достаточно для Telegram
+CHART_CACHE_DIR = "chart_cache"  # Каталог готовых PNG-графиков
+CHART_CACHE_MAX_BYTES = 50 * 1024 * 1024  # Максимальный размер кэша графиков (в байтах)
+CHART_RENDER_WORKERS = 2  # Процессов для рендера графиков
+CHART_RENDER_QUEUE_SIZE = 8  # Графиков в работе и в очереди одновременно
+CHART_RENDER_QUEUE_TIMEOUT = 10  # Сколько ждать места в очереди рендера (в секундах)
+
 # Настройки логирования
 LOG_LEVEL = "INFO"  # DEBUG, INFO, WARNING, ERROR
 LOG_FILE = "bot.log"
@@ -23,15 +45,65 @@ LOG_FILE = "bot.log"
 # Файлы для хранения данных
 SUBSCRIBERS_FILE = "subscribers.json"
 DEALS_CACHE_FILE = "deals_cache.json"
+DEALS_CACHE_TTL = 30 * 60  # Время жизни снимка скидок (в секундах)
+
+# Настройки кэша метаданных игр
+APP_METADATA_CACHE_SIZE = 5000  # Сколько игр держать в памяти (LRU)
+APP_METADATA_STATIC_TTL = 7 * 24 * 60 * 60  # Время жизни названия и жанров (в секундах)
+APP_METADATA_PRICE_TTL = 60 * 60  # Время жизни цены (в секундах)
+
+# Настройки базы данных
+DB_BUSY_TIMEOUT = 30  # Сколько ждать блокировку базы данных (в секундах)
+DB_CACHED_STATEMENTS = 256  # Размер кэша подготовленных запросов на соединение
+SUBSCRIBERS_BATCH_SIZE = 500  # Сколько подписчиков читать из базы за один раз при рассылках
+
+# Настройки рассылок
+BROADCAST_RATE = 30  # Общий лимит сообщений в секунду (ограничение Telegram для бота)
+BROADCAST_WORKERS = 16  # Количество параллельных отправителей
+BROADCAST_PER_CHAT_INTERVAL = 1.0  # Пауза между частями сообщения в один чат (в секундах)
+BROADCAST_MAX_RETRIES = 3  # Повторы при временных ошибках сети и RetryAfter
+BROADCAST_RETRY_BACKOFF = 2.0  # Базовая пауза перед повтором (в секундах)
+
+# Настройки HTTP-клиента
+HTTP_MAX_CONNECTIONS = 100  # Всего открытых соединений общего HTTP-клиента
+HTTP_MAX_CONNECTIONS_PER_HOST = 10  # Соединений к одному хосту (Steam, Epic, GOG)
+HTTP_KEEPALIVE_TIMEOUT = 60  # Сколько держать простаивающее соединение открытым (в секундах)
+HTTP_DNS_CACHE_TTL = 300  # Время жизни DNS-кэша (в секундах)
+HTTP_TIMEOUT = 30  # Общий таймаут запроса (в секундах)
+HTTP_CONNECT_TIMEOUT = 10  # Таймаут установки соединения (в секундах)
+HTTP_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Адаптивные лимиты запросов по хостам (AIMD): частота растет, пока хост отвечает
+# без ошибок, и падает после 429/5xx
+# Хост: (начальная, минимальная, максимальная частота в секунду, допустимый всплеск)
+HOST_RATE_LIMITS = {
+    "store.steampowered.com": (5, 0.5, 20, 4),
+    "steamcommunity.com": (1, 0.2, 5, 2),
+    "api.steampowered.com": (5, 0.5, 20, 4),
+    "store-site-backend-static.ak.epicgames.com": (2, 0.2, 10, 2),
+    "gog": (2, 0.2, 10, 2),  # Все хосты *.gog.com
+}
+HOST_RATE_DEFAULT = (2, 0.2, 10, 2)  # Лимит для остальных хостов
+RATE_LIMIT_INCREASE = 0.5  # Прирост частоты за секунду успешных запросов (запросов в секунду)
+RATE_LIMIT_DECREASE = 0.5  # Множитель частоты после 429/5xx или ошибки сети
 
 # Настройки Steam API
-STEAM_SEARCH_DELAY = 1  # Задержка между запросами к Steam (в секундах)
+STEAM_SEARCH_DELAY = 1  # Базовая пауза после 429 от поиска Steam, если нет Retry-After (в секундах)
 MAX_SEARCH_PAGES = 8    # Максимальное количество страниц для поиска
+SEARCH_PAGE_SIZE = 100  # Игр на одной странице поиска (count)
+SEARCH_CONCURRENCY = 4  # Одновременных запросов страниц поиска
+SEARCH_MAX_RETRIES = 2  # Повторов запроса страницы после ответа 429
+SEARCH_SORT_BY = "Discount_DESC"  # Сортировка поиска: сначала самые большие скидки
+SEARCH_MAX_PRICE = None  # Ценовая корзина поиска (maxprice: "free", 5, 10...), None - без ограничения
+SEARCH_PARSER_BACKEND = "auto"  # Разбор результатов поиска: auto, lxml или bs4
 STEAM_WEB_API_KEY = os.getenv("STEAM_WEB_API_KEY")  # Steam Web API ключ из Replit Secrets
 
 # Настройки Wishlist
 WISHLIST_MAX_GAMES_CHECK = 100  # Максимальное количество игр для проверки скидок
-WISHLIST_CHECK_DELAY = 0.15     # Задержка между проверками игр (в секундах)
+WISHLIST_PRICE_CONCURRENCY = 8  # Одновременных запросов цен к Steam Store API
+WISHLIST_PRICE_BATCH_SIZE = 50  # Игр в одном appdetails-запросе цен
+WISHLIST_PRICE_MAX_RETRIES = 3  # Повторов запроса после ответа 429
+WISHLIST_RETRY_BACKOFF = 2.0    # Базовая пауза после 429, если нет Retry-After (в секундах)
 WISHLIST_ENABLE_FULL_CHECK = True  # Проверять все игры из wishlist (если False - только первые N)
 
 # Настройки ИИ-рекомендаций
@@ -4,105 +4,94 @@
 import sqlite3
 import json
 import logging
-from typing import List, Dict, Optional, Tuple
-from datetime import datetime
+import threading
+from contextlib import contextmanager
+from typing import Any, List, Dict, Optional, Tuple, Iterator
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from config import (
+    DB_BUSY_TIMEOUT, DB_CACHED_STATEMENTS, SUBSCRIBERS_BATCH_SIZE, SCHEDULER_TIMEZONE,
+    PRICE_HISTORY_RAW_RETENTION_DAYS, PRICE_HISTORY_DAILY_RETENTION_DAYS, PRICE_RECENT_LOW_DAYS
+)
+from migrations import apply_migrations
 
 logger = logging.getLogger(__name__)
 
+
+# Пересчет недавнего минимума по дневным агрегатам, когда день минимума вышел из окна
+_REFRESH_RECENT_MIN_SQL = '''
+    UPDATE price_extremes SET (recent_min_price, recent_min_on) = (
+        SELECT min_price, bucket_start FROM price_rollups
+        WHERE price_rollups.app_id = price_extremes.app_id
+          AND resolution = 'day' AND bucket_start >= :cutoff
+        ORDER BY min_price, bucket_start DESC
+        LIMIT 1
+    )
+    WHERE (recent_min_on IS NULL OR recent_min_on < :cutoff)
+'''
+
+
+def current_week_start() -> str:
+    """Понедельник текущей недели (YYYY-MM-DD) в часовом поясе планировщика"""
+    today = datetime.now(ZoneInfo(SCHEDULER_TIMEZONE)).date()
+    return (today - timedelta(days=today.weekday())).isoformat()
+
+
 class DatabaseManager:
     def __init__(self, db_path: str = "steam_bot.db"):
         self.db_path = db_path
+        # Одно долгоживущее соединение на поток вместо sqlite3.connect в каждом методе
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
         self.init_database()
     
+    def _get_connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока (создается при первом обращении)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=DB_BUSY_TIMEOUT,
+                cached_statements=DB_CACHED_STATEMENTS,
+                check_same_thread=False
+            )
+            # WAL: читатели не блокируют писателя; NORMAL достаточно надежен для WAL
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Соединение текущего потока в виде транзакции:
+        при выходе без ошибок изменения фиксируются, при ошибке - откатываются
+        """
+        conn = self._get_connection()
+        with conn:
+            yield conn
+    
+    def close(self):
+        """Закрывает все открытые соединения (при остановке бота)"""
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception as e:
+                    logger.error(f"Error closing database connection: {e}")
+            self._connections.clear()
+        self._local = threading.local()
+    
     def init_database(self):
-        """Инициализация базы данных"""
+        """Инициализация базы данных: применение недостающих миграций схемы"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Таблица пользователей
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id INTEGER PRIMARY KEY,
-                        username TEXT,
-                        first_name TEXT,
-                        last_name TEXT,
-                        is_subscribed BOOLEAN DEFAULT 0,
-                        min_discount INTEGER DEFAULT 30,
-                        preferred_genres TEXT DEFAULT '[]',
-                        language TEXT DEFAULT 'ru',
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Добавляем колонку языка если её нет
-                try:
-                    cursor.execute('ALTER TABLE users ADD COLUMN language TEXT DEFAULT "ru"')
-                    conn.commit()
-                except sqlite3.OperationalError:
-                    # Колонка уже существует
-                    pass
-                
-                # Таблица истории цен (эмуляция)
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS price_history (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        app_id TEXT,
-                        game_title TEXT,
-                        price REAL,
-                        discount INTEGER,
-                        recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Таблица бесплатных игр
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS free_games (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        title TEXT,
-                        description TEXT,
-                        platform TEXT,
-                        url TEXT,
-                        end_date TEXT,
-                        image_url TEXT,
-                        is_active BOOLEAN DEFAULT 1,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Таблица топовых игр недели
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS weekly_top (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        game_title TEXT,
-                        discount INTEGER,
-                        original_price TEXT,
-                        discounted_price TEXT,
-                        url TEXT,
-                        rating REAL DEFAULT 0.0,
-                        week_start DATE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Таблица отзывов и предложений
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS feedback (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER,
-                        username TEXT,
-                        feedback_type TEXT DEFAULT 'general',
-                        message TEXT NOT NULL,
-                        rating INTEGER DEFAULT NULL,
-                        is_resolved BOOLEAN DEFAULT 0,
-                        admin_response TEXT DEFAULT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                conn.commit()
-                logger.info("Database initialized successfully")
+            with self.connection() as conn:
+                version = apply_migrations(conn)
+                logger.info(f"Database initialized successfully (schema version {version})")
                 
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
@@ -110,7 +99,7 @@ class DatabaseManager:
     def add_user(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None):
         """Добавление нового пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT OR REPLACE INTO users 
@@ -125,7 +114,7 @@ class DatabaseManager:
     def remove_user(self, user_id: int) -> bool:
         """Удаление пользователя (для тестирования)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('DELETE FROM users WHERE user_id = ?', (user_id,))
                 conn.commit()
@@ -137,7 +126,7 @@ class DatabaseManager:
     def subscribe_user(self, user_id: int) -> bool:
         """Подписка пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     UPDATE users 
@@ -153,7 +142,7 @@ class DatabaseManager:
     def unsubscribe_user(self, user_id: int) -> bool:
         """Отписка пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     UPDATE users 
@@ -169,7 +158,7 @@ class DatabaseManager:
     def get_subscribed_users(self) -> List[int]:
         """Получение списка подписанных пользователей"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT user_id FROM users WHERE is_subscribed = 1')
                 return [row[0] for row in cursor.fetchall()]
@@ -177,10 +166,49 @@ class DatabaseManager:
             logger.error(f"Error getting subscribed users: {e}")
             return []
     
+    def iter_subscriber_batches(self, batch_size: int = SUBSCRIBERS_BATCH_SIZE) -> Iterator[List[Dict]]:
+        """
+        Подписчики с настройками пачками по batch_size за один проход курсора
+        
+        Каждая запись: {'user_id', 'language', 'min_discount', 'genres'}.
+        В памяти одновременно находится не больше одной пачки.
+        """
+        cursor = None
+        try:
+            cursor = self._get_connection().cursor()
+            cursor.execute('''
+                SELECT user_id, language, min_discount, preferred_genres
+                FROM users WHERE is_subscribed = 1
+                ORDER BY user_id
+            ''')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [
+                    {
+                        'user_id': row[0],
+                        'language': row[1] or 'ru',
+                        'min_discount': row[2] if row[2] is not None else 30,
+                        'genres': json.loads(row[3]) if row[3] else []
+                    }
+                    for row in rows
+                ]
+        except Exception as e:
+            logger.error(f"Error iterating subscribers: {e}")
+        finally:
+            if cursor is not None:
+                cursor.close()
+    
+    def iter_subscribers_with_settings(self, batch_size: int = SUBSCRIBERS_BATCH_SIZE) -> Iterator[Dict]:
+        """Подписчики с языком, минимальной скидкой и жанрами (по одному)"""
+        for batch in self.iter_subscriber_batches(batch_size):
+            yield from batch
+    
     def set_user_genres(self, user_id: int, genres: List[str]):
         """Установка жанров пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     UPDATE users 
@@ -195,7 +223,7 @@ class DatabaseManager:
     def get_user_genres(self, user_id: int) -> List[str]:
         """Получение жанров пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT preferred_genres FROM users WHERE user_id = ?', (user_id,))
                 result = cursor.fetchone()
@@ -209,7 +237,7 @@ class DatabaseManager:
     def set_user_min_discount(self, user_id: int, min_discount: int):
         """Установка минимальной скидки для пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     UPDATE users 
@@ -224,7 +252,7 @@ class DatabaseManager:
     def get_user_min_discount(self, user_id: int) -> int:
         """Получение минимальной скидки пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT min_discount FROM users WHERE user_id = ?', (user_id,))
                 result = cursor.fetchone()
@@ -233,27 +261,97 @@ class DatabaseManager:
             logger.error(f"Error getting min discount for user {user_id}: {e}")
             return 30
     
-    def add_price_record(self, app_id: str, game_title: str, price: float, discount: int):
-        """Добавление записи о цене"""
+    def add_price_records(self, records: List[Tuple[str, str, float, int]], recorded_at: datetime = None) -> int:
+        """
+        Запись наблюдаемых цен (app_id, game_title, price, discount)
+
+        В price_history пишется только изменение цены или скидки игры:
+        строка - начало серии с неизменной ценой. Дневные и недельные
+        агрегаты и минимум цены обновляются, только если что-то изменилось,
+        поэтому повторные /deals с теми же ценами ничего не пишут.
+
+        Returns:
+            Количество игр, у которых изменилась цена
+        """
+        recorded_at = recorded_at or datetime.now(timezone.utc)
+        timestamp = recorded_at.strftime('%Y-%m-%d %H:%M:%S')
+        recent_cutoff = (recorded_at - timedelta(days=PRICE_RECENT_LOW_DAYS)).strftime('%Y-%m-%d')
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO price_history (app_id, game_title, price, discount)
-                    VALUES (?, ?, ?, ?)
-                ''', (app_id, game_title, price, discount))
+                changed = 0
+                for app_id, game_title, price, discount in records:
+                    app_id, price, discount = str(app_id), round(price, 2), discount or 0
+                    cursor.execute('''
+                        SELECT price, discount FROM price_history
+                        WHERE app_id = ?
+                        ORDER BY recorded_at DESC, id DESC
+                        LIMIT 1
+                    ''', (app_id,))
+                    if cursor.fetchone() != (price, discount):
+                        cursor.execute('''
+                            INSERT INTO price_history (app_id, game_title, price, discount, recorded_at)
+                            VALUES (?, ?, ?, ?, ?)
+                        ''', (app_id, game_title, price, discount, timestamp))
+                        changed += 1
+
+                    # Пока цена не меняется, min/max агрегата тоже не меняются
+                    cursor.execute('''
+                        INSERT INTO price_rollups
+                            (app_id, resolution, bucket_start, min_price, max_price, last_price, last_discount)
+                        VALUES (?, 'day', date(?), ?, ?, ?, ?),
+                               (?, 'week', date(?, '-6 days', 'weekday 1'), ?, ?, ?, ?)
+                        ON CONFLICT(app_id, resolution, bucket_start) DO UPDATE SET
+                            min_price = MIN(min_price, excluded.min_price),
+                            max_price = MAX(max_price, excluded.max_price),
+                            last_price = excluded.last_price,
+                            last_discount = excluded.last_discount
+                        WHERE last_price != excluded.last_price OR last_discount != excluded.last_discount
+                    ''', (app_id, timestamp, price, price, price, discount) * 2)
+                    cursor.execute(
+                        _REFRESH_RECENT_MIN_SQL + ' AND app_id = :app_id',
+                        {'cutoff': recent_cutoff, 'app_id': app_id}
+                    )
+                    # Цена не выше недавнего минимума становится новым недавним минимумом
+                    cursor.execute('''
+                        INSERT INTO price_extremes (app_id, game_title, min_price, min_price_at,
+                                                    recent_min_price, recent_min_on, last_price, last_seen_on)
+                        VALUES (?, ?, ?, ?, ?, date(?), ?, date(?))
+                        ON CONFLICT(app_id) DO UPDATE SET
+                            min_price_at = CASE WHEN excluded.min_price < min_price
+                                                THEN excluded.min_price_at ELSE min_price_at END,
+                            min_price = MIN(min_price, excluded.min_price),
+                            recent_min_on = CASE WHEN recent_min_price IS NULL
+                                                   OR excluded.recent_min_price <= recent_min_price
+                                                 THEN excluded.recent_min_on ELSE recent_min_on END,
+                            recent_min_price = MIN(COALESCE(recent_min_price, excluded.recent_min_price),
+                                                   excluded.recent_min_price),
+                            game_title = excluded.game_title,
+                            last_price = excluded.last_price,
+                            last_seen_on = excluded.last_seen_on
+                        WHERE last_price != excluded.last_price
+                           OR last_seen_on != excluded.last_seen_on
+                           OR game_title IS NOT excluded.game_title
+                    ''', (app_id, game_title, price, timestamp, price, timestamp, price, timestamp))
                 conn.commit()
+                return changed
         except Exception as e:
-            logger.error(f"Error adding price record: {e}")
+            logger.error(f"Error adding price records: {e}")
+            return 0
+
+    def add_price_record(self, app_id: str, game_title: str, price: float, discount: int,
+                         recorded_at: datetime = None) -> bool:
+        """Добавление записи о цене; True - цена игры изменилась"""
+        return self.add_price_records([(app_id, game_title, price, discount)], recorded_at) > 0
     
     def add_price_history(self, app_id: int, title: str, price: float, discount: int = 0):
         """Алиас для add_price_record для совместимости"""
         self.add_price_record(str(app_id), title, price, discount)
     
     def get_price_history(self, app_id: str) -> List[Dict]:
-        """Получение истории цен"""
+        """Последние изменения цены игры (от новых к старым)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT price, discount, recorded_at 
@@ -274,11 +372,149 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error getting price history for {app_id}: {e}")
             return []
+
+    def get_price_series(self, app_id: str, since: datetime = None, resolution: str = 'raw') -> List[Dict]:
+        """
+        Цены игры начиная с since (по возрастанию времени)
+
+        Args:
+            resolution: 'raw' - каждое изменение цены, 'day' / 'week' - агрегаты за день / неделю (UTC)
+
+        Returns:
+            [{'date', 'price', 'min_price', 'max_price', 'discount'}]; price - последняя цена
+            точки, date - время изменения цены или начало дня/недели
+        """
+        if resolution not in ('raw', 'day', 'week'):
+            raise ValueError(f"Unknown price series resolution: {resolution}")
+
+        since_text = since.strftime('%Y-%m-%d %H:%M:%S') if since else ''
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                if resolution == 'raw':
+                    # Серия, начавшаяся до since, еще действовала в момент since
+                    cursor.execute('''
+                        SELECT recorded_at, price, price, price, discount FROM price_history
+                        WHERE app_id = ? AND recorded_at >= COALESCE((
+                            SELECT MAX(recorded_at) FROM price_history WHERE app_id = ? AND recorded_at <= ?
+                        ), ?)
+                        ORDER BY recorded_at, id
+                    ''', (str(app_id), str(app_id), since_text, since_text))
+                else:
+                    cursor.execute('''
+                        SELECT bucket_start, last_price, min_price, max_price, last_discount FROM price_rollups
+                        WHERE app_id = ? AND resolution = ? AND bucket_start >= ?
+                        ORDER BY bucket_start
+                    ''', (str(app_id), resolution, since_text[:10]))
+                return [
+                    {'date': row[0], 'price': row[1], 'min_price': row[2], 'max_price': row[3], 'discount': row[4]}
+                    for row in cursor.fetchall()
+                ]
+        except Exception as e:
+            logger.error(f"Error getting price series for {app_id}: {e}")
+            return []
+
+    def get_last_price_change(self, app_id: str) -> Optional[str]:
+        """Время последнего изменения цены игры (ключ версии графика цен)"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT MAX(recorded_at) FROM price_history WHERE app_id = ?', (str(app_id),))
+                return cursor.fetchone()[0]
+        except Exception as e:
+            logger.error(f"Error getting last price change for {app_id}: {e}")
+            return None
+
+    def get_price_extremes(self, app_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Минимумы цен для списка игр одним запросом
+
+        Returns:
+            app_id -> {'min_price', 'min_price_at', 'recent_min_price', 'recent_min_on',
+            'last_price', 'last_seen_on', 'title'}; recent_min_* - минимум за PRICE_RECENT_LOW_DAYS дней
+        """
+        app_ids = list(dict.fromkeys(str(app_id) for app_id in app_ids))
+        results = {}
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                # SQLite ограничивает количество параметров в запросе
+                for i in range(0, len(app_ids), 500):
+                    chunk = app_ids[i:i + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor.execute(f'''
+                        SELECT app_id, min_price, min_price_at, recent_min_price, recent_min_on, last_price, last_seen_on,
+                               game_title
+                        FROM price_extremes WHERE app_id IN ({placeholders})
+                    ''', chunk)
+                    for row in cursor.fetchall():
+                        results[row[0]] = {
+                            'min_price': row[1],
+                            'min_price_at': row[2],
+                            'recent_min_price': row[3],
+                            'recent_min_on': row[4],
+                            'last_price': row[5],
+                            'last_seen_on': row[6],
+                            'title': row[7]
+                        }
+        except Exception as e:
+            logger.error(f"Error getting price extremes: {e}")
+        return results
+
+    def get_price_minimum(self, app_id: str) -> Optional[Dict]:
+        """Минимумы цены одной игры (см. get_price_extremes)"""
+        return self.get_price_extremes([app_id]).get(str(app_id))
+
+    def apply_price_retention(self, raw_days: int = PRICE_HISTORY_RAW_RETENTION_DAYS,
+                              daily_days: int = PRICE_HISTORY_DAILY_RETENTION_DAYS,
+                              now: datetime = None) -> Dict[str, int]:
+        """
+        Удаляет старую историю цен
+
+        Удаляются изменения цены, закончившиеся раньше raw_days дней назад
+        (действующая цена игры остается), и дневные агрегаты старше daily_days.
+        Недельные агрегаты и исторические минимумы хранятся бессрочно,
+        недавние минимумы, вышедшие из окна PRICE_RECENT_LOW_DAYS, пересчитываются.
+
+        Returns:
+            {'raw': удалено изменений цены, 'day': удалено дневных агрегатов}
+        """
+        now = now or datetime.now(timezone.utc)
+        raw_cutoff = (now - timedelta(days=raw_days)).strftime('%Y-%m-%d %H:%M:%S')
+        daily_cutoff = (now - timedelta(days=daily_days)).strftime('%Y-%m-%d')
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                # Серия закончилась до границы, если следующая серия игры началась раньше границы
+                cursor.execute('''
+                    DELETE FROM price_history
+                    WHERE recorded_at < ? AND EXISTS (
+                        SELECT 1 FROM price_history AS newer
+                        WHERE newer.app_id = price_history.app_id
+                          AND newer.recorded_at < ?
+                          AND (newer.recorded_at > price_history.recorded_at
+                               OR (newer.recorded_at = price_history.recorded_at AND newer.id > price_history.id))
+                    )
+                ''', (raw_cutoff, raw_cutoff))
+                deleted = {'raw': cursor.rowcount}
+                cursor.execute(
+                    "DELETE FROM price_rollups WHERE resolution = 'day' AND bucket_start < ?", (daily_cutoff,)
+                )
+                deleted['day'] = cursor.rowcount
+                recent_cutoff = (now - timedelta(days=PRICE_RECENT_LOW_DAYS)).strftime('%Y-%m-%d')
+                cursor.execute(_REFRESH_RECENT_MIN_SQL, {'cutoff': recent_cutoff})
+                conn.commit()
+                logger.info(f"Price history retention: removed {deleted['raw']} price changes, "
+                            f"{deleted['day']} daily rollups")
+                return deleted
+        except Exception as e:
+            logger.error(f"Error applying price history retention: {e}")
+            return {'raw': 0, 'day': 0}
     
     def add_free_game(self, title: str, description: str, platform: str, url: str, end_date: str = None, image_url: str = None):
         """Добавление бесплатной игры"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO free_games (title, description, platform, url, end_date, image_url)
@@ -289,10 +525,20 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error adding free game: {e}")
     
+    def delete_old_free_games(self):
+        """Удаление бесплатных игр старше суток"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM free_games WHERE created_at < datetime("now", "-1 day")')
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error deleting old free games: {e}")
+    
     def get_active_free_games(self) -> List[Dict]:
         """Получение активных бесплатных игр"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT title, description, platform, url, end_date, image_url
@@ -323,7 +569,7 @@ class DatabaseManager:
     def get_user_settings(self, user_id: int) -> Dict:
         """Получение всех настроек пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT is_subscribed, min_discount, preferred_genres, language
@@ -354,59 +600,60 @@ class DatabaseManager:
             }
 
     def add_weekly_top_game(self, title: str, discount: int, price: float, score: float = None):
-        """Добавление игры в еженедельный топ с рейтингом"""
+        """Добавление игры в топ текущей недели (остается лучшая запись игры)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
-                
-                # Проверяем, есть ли колонка score в таблице
-                cursor.execute("PRAGMA table_info(weekly_top)")
-                columns = [column[1] for column in cursor.fetchall()]
-                
-                if 'score' not in columns:
-                    # Добавляем колонку score если её нет
-                    cursor.execute('ALTER TABLE weekly_top ADD COLUMN score REAL DEFAULT 0')
-                
-                if score is not None:
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO weekly_top (game_title, discount, discounted_price, score)
-                        VALUES (?, ?, ?, ?)
-                    ''', (title, discount, str(price), score))
-                else:
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO weekly_top (game_title, discount, discounted_price)
-                        VALUES (?, ?, ?)
-                    ''', (title, discount, str(price)))
+                cursor.execute('''
+                    INSERT INTO weekly_top (week_start, game_title, discount, discounted_price, score)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(week_start, game_title) DO UPDATE SET
+                        discount = excluded.discount,
+                        discounted_price = excluded.discounted_price,
+                        score = excluded.score
+                    WHERE excluded.score >= COALESCE(weekly_top.score, weekly_top.discount)
+                ''', (current_week_start(), title, discount, str(price), score if score is not None else 0))
                 conn.commit()
         except Exception as e:
             logger.error(f"Error adding weekly top game: {e}")
 
-    def get_weekly_top_games(self, limit: int = 5) -> List[Dict]:
-        """Получение топ игр недели с учетом рейтинга"""
+    def replace_weekly_top(self, week_start: str, games: List[Dict]) -> bool:
+        """
+        Заменяет топ недели готовым рейтингом одной транзакцией
+
+        Args:
+            week_start: понедельник недели (YYYY-MM-DD)
+            games: игры по убыванию рейтинга: {'title', 'discount', 'price', 'score'}
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
-                
-                # Проверяем, есть ли колонка score
-                cursor.execute("PRAGMA table_info(weekly_top)")
-                columns = [column[1] for column in cursor.fetchall()]
-                
-                if 'score' in columns:
-                    # Сортируем по рейтингу, если колонка есть
-                    cursor.execute('''
-                        SELECT game_title, discount, discounted_price, COALESCE(score, discount) as final_score
-                        FROM weekly_top 
-                        ORDER BY final_score DESC, discount DESC
-                        LIMIT ?
-                    ''', (limit,))
-                else:
-                    # Fallback к старому методу
-                    cursor.execute('''
-                        SELECT game_title, discount, discounted_price, discount as final_score
-                        FROM weekly_top 
-                        ORDER BY discount DESC 
-                        LIMIT ?
-                    ''', (limit,))
+                cursor.execute('DELETE FROM weekly_top WHERE week_start = ?', (week_start,))
+                cursor.executemany('''
+                    INSERT INTO weekly_top (week_start, game_title, discount, discounted_price, score)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [
+                    (week_start, game['title'], game['discount'], str(game['price']), game['score'])
+                    for game in games
+                ])
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Error replacing weekly top for {week_start}: {e}")
+            return False
+
+    def get_weekly_top_games(self, limit: int = 5, week_start: str = None) -> List[Dict]:
+        """Получение топ игр недели с учетом рейтинга (по умолчанию - последней недели с данными)"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT game_title, discount, discounted_price, COALESCE(score, discount) as final_score
+                    FROM weekly_top 
+                    WHERE week_start = COALESCE(?, (SELECT MAX(week_start) FROM weekly_top))
+                    ORDER BY final_score DESC, discount DESC
+                    LIMIT ?
+                ''', (week_start, limit))
                 
                 results = []
                 for row in cursor.fetchall():
@@ -414,7 +661,7 @@ class DatabaseManager:
                         'title': row[0],
                         'discount': row[1],
                         'price': row[2],
-                        'score': row[3] if len(row) > 3 else row[1]
+                        'score': row[3]
                     })
                 return results
                 
@@ -422,20 +669,21 @@ class DatabaseManager:
             logger.error(f"Error getting weekly top games: {e}")
             return []
 
-    def clear_weekly_top(self):
-        """Очистка еженедельного топа"""
+    def clear_weekly_top(self, week_start: str = None):
+        """Очистка топа недели week_start (по умолчанию текущей); топы других недель остаются"""
+        week_start = week_start or current_week_start()
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('DELETE FROM weekly_top')
+                cursor.execute('DELETE FROM weekly_top WHERE week_start = ?', (week_start,))
                 conn.commit()
         except Exception as e:
-            logger.error(f"Error clearing weekly top: {e}")
+            logger.error(f"Error clearing weekly top for {week_start}: {e}")
 
     def add_feedback(self, user_id: int, username: str, feedback_type: str, message: str, rating: int = None):
         """Добавление отзыва от пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO feedback 
@@ -452,7 +700,7 @@ class DatabaseManager:
     def get_feedback_stats(self):
         """Получение статистики отзывов"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT 
@@ -483,7 +731,7 @@ class DatabaseManager:
     def get_recent_feedback(self, limit: int = 10):
         """Получение последних отзывов"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     SELECT id, user_id, username, feedback_type, message, rating, 
@@ -513,7 +761,7 @@ class DatabaseManager:
     def set_user_language(self, user_id: int, language: str):
         """Установка языка пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     UPDATE users 
@@ -528,7 +776,7 @@ class DatabaseManager:
     def get_user_language(self, user_id: int) -> str:
         """Получение языка пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT language FROM users WHERE user_id = ?', (user_id,))
                 result = cursor.fetchone()
@@ -540,7 +788,7 @@ class DatabaseManager:
     def is_user_subscribed(self, user_id: int) -> bool:
         """Проверка подписки пользователя"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('SELECT is_subscribed FROM users WHERE user_id = ?', (user_id,))
                 result = cursor.fetchone()
@@ -548,3 +796,273 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error checking subscription for user {user_id}: {e}")
             return False
+
+    def _app_metadata_from_row(self, row) -> Dict:
+        """Преобразование строки app_metadata в словарь"""
+        return {
+            'name': row[1],
+            'genres': json.loads(row[2]) if row[2] else [],
+            'static_updated_at': row[3],
+            'price': json.loads(row[4]) if row[4] else None,
+            'price_cc': row[5],
+            'volatile_updated_at': row[6]
+        }
+
+    def get_app_metadata(self, app_ids: List[str]) -> Dict[str, Dict]:
+        """Получение закэшированных метаданных для списка игр"""
+        results = {}
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                # SQLite ограничивает количество параметров в запросе
+                for i in range(0, len(app_ids), 500):
+                    chunk = app_ids[i:i + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor.execute(f'''
+                        SELECT app_id, name, genres, static_updated_at, price_info, price_cc, volatile_updated_at
+                        FROM app_metadata WHERE app_id IN ({placeholders})
+                    ''', chunk)
+                    for row in cursor.fetchall():
+                        results[row[0]] = self._app_metadata_from_row(row)
+        except Exception as e:
+            logger.error(f"Error getting app metadata: {e}")
+        return results
+
+    def find_app_metadata_by_name(self, name: str) -> Optional[Tuple[str, Dict]]:
+        """Поиск закэшированной игры по точному названию (без учета регистра)"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT app_id, name, genres, static_updated_at, price_info, price_cc, volatile_updated_at
+                    FROM app_metadata WHERE name = ? COLLATE NOCASE
+                    ORDER BY static_updated_at DESC LIMIT 1
+                ''', (name,))
+                row = cursor.fetchone()
+                return (row[0], self._app_metadata_from_row(row)) if row else None
+        except Exception as e:
+            logger.error(f"Error finding app metadata for '{name}': {e}")
+            return None
+
+    def save_app_static_metadata(self, entries: Dict[str, Dict], updated_at: float):
+        """Сохранение названий и жанров игр (жанры не затираются, если не переданы)"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT INTO app_metadata (app_id, name, genres, static_updated_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(app_id) DO UPDATE SET
+                        name = COALESCE(excluded.name, app_metadata.name),
+                        genres = COALESCE(excluded.genres, app_metadata.genres),
+                        static_updated_at = excluded.static_updated_at
+                ''', [
+                    (
+                        app_id,
+                        entry.get('name'),
+                        json.dumps(entry['genres']) if entry.get('genres') is not None else None,
+                        updated_at
+                    )
+                    for app_id, entry in entries.items()
+                ])
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error saving app metadata: {e}")
+
+    def save_app_prices(self, prices: Dict[str, Optional[Dict]], cc: str, updated_at: float):
+        """Сохранение цен игр (None - у игры нет цены, например бесплатная)"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT INTO app_metadata (app_id, price_info, price_cc, volatile_updated_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(app_id) DO UPDATE SET
+                        price_info = excluded.price_info,
+                        price_cc = excluded.price_cc,
+                        volatile_updated_at = excluded.volatile_updated_at
+                ''', [
+                    (app_id, json.dumps(price) if price is not None else None, cc, updated_at)
+                    for app_id, price in prices.items()
+                ])
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error saving app prices: {e}")
+
+    def get_unfinished_broadcast(self, kind: str) -> Optional[Dict]:
+        """Незавершенная рассылка данного типа (после перезапуска бота) с ее данными"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, status, payload FROM broadcasts
+                    WHERE kind = ? AND status NOT IN ('done', 'abandoned')
+                    ORDER BY id DESC LIMIT 1
+                ''', (kind,))
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                return {'id': row[0], 'status': row[1], 'payload': json.loads(row[2]) if row[2] else None}
+        except Exception as e:
+            logger.error(f"Error getting unfinished {kind} broadcast: {e}")
+            return None
+
+    def create_broadcast(self, kind: str, payload: Any = None) -> Optional[int]:
+        """Создание новой рассылки; payload - данные, по которым рендерятся ее сообщения"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'INSERT INTO broadcasts (kind, payload) VALUES (?, ?)',
+                    (kind, json.dumps(payload, ensure_ascii=False) if payload is not None else None)
+                )
+                conn.commit()
+                return cursor.lastrowid
+        except Exception as e:
+            logger.error(f"Error creating {kind} broadcast: {e}")
+            return None
+
+    def set_broadcast_status(self, broadcast_id: int, status: str):
+        """Изменение статуса рассылки (enqueuing -> sending -> done, или abandoned)"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE broadcasts
+                    SET status = ?, finished_at = CASE WHEN ? = 'done' THEN CURRENT_TIMESTAMP END
+                    WHERE id = ?
+                ''', (status, status, broadcast_id))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error updating broadcast {broadcast_id}: {e}")
+
+    def enqueue_broadcast_recipients(self, broadcast_id: int, recipients: List[Tuple[int, str]]):
+        """Добавление получателей (user_id, variant_key) в очередь рассылки"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO broadcast_outbox (broadcast_id, user_id, variant_key)
+                    VALUES (?, ?, ?)
+                ''', [(broadcast_id, user_id, variant_key) for user_id, variant_key in recipients])
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error enqueuing recipients for broadcast {broadcast_id}: {e}")
+
+    def get_pending_outbox(self, broadcast_id: int, after_user_id: int = 0, limit: int = SUBSCRIBERS_BATCH_SIZE) -> List[Dict]:
+        """Следующая пачка неотправленных сообщений рассылки (по возрастанию user_id)"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT user_id, variant_key, chunks_sent, attempts
+                    FROM broadcast_outbox
+                    WHERE broadcast_id = ? AND status = 'pending' AND user_id > ?
+                    ORDER BY user_id
+                    LIMIT ?
+                ''', (broadcast_id, after_user_id, limit))
+                return [
+                    {'user_id': row[0], 'variant_key': row[1], 'chunks_sent': row[2], 'attempts': row[3]}
+                    for row in cursor.fetchall()
+                ]
+        except Exception as e:
+            logger.error(f"Error getting pending outbox for broadcast {broadcast_id}: {e}")
+            return []
+
+    def update_outbox_entry(self, broadcast_id: int, user_id: int, status: str,
+                            chunks_sent: int, attempts: int, last_error: str = None):
+        """Сохранение результата отправки одному получателю"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE broadcast_outbox
+                    SET status = ?, chunks_sent = ?, attempts = ?, last_error = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE broadcast_id = ? AND user_id = ?
+                ''', (status, chunks_sent, attempts, last_error, broadcast_id, user_id))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error updating outbox entry {broadcast_id}/{user_id}: {e}")
+
+    def get_broadcast_stats(self, broadcast_id: int) -> Dict[str, int]:
+        """Количество получателей рассылки по статусам"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT status, COUNT(*) FROM broadcast_outbox
+                    WHERE broadcast_id = ? GROUP BY status
+                ''', (broadcast_id,))
+                return dict(cursor.fetchall())
+        except Exception as e:
+            logger.error(f"Error getting stats for broadcast {broadcast_id}: {e}")
+            return {}
+
+    def get_scheduled_jobs(self) -> Dict[str, float]:
+        """Сохраненное время следующего запуска задач планировщика"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT name, next_run_at FROM scheduled_jobs')
+                return dict(cursor.fetchall())
+        except Exception as e:
+            logger.error(f"Error getting scheduled jobs: {e}")
+            return {}
+
+    def save_scheduled_job(self, name: str, next_run_at: float, last_run_at: float = None):
+        """Сохранение времени следующего (и последнего) запуска задачи"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO scheduled_jobs (name, next_run_at, last_run_at)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(name) DO UPDATE SET
+                        next_run_at = excluded.next_run_at,
+                        last_run_at = COALESCE(excluded.last_run_at, scheduled_jobs.last_run_at)
+                ''', (name, next_run_at, last_run_at))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error saving scheduled job {name}: {e}")
+
+    def get_active_deal_states(self) -> Dict[str, Dict]:
+        """Последнее состояние действующих скидок: app_id -> {'title', 'discount', 'price'}"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT app_id, title, discount, price FROM deal_state WHERE is_active = 1')
+                return {
+                    row[0]: {'title': row[1], 'discount': row[2], 'price': row[3]}
+                    for row in cursor.fetchall()
+                }
+        except Exception as e:
+            logger.error(f"Error getting deal states: {e}")
+            return {}
+
+    def save_deal_states(self, deals: List[Tuple[str, str, int, Optional[float]]], ended_app_ids: List[str], seen_at: float):
+        """
+        Сохраняет текущие скидки (app_id, title, discount, price)
+        и помечает закончившиеся скидки неактивными
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT INTO deal_state (app_id, title, discount, price, is_active, first_seen_at, last_seen_at)
+                    VALUES (?, ?, ?, ?, 1, ?, ?)
+                    ON CONFLICT(app_id) DO UPDATE SET
+                        title = excluded.title,
+                        discount = excluded.discount,
+                        price = excluded.price,
+                        first_seen_at = CASE WHEN deal_state.is_active THEN deal_state.first_seen_at
+                                             ELSE excluded.first_seen_at END,
+                        is_active = 1,
+                        last_seen_at = excluded.last_seen_at
+                ''', [(app_id, title, discount, price, seen_at, seen_at) for app_id, title, discount, price in deals])
+                cursor.executemany(
+                    'UPDATE deal_state SET is_active = 0 WHERE app_id = ?',
+                    [(app_id,) for app_id in ended_app_ids]
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error saving deal states: {e}")
@@ -0,0 +1,77 @@
+"""
+Индекс скидок для подбора по настройкам пользователя
+Строится один раз на снимок скидок: жанр -> позиции скидок и порог
+скидки -> позиции скидок. Подбор для пользователя сводится к нескольким
+пересечениям множеств, а результат запоминается для каждого профиля
+(минимальная скидка, жанры), поэтому пользователи с одинаковыми
+настройками обходятся одним вычислением
+"""
+import bisect
+import logging
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EMPTY: FrozenSet[int] = frozenset()
+
+
+def user_profile(min_discount: int, genres: Optional[Iterable[str]]) -> Tuple[int, FrozenSet[str]]:
+    """Профиль фильтров пользователя: (минимальная скидка, множество жанров)"""
+    return min_discount, frozenset(genres or ())
+
+
+class DealIndex:
+    """Инвертированный индекс снимка скидок"""
+
+    def __init__(self, deals: List[Dict]):
+        self.deals = list(deals)
+
+        genre_positions: Dict[str, set] = {}
+        for position, deal in enumerate(self.deals):
+            for genre in deal.get('genres') or ():
+                genre_positions.setdefault(genre, set()).add(position)
+        self._genres: Dict[str, FrozenSet[int]] = {
+            genre: frozenset(positions) for genre, positions in genre_positions.items()
+        }
+
+        # Позиции по убыванию скидки: скидки не меньше порога - это префикс списка
+        self._by_discount = sorted(
+            range(len(self.deals)), key=lambda position: self.deals[position].get('discount', 0), reverse=True
+        )
+        self._negated_discounts = [-self.deals[position].get('discount', 0) for position in self._by_discount]
+
+        self._discount_sets: Dict[int, FrozenSet[int]] = {}
+        self._matches: Dict[Tuple[int, FrozenSet[str]], List[Dict]] = {}
+
+    def _at_least(self, min_discount: int) -> FrozenSet[int]:
+        """Позиции скидок не меньше min_discount"""
+        positions = self._discount_sets.get(min_discount)
+        if positions is None:
+            count = bisect.bisect_right(self._negated_discounts, -min_discount)
+            positions = frozenset(self._by_discount[:count])
+            self._discount_sets[min_discount] = positions
+        return positions
+
+    def _with_any_genre(self, genres: FrozenSet[str]) -> FrozenSet[int]:
+        """Позиции скидок, у которых есть хотя бы один из жанров"""
+        return EMPTY.union(*(self._genres.get(genre, EMPTY) for genre in genres))
+
+    def match(self, min_discount: int, genres: Optional[Iterable[str]] = None) -> List[Dict]:
+        """
+        Скидки для пользователя в исходном порядке снимка
+
+        Список общий для всех пользователей с тем же профилем - его нельзя изменять.
+        """
+        profile = user_profile(min_discount, genres)
+        matched = self._matches.get(profile)
+        if matched is None:
+            positions = self._at_least(min_discount)
+            if profile[1]:
+                positions = positions & self._with_any_genre(profile[1])
+            matched = [self.deals[position] for position in sorted(positions)]
+            self._matches[profile] = matched
+        return matched
+
+    @property
+    def profile_count(self) -> int:
+        return len(self._matches)
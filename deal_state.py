@@ -0,0 +1,117 @@
+"""
+Состояние скидок между рассылками
+Хранит последнюю увиденную скидку и цену каждой игры (таблица deal_state)
+и сравнивает с ними текущий снимок скидок: подписчикам отправляются
+только новые скидки и скидки, ставшие глубже
+"""
+import logging
+import re
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Изменение цены меньше этого порога (в рублях) считается шумом
+PRICE_EPSILON = 0.01
+
+PRICE_TEXT_RE = re.compile(r'\d[\d\s.,]*')
+
+
+def deal_key(deal: Dict) -> Optional[str]:
+    """Ключ скидки: app_id, для наборов без app_id - URL"""
+    if deal.get('app_id'):
+        return str(deal['app_id'])
+    return deal.get('url') or None
+
+
+def parse_price_text(text) -> Optional[float]:
+    """Числовая цена из строки цены ('839 pуб.', '1 299,00 ₽', '$9.99') или None"""
+    match = PRICE_TEXT_RE.search(str(text or ''))
+    if not match:
+        return None
+    number = re.sub(r'\s', '', match.group()).rstrip('.,')
+    # Два знака после последнего разделителя - копейки, остальные разделители - разряды
+    if len(number) > 3 and number[-3] in '.,':
+        return float(re.sub(r'[.,]', '', number[:-3]) + '.' + number[-2:])
+    return float(re.sub(r'[.,]', '', number))
+
+
+def deal_price(deal: Dict) -> Optional[float]:
+    """Цена со скидкой: из строки цены со страницы поиска, а без нее - из price_overview (в копейках)"""
+    price = parse_price_text(deal.get('discounted_price'))
+    if price is not None:
+        return price
+    if deal.get('final_price') is not None:
+        return deal['final_price'] / 100
+    return None
+
+
+def diff_deals(previous: Dict[str, Dict], deals: List[Dict]) -> Dict[str, List[Dict]]:
+    """
+    Сравнивает текущие скидки с последним сохраненным состоянием
+
+    Args:
+        previous: действующие скидки из deal_state: key -> {'title', 'discount', 'price'}
+        deals: текущий снимок скидок
+
+    Returns:
+        {'new': [...], 'deepened': [...], 'ended': [...]}. В deepened - копии
+        скидок с полями previous_discount и previous_price, в ended - записи
+        состояния закончившихся скидок с полем app_id.
+    """
+    new, deepened = [], []
+    seen = set()
+
+    for deal in deals:
+        key = deal_key(deal)
+        if key is None or key in seen:
+            continue
+        seen.add(key)
+
+        state = previous.get(key)
+        if state is None:
+            new.append(deal)
+            continue
+
+        discount = deal.get('discount', 0)
+        price = deal_price(deal)
+        price_dropped = (
+            price is not None and state['price'] is not None and price < state['price'] - PRICE_EPSILON
+        )
+        if discount > state['discount'] or price_dropped:
+            deepened.append(dict(deal, previous_discount=state['discount'], previous_price=state['price']))
+
+    ended = [dict(state, app_id=key) for key, state in previous.items() if key not in seen]
+    return {'new': new, 'deepened': deepened, 'ended': ended}
+
+
+class DealStateStore:
+    """Сравнение снимков скидок с состоянием в базе данных"""
+
+    def __init__(self, async_db):
+        self.async_db = async_db
+
+    async def diff(self, deals: List[Dict]) -> Dict[str, List[Dict]]:
+        """События new / deepened / ended относительно последнего сохраненного состояния"""
+        previous = await self.async_db.get_active_deal_states()
+        events = diff_deals(previous, deals)
+        logger.info(
+            f"Deal diff: {len(events['new'])} new, {len(events['deepened'])} deepened, "
+            f"{len(events['ended'])} ended ({len(deals)} deals in snapshot)"
+        )
+        return events
+
+    async def commit(self, deals: List[Dict], events: Dict[str, List[Dict]]):
+        """
+        Запоминает текущий снимок как последнее состояние
+
+        Вызывается после создания рассылки: прерванная рассылка хранит свои
+        скидки и продолжается с ними, поэтому повторно их считать не нужно.
+        """
+        states = {}
+        for deal in deals:
+            key = deal_key(deal)
+            if key is not None and key not in states:
+                states[key] = (key, deal.get('title', ''), deal.get('discount', 0), deal_price(deal))
+        ended = [state['app_id'] for state in events['ended']]
+        await self.async_db.save_deal_states(list(states.values()), ended, time.time())
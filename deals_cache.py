@@ -0,0 +1,209 @@
+"""
+Общий снимок скидок Steam для всех обработчиков бота
+Хранит последний результат парсинга в памяти и на диске (DEALS_CACHE_FILE),
+обновляет его в фоне по TTL и объединяет параллельные обновления в один запрос
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import List, Dict, Optional
+
+from config import DEALS_CACHE_FILE, DEALS_CACHE_TTL
+from deal_index import DealIndex
+from deal_state import deal_price
+from app_metadata_cache import get_app_metadata_cache
+from http_client import HttpClient
+
+logger = logging.getLogger(__name__)
+
+
+class DealsCache:
+    """Снимок скидок с фоновым обновлением и single-flight обновлением"""
+
+    def __init__(self, scraper, cache_file: str = DEALS_CACHE_FILE, ttl: int = DEALS_CACHE_TTL,
+                 http_client: Optional[HttpClient] = None, async_db=None):
+        self.scraper = scraper
+        self.http_client = http_client
+        # История цен пишется один раз на снимок, а не при каждом /deals
+        self.async_db = async_db
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.deals: List[Dict] = []
+        self.updated_at = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._background_task: Optional[asyncio.Task] = None
+        self._index: Optional[DealIndex] = None
+        self._index_deals: Optional[List[Dict]] = None
+        self._load_from_disk()
+
+    def _load_from_disk(self):
+        """Загружает сохраненный снимок с диска"""
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.deals = data.get('deals', [])
+            self.updated_at = float(data.get('updated_at', 0))
+            logger.info(f"Loaded {len(self.deals)} deals from {self.cache_file}")
+        except Exception as e:
+            logger.error(f"Error loading deals cache: {e}")
+
+    def _save_to_disk(self):
+        """Сохраняет снимок на диск (через временный файл)"""
+        try:
+            tmp_file = f"{self.cache_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'updated_at': self.updated_at, 'deals': self.deals}, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            logger.error(f"Error saving deals cache: {e}")
+
+    def is_fresh(self) -> bool:
+        """Проверяет, не истек ли TTL снимка"""
+        return bool(self.deals) and time.time() - self.updated_at < self.ttl
+
+    async def get_deals(self) -> List[Dict]:
+        """
+        Возвращает текущий снимок скидок
+
+        Устаревший снимок отдается сразу, а обновление запускается в фоне.
+        Ждать парсинга приходится только если снимка еще нет совсем.
+        """
+        if self.is_fresh():
+            return self.deals
+
+        if self.deals:
+            self._schedule_refresh()
+            return self.deals
+
+        return await self.refresh()
+
+    async def get_index(self) -> DealIndex:
+        """Индекс фильтров текущего снимка (строится один раз на снимок)"""
+        deals = await self.get_deals()
+        if self._index is None or self._index_deals is not deals:
+            self._index = DealIndex(deals)
+            self._index_deals = deals
+        return self._index
+
+    def _schedule_refresh(self):
+        """Запускает обновление без ожидания результата"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not None and loop is not self._loop and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.refresh(), self._loop)
+        else:
+            self._ensure_refresh_task()
+
+    def _ensure_refresh_task(self) -> asyncio.Task:
+        """Создает задачу обновления, если она еще не запущена"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._do_refresh())
+        return self._refresh_task
+
+    async def refresh(self) -> List[Dict]:
+        """Обновляет снимок; параллельные вызовы ждут один и тот же парсинг"""
+        loop = asyncio.get_running_loop()
+
+        # Вызов из другого event loop (например, из потока планировщика)
+        # перенаправляем в основной, чтобы не запускать второй парсинг
+        if self._loop is not None and loop is not self._loop and self._loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(self.refresh(), self._loop)
+            return await asyncio.wrap_future(future)
+
+        return await asyncio.shield(self._ensure_refresh_task())
+
+    async def _do_refresh(self) -> List[Dict]:
+        """Парсит Steam и заменяет снимок"""
+        started = time.monotonic()
+        try:
+            deals = await self.scraper.get_discounted_games()
+        except Exception as e:
+            logger.error(f"Error refreshing deals snapshot: {e}")
+            return self.deals
+
+        if deals:
+            await self._attach_prices(deals)
+            await self._record_prices(deals)
+            self.deals = deals
+            self.updated_at = time.time()
+            self._save_to_disk()
+            logger.info(f"Deals snapshot refreshed: {len(deals)} deals in {time.monotonic() - started:.1f}s")
+        else:
+            logger.warning("Deals refresh returned no deals, keeping previous snapshot")
+        return self.deals
+
+    async def _attach_prices(self, deals: List[Dict]):
+        """Дополняет скидки числовыми ценами из appdetails (один запрос на пачку игр)"""
+        app_ids = [str(deal['app_id']) for deal in deals if deal.get('app_id')]
+        if not app_ids:
+            return
+        
+        # Названия и жанры со страницы поиска сразу попадают в кэш метаданных
+        await asyncio.to_thread(get_app_metadata_cache().update_static, {
+            str(deal['app_id']): {'name': deal.get('title'), 'genres': deal.get('genres') or None}
+            for deal in deals if deal.get('app_id')
+        })
+
+        try:
+            # Парсер wishlist загружается при первом обновлении, а не при старте бота
+            from steam_wishlist import SteamWishlistParser
+            async with SteamWishlistParser(http_client=self.http_client) as parser:
+                # Цены из кэша не старше самого снимка
+                prices = await parser.get_prices_bulk(app_ids, max_age=self.ttl)
+        except Exception as e:
+            logger.error(f"Error getting bulk prices for deals: {e}")
+            return
+
+        for deal in deals:
+            price_info = prices.get(str(deal.get('app_id')))
+            if price_info:
+                deal['currency'] = price_info['currency']
+                deal['initial_price'] = price_info['initial_price']
+                deal['final_price'] = price_info['final_price']
+
+    async def _record_prices(self, deals: List[Dict]):
+        """Сохраняет цены нового снимка в историю (одной транзакцией, пишутся только изменения)"""
+        if self.async_db is None:
+            return
+        price_records = []
+        for deal in deals:
+            price = deal_price(deal)
+            if deal.get('app_id') and price is not None:
+                price_records.append((str(deal['app_id']), deal.get('title', ''), price, deal.get('discount', 0)))
+        if price_records:
+            await self.async_db.add_price_records(price_records)
+
+    async def _refresh_loop(self):
+        """Фоновый цикл обновления снимка по TTL"""
+        while True:
+            try:
+                if not self.is_fresh():
+                    await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in deals refresh loop: {e}")
+
+            age = time.time() - self.updated_at
+            await asyncio.sleep(max(self.ttl - age, 30))
+
+    def start(self):
+        """Запускает фоновое обновление в текущем event loop"""
+        self._loop = asyncio.get_running_loop()
+        if self._background_task is None or self._background_task.done():
+            self._background_task = self._loop.create_task(self._refresh_loop())
+            logger.info(f"Deals snapshot background refresh started (TTL {self.ttl}s)")
+
+    async def stop(self):
+        """Останавливает фоновое обновление"""
+        if self._background_task:
+            self._background_task.cancel()
+            try:
+                await self._background_task
+            except asyncio.CancelledError:
+                pass
+            self._background_task = None
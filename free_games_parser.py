@@ -5,33 +5,41 @@ import logging
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import re
-from bs4 import BeautifulSoup
+
+from search_parser import parse_search_results
+from http_client import HttpClient, client_session, limited_get
 
 logger = logging.getLogger(__name__)
 
 class FreeGamesParser:
     """Парсер для получения актуальных бесплатных игр"""
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[HttpClient] = None):
         self.session = None
+        self.http_client = http_client
         self.user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=30),
-            headers={'User-Agent': self.user_agent}
-        )
+        if self.http_client is not None:
+            self.session = await self.http_client.get_session()
+        else:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=30),
+                headers={'User-Agent': self.user_agent}
+            )
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
+        # Сессию общего клиента закрывает его владелец
+        if self.session and self.http_client is None:
             await self.session.close()
     
     async def get_all_free_games(self) -> List[Dict]:
         """Получение всех актуальных бесплатных игр"""
         free_games = []
         
-        async with aiohttp.ClientSession(
+        async with client_session(
+            self.http_client,
             timeout=aiohttp.ClientTimeout(total=30),
             headers={'User-Agent': self.user_agent}
         ) as session:
@@ -67,7 +75,7 @@ class FreeGamesParser:
                 'l': 'english'
             }
             
-            async with self.session.get(url, params=params) as response:
+            async with limited_get(self.session, url, params=params) as response:
                 if response.status != 200:
                     logger.warning(f"Steam request failed with status {response.status}")
                     return games
@@ -78,11 +86,10 @@ class FreeGamesParser:
                 if not html_content:
                     return games
                 
-                soup = BeautifulSoup(html_content, 'html.parser')
-                game_containers = soup.find_all('a', class_='search_result_row')
+                rows = parse_search_results(html_content)
                 
-                for container in game_containers[:10]:  # Ограничиваем до 10
-                    game_info = await self._parse_steam_free_game(container)
+                for row in rows[:10]:  # Ограничиваем до 10
+                    game_info = self._parse_steam_free_game(row)
                     if game_info:
                         games.append(game_info)
                         
@@ -91,40 +98,21 @@ class FreeGamesParser:
         
         return games
     
-    async def _parse_steam_free_game(self, container) -> Optional[Dict]:
-        """Парсинг информации о бесплатной игре Steam"""
-        try:
-            # Название игры
-            title_elem = container.find('span', class_='title')
-            if not title_elem:
-                return None
-            title = title_elem.get_text(strip=True)
-            
-            # URL игры
-            game_url = container.get('href', '')
-            
-            # Проверяем что игра действительно бесплатная
-            price_elem = container.find('div', class_='search_price')
-            if not price_elem or 'free' not in price_elem.get_text(strip=True).lower():
-                return None
-            
-            # Дата релиза
-            release_elem = container.find('div', class_='search_released')
-            release_date = release_elem.get_text(strip=True) if release_elem else "Неизвестно"
-            
-            return {
-                'title': title,
-                'description': f'Бесплатная игра в Steam',
-                'platform': 'Steam',
-                'url': game_url,
-                'end_date': 'Навсегда',
-                'image_url': '',
-                'release_date': release_date
-            }
-            
-        except Exception as e:
-            logger.error(f"Error parsing Steam game: {e}")
+    def _parse_steam_free_game(self, row: Dict) -> Optional[Dict]:
+        """Информация о бесплатной игре Steam из строки результатов поиска"""
+        # Проверяем что игра действительно бесплатная
+        if 'free' not in row['price_text'].lower():
             return None
+        
+        return {
+            'title': row['title'],
+            'description': f'Бесплатная игра в Steam',
+            'platform': 'Steam',
+            'url': row['url'],
+            'end_date': 'Навсегда',
+            'image_url': '',
+            'release_date': row['release_date'] or "Неизвестно"
+        }
     
     async def _get_epic_free_games(self) -> List[Dict]:
         """Получение бесплатных игр из Epic Games Store"""
@@ -138,7 +126,7 @@ class FreeGamesParser:
                 'allowCountries': 'US'
             }
             
-            async with self.session.get(url, params=params) as response:
+            async with limited_get(self.session, url, params=params) as response:
                 if response.status != 200:
                     logger.warning(f"Epic Games request failed with status {response.status}")
                     return games
@@ -237,7 +225,7 @@ class FreeGamesParser:
                 'sort': 'popularity'
             }
             
-            async with self.session.get(url, params=params) as response:
+            async with limited_get(self.session, url, params=params) as response:
                 if response.status != 200:
                     logger.warning(f"GOG request failed with status {response.status}")
                     return games
@@ -0,0 +1,244 @@
+"""
+Рейтинг игр для еженедельного дайджеста
+Рейтинг складывается из скидки, популярности серии, ценовой категории,
+бонуса за популярные жанры и штрафов за DLC и старые игры.
+Списки ключевых слов компилируются в одно регулярное выражение (trie) на список,
+а score_many считает рейтинг пачки скидок векторно (numpy) и одним проходом
+регулярного выражения по всем названиям сразу
+"""
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Известные популярные игры/серии (бонус +30 баллов)
+POPULAR_KEYWORDS = [
+    'cyberpunk', 'witcher', 'gta', 'elder scrolls', 'fallout', 'assassin',
+    'call of duty', 'battlefield', 'counter-strike', 'dota', 'steam',
+    'fifa', 'tomb raider', 'far cry', 'watch dogs', 'rainbow six',
+    'grand theft', 'red dead', 'mass effect', 'dragon age', 'bioshock',
+    'borderlands', 'civilization', 'total war', 'mortal kombat', 'tekken',
+    'street fighter', 'dark souls', 'elden ring', 'sekiro', 'bloodborne',
+    'resident evil', 'silent hill', 'dead space', 'metro', 'stalker',
+    'dying light', 'left 4 dead', 'portal', 'half-life', 'team fortress',
+    'dishonored', 'prey', 'doom', 'wolfenstein', 'quake', 'unreal',
+    'forza', 'need for speed', 'burnout', 'dirt', 'f1', 'wreckfest',
+    'xcom', 'cities skylines', 'europa universalis', 'crusader kings',
+    'hearts of iron', 'stellaris', 'age of empires', 'starcraft',
+    'warcraft', 'world of warcraft', 'overwatch', 'diablo', 'heroes',
+    'destiny', 'division', 'ghost recon', 'splinter cell', 'prince',
+    'just cause', 'saints row', 'mafia', 'hitman', 'deus ex',
+    'batman', 'spider-man', 'mortal kombat', 'injustice', 'marvel',
+    'dc comics', 'lego', 'minecraft', 'terraria', 'stardew valley',
+    'hollow knight', 'ori and', 'cuphead', 'celeste', 'hades',
+    'rocket league', 'fall guys', 'among us', 'valheim', 'rust',
+    'pubg', 'fortnite', 'apex legends', 'titanfall', 'warframe'
+]
+
+# Свежие/популярные жанры (+5 баллов), ищутся в названии и описании
+TRENDING_KEYWORDS = [
+    'battle royale', 'survival', 'crafting', 'open world', 'rpg',
+    'multiplayer', 'co-op', 'indie', 'early access', 'vr',
+    'roguelike', 'metroidvania', 'soulslike', 'tactical', 'strategy'
+]
+
+# Штраф за DLC/Season Pass (-15 баллов)
+DLC_KEYWORDS = ['dlc', 'season pass', 'expansion', 'add-on', 'downloadable content']
+
+# Штраф за очень старые игры (примерно по году в названии, -10 баллов)
+OLD_YEARS = ['2010', '2011', '2012', '2013', '2014', '2015']
+
+POPULARITY_BONUS = 30
+TRENDING_BONUS = 5
+DLC_PENALTY = 15
+OLD_GAME_PENALTY = 10
+MAX_DISCOUNT_SCORE = 90
+MAX_SCORE = 200
+
+# Разделитель названий при поиске по всей пачке: не встречается в ключевых словах,
+# поэтому совпадение не может захватить два названия
+_SEPARATOR = '\x00'
+
+
+def compile_keywords(keywords: Iterable[str]) -> 're.Pattern':
+    """
+    Одно регулярное выражение, находящее любое из ключевых слов как подстроку
+
+    Слова собираются в префиксное дерево (trie), чтобы движок регулярных
+    выражений не перебирал все альтернативы в каждой позиции текста.
+    """
+    trie: Dict[str, Dict] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict[str, Dict]) -> str:
+        alternatives = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ''
+        if len(alternatives) == 1:
+            body = alternatives[0]
+            # Слово заканчивается в этом узле: продолжение необязательно
+            return f'(?:{body})?' if '' in node else body
+        body = '(?:' + '|'.join(alternatives) + ')'
+        return body + '?' if '' in node else body
+
+    return re.compile(build(trie))
+
+
+def parse_price(discounted_price) -> float:
+    """Числовая цена из строки цены ('499₽', '$9,99'), 0.0 если разобрать не удалось"""
+    try:
+        price_str = str(discounted_price).replace('₽', '').replace('$', '').replace(',', '.').strip()
+        return float(price_str) if price_str else 0.0
+    except ValueError:
+        return 0.0
+
+
+class GameScorer:
+    """Рейтинг игр для еженедельного дайджеста"""
+
+    def __init__(self):
+        self.popular = compile_keywords(POPULAR_KEYWORDS)
+        self.trending = compile_keywords(TRENDING_KEYWORDS)
+        self.dlc = compile_keywords(DLC_KEYWORDS)
+        self.old_years = compile_keywords(OLD_YEARS)
+
+    @staticmethod
+    def _price_score(price: float) -> int:
+        if 0 < price <= 500:       # Доступные игры
+            return 25
+        if 500 < price <= 1500:    # Средний сегмент
+            return 20
+        if 1500 < price <= 3000:   # Премиум игры
+            return 15
+        return 5                   # Очень дорогие и без цены
+
+    def score(self, deal: Dict, price: Optional[float] = None) -> float:
+        """
+        Рейтинг одной игры
+
+        Args:
+            deal: скидка (discount, title, discounted_price, description)
+            price: уже разобранная цена, чтобы не разбирать строку цены повторно
+        """
+        try:
+            discount = deal.get('discount', 0)
+            title = deal.get('title', '').lower()
+            if price is None:
+                price = parse_price(deal.get('discounted_price', '0'))
+
+            discount_score = min(discount, MAX_DISCOUNT_SCORE)
+            popularity_score = POPULARITY_BONUS if self.popular.search(title) else 0
+            price_score = self._price_score(price)
+
+            full_text = title + ' ' + deal.get('description', '').lower()
+            bonus_score = TRENDING_BONUS if self.trending.search(full_text) else 0
+
+            penalty = 0
+            if self.dlc.search(title):
+                penalty += DLC_PENALTY
+            if self.old_years.search(title):
+                penalty += OLD_GAME_PENALTY
+
+            final_score = discount_score + popularity_score + price_score + bonus_score - penalty
+            final_score = max(0, min(final_score, MAX_SCORE))
+
+            logger.debug(f"Game score for '{deal.get('title', '')}': {final_score} "
+                         f"(discount: {discount_score}, popularity: {popularity_score}, "
+                         f"price: {price_score}, bonus: {bonus_score}, penalty: {penalty})")
+            return final_score
+
+        except Exception as e:
+            logger.error(f"Error calculating game score: {e}")
+            return deal.get('discount', 0)  # Fallback к рейтингу по скидке
+
+    def _rows_matching(self, pattern: 're.Pattern', texts: List[str]) -> 'np.ndarray':
+        """Маска строк, в которых есть хотя бы одно ключевое слово (один проход по всем текстам)"""
+        import numpy as np
+
+        mask = np.zeros(len(texts), dtype=bool)
+        if not texts:
+            return mask
+
+        lengths = np.fromiter((len(text) + 1 for text in texts), dtype=np.int64, count=len(texts))
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        match_starts = np.fromiter(
+            (match.start() for match in pattern.finditer(_SEPARATOR.join(texts))), dtype=np.int64
+        )
+        if match_starts.size:
+            mask[np.searchsorted(starts, match_starts, side='right') - 1] = True
+        return mask
+
+    def score_many(self, deals: Sequence[Dict], prices: Optional[Sequence[float]] = None) -> List[float]:
+        """
+        Рейтинг пачки игр, совпадает с score() для каждой игры
+
+        Args:
+            deals: скидки
+            prices: уже разобранные цены в том же порядке (необязательно)
+        """
+        if prices is None:
+            prices = [parse_price(deal.get('discounted_price', '0')) for deal in deals]
+
+        scores: List[float] = [0] * len(deals)
+        batch = []
+        for position, deal in enumerate(deals):
+            discount = deal.get('discount', 0)
+            title = deal.get('title', '')
+            description = deal.get('description', '')
+            # Нестандартные записи считаются по одной, с тем же fallback, что и в score()
+            if (type(discount) is int and abs(discount) < 10 ** 9
+                    and isinstance(title, str) and isinstance(description, str)):
+                batch.append(position)
+            else:
+                scores[position] = self.score(deal, prices[position])
+
+        if not batch:
+            return scores
+
+        # numpy нужен только для дайджеста - не загружаем его при старте бота
+        import numpy as np
+
+        titles = [deals[position].get('title', '').lower() for position in batch]
+        full_texts = [
+            title + ' ' + deals[position].get('description', '').lower()
+            for title, position in zip(titles, batch)
+        ]
+        discounts = np.array([deals[position].get('discount', 0) for position in batch], dtype=np.int64)
+        batch_prices = np.array([prices[position] for position in batch], dtype=np.float64)
+
+        price_scores = np.select(
+            [(batch_prices > 0) & (batch_prices <= 500),
+             (batch_prices > 500) & (batch_prices <= 1500),
+             (batch_prices > 1500) & (batch_prices <= 3000)],
+            [25, 20, 15],
+            default=5
+        )
+        final_scores = (
+            np.minimum(discounts, MAX_DISCOUNT_SCORE)
+            + POPULARITY_BONUS * self._rows_matching(self.popular, titles)
+            + price_scores
+            + TRENDING_BONUS * self._rows_matching(self.trending, full_texts)
+            - DLC_PENALTY * self._rows_matching(self.dlc, titles)
+            - OLD_GAME_PENALTY * self._rows_matching(self.old_years, titles)
+        )
+        final_scores = np.clip(final_scores, 0, MAX_SCORE)
+
+        for position, score in zip(batch, final_scores.tolist()):
+            scores[position] = score
+        return scores
+
+
+_shared_scorer: Optional[GameScorer] = None
+
+
+def get_game_scorer() -> GameScorer:
+    """Общий экземпляр (регулярные выражения компилируются один раз)"""
+    global _shared_scorer
+    if _shared_scorer is None:
+        _shared_scorer = GameScorer()
+    return _shared_scorer
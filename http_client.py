@@ -0,0 +1,148 @@
+"""
+Общий HTTP-клиент бота
+Одна aiohttp-сессия на все приложение: соединения к Steam, Epic и GOG
+переиспользуются (keep-alive), DNS-ответы кэшируются, число соединений
+к одному хосту ограничено, а заголовки по умолчанию одинаковы для всех
+парсеров. Клиент запускается и останавливается вместе с Application
+"""
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+import aiohttp
+
+from config import (
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_CONNECTIONS_PER_HOST, HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_DNS_CACHE_TTL, HTTP_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_USER_AGENT
+)
+from rate_limiter import TokenBucket, get_host_limiter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'User-Agent': HTTP_USER_AGENT,
+    'Accept': 'text/html,application/json,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9,ru;q=0.8',
+}
+
+
+class HttpClient:
+    """Долгоживущая aiohttp-сессия с общим пулом соединений"""
+
+    def __init__(self, limit: int = HTTP_MAX_CONNECTIONS, limit_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+                 keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT, dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+                 timeout: float = HTTP_TIMEOUT, connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 headers: Optional[Dict[str, str]] = None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.headers = dict(DEFAULT_HEADERS, **(headers or {}))
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop = None
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl,
+            # Соединения не закрываются после ответа: следующий запрос
+            # к тому же хосту идет по уже установленному TLS-соединению
+            force_close=False,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            headers=self.headers,
+            version=aiohttp.HttpVersion11
+        )
+
+    async def start(self) -> aiohttp.ClientSession:
+        """
+        Создает сессию, если она еще не создана
+
+        Сессия и ее соединения привязаны к event loop, в котором созданы:
+        пока она открыта, использовать клиент из другого loop нельзя -
+        сначала ее нужно закрыть через close() в ее собственном loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed and self._session_loop is not loop:
+            raise RuntimeError("HttpClient session is open in another event loop; close it there first")
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+            self._session_loop = loop
+            logger.info(f"HTTP client started: {self.limit} connections, {self.limit_per_host} per host")
+        return self._session
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Общая сессия; при первом обращении создается автоматически"""
+        return await self.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._session is None or self._session.closed
+
+    async def close(self):
+        """Закрывает сессию и все соединения пула"""
+        session, self._session = self._session, None
+        self._session_loop = None
+        if session is not None and not session.closed:
+            await session.close()
+            logger.info("HTTP client closed")
+
+
+@asynccontextmanager
+async def client_session(http_client: Optional[HttpClient] = None, **session_kwargs):
+    """
+    Сессия общего клиента или, если он не передан, временная собственная
+
+    Общая сессия при выходе не закрывается - ее закрывает владелец клиента.
+    """
+    if http_client is not None:
+        yield await http_client.get_session()
+    else:
+        async with aiohttp.ClientSession(**session_kwargs) as session:
+            yield session
+
+
+@asynccontextmanager
+async def limited_get(session, url: str, limiter: Optional[TokenBucket] = None, **kwargs):
+    """
+    GET-запрос через ограничитель частоты хоста
+
+    Перед запросом ждет разрешения ограничителя, а статус ответа (или ошибку
+    соединения) сообщает ему обратно - так AIMD подстраивает частоту.
+    По умолчанию используется общий ограничитель хоста из url.
+    """
+    limiter = limiter or get_host_limiter(url)
+    await limiter.acquire()
+    responded = False
+    try:
+        async with session.get(url, **kwargs) as response:
+            responded = True
+            retry_after = response.headers.get('Retry-After') if response.status == 429 else None
+            limiter.observe(response.status, retry_after)
+            yield response
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        # Ошибки разбора ответа - не признак перегрузки хоста
+        if not responded:
+            limiter.observe_error()
+        raise
+
+
+_shared_client: Optional[HttpClient] = None
+_shared_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Общий для всего бота HTTP-клиент"""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient()
+        return _shared_client
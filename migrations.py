@@ -0,0 +1,335 @@
+"""
+Версионные миграции схемы базы данных
+Текущая версия схемы хранится в PRAGMA user_version. При запуске
+применяются только миграции с большим номером, каждая в своей транзакции,
+поэтому проверять схему в обычных запросах больше не нужно
+"""
+import logging
+import sqlite3
+from typing import Callable, List, Tuple
+
+from config import PRICE_RECENT_LOW_DAYS
+
+logger = logging.getLogger(__name__)
+
+
+def _get_columns(cursor: sqlite3.Cursor, table: str) -> List[str]:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [column[1] for column in cursor.fetchall()]
+
+
+def _migration_1_initial_schema(cursor: sqlite3.Cursor):
+    """Исходная схема (для баз, созданных до появления миграций, - недостающие колонки)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            is_subscribed BOOLEAN DEFAULT 0,
+            min_discount INTEGER DEFAULT 30,
+            preferred_genres TEXT DEFAULT '[]',
+            language TEXT DEFAULT 'ru',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    if 'language' not in _get_columns(cursor, 'users'):
+        cursor.execute("ALTER TABLE users ADD COLUMN language TEXT DEFAULT 'ru'")
+
+    # Таблица истории цен
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            app_id TEXT,
+            game_title TEXT,
+            price REAL,
+            discount INTEGER,
+            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Таблица бесплатных игр
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS free_games (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT,
+            description TEXT,
+            platform TEXT,
+            url TEXT,
+            end_date TEXT,
+            image_url TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Таблица топовых игр недели
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS weekly_top (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            game_title TEXT,
+            discount INTEGER,
+            original_price TEXT,
+            discounted_price TEXT,
+            url TEXT,
+            rating REAL DEFAULT 0.0,
+            week_start DATE,
+            score REAL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    if 'score' not in _get_columns(cursor, 'weekly_top'):
+        cursor.execute('ALTER TABLE weekly_top ADD COLUMN score REAL DEFAULT 0')
+
+    # Таблица отзывов и предложений
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            username TEXT,
+            feedback_type TEXT DEFAULT 'general',
+            message TEXT NOT NULL,
+            rating INTEGER DEFAULT NULL,
+            is_resolved BOOLEAN DEFAULT 0,
+            admin_response TEXT DEFAULT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _migration_2_app_metadata(cursor: sqlite3.Cursor):
+    """Кэш метаданных игр Steam (название/жанры и цена с разными TTL)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS app_metadata (
+            app_id TEXT PRIMARY KEY,
+            name TEXT,
+            genres TEXT,
+            static_updated_at REAL,
+            price_info TEXT,
+            price_cc TEXT,
+            volatile_updated_at REAL
+        )
+    ''')
+
+
+def _migration_3_indexes(cursor: sqlite3.Cursor):
+    """Индексы для истории цен и выборок пользователей"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_price_history_app_recorded ON price_history (app_id, recorded_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_subscribed ON users (is_subscribed)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_language ON users (language)')
+
+
+def _migration_4_broadcast_outbox(cursor: sqlite3.Cursor):
+    """Очередь рассылок: позволяет продолжить рассылку после перезапуска"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            status TEXT DEFAULT 'enqueuing',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_outbox (
+            broadcast_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            variant_key TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            chunks_sent INTEGER DEFAULT 0,
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (broadcast_id, user_id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_broadcasts_kind_status ON broadcasts (kind, status)')
+
+
+def _migration_5_scheduled_jobs(cursor: sqlite3.Cursor):
+    """Время следующего запуска задач планировщика"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            name TEXT PRIMARY KEY,
+            next_run_at REAL NOT NULL,
+            last_run_at REAL
+        )
+    ''')
+
+
+def _migration_6_deal_state(cursor: sqlite3.Cursor):
+    """Последние увиденные скидки для рассылки только изменений"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS deal_state (
+            app_id TEXT PRIMARY KEY,
+            title TEXT,
+            discount INTEGER NOT NULL,
+            price REAL,
+            is_active BOOLEAN DEFAULT 1,
+            first_seen_at REAL,
+            last_seen_at REAL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_deal_state_active ON deal_state (is_active)')
+
+
+def _migration_7_weekly_top_by_week(cursor: sqlite3.Cursor):
+    """Еженедельный топ по неделям: одна (лучшая) запись игры в неделе"""
+    columns = _get_columns(cursor, 'weekly_top')
+    if 'week_start' not in columns:
+        cursor.execute('ALTER TABLE weekly_top ADD COLUMN week_start DATE')
+
+    # Понедельник недели, в которую была добавлена запись
+    created = 'created_at' if 'created_at' in columns else "'now'"
+    cursor.execute(f"UPDATE weekly_top SET week_start = date({created}, '-6 days', 'weekday 1') WHERE week_start IS NULL")
+
+    # INSERT OR REPLACE без уникального ключа копил дубликаты - оставляем лучшую запись
+    cursor.execute('''
+        DELETE FROM weekly_top WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY week_start, game_title
+                    ORDER BY COALESCE(score, discount) DESC, id DESC
+                ) AS position
+                FROM weekly_top
+            ) WHERE position = 1
+        )
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_weekly_top_week_title ON weekly_top (week_start, game_title)')
+
+
+def _migration_8_price_series(cursor: sqlite3.Cursor):
+    """
+    История цен как серии неизменной цены (run-length encoding),
+    дневные/недельные агрегаты и минимальная цена каждой игры
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_rollups (
+            app_id TEXT NOT NULL,
+            resolution TEXT NOT NULL,
+            bucket_start DATE NOT NULL,
+            min_price REAL,
+            max_price REAL,
+            last_price REAL,
+            last_discount INTEGER,
+            PRIMARY KEY (app_id, resolution, bucket_start)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_extremes (
+            app_id TEXT PRIMARY KEY,
+            game_title TEXT,
+            min_price REAL,
+            min_price_at TIMESTAMP,
+            last_price REAL,
+            last_seen_on DATE
+        )
+    ''')
+
+    # Агрегаты и минимумы считаются по всем старым записям, затем
+    # записи, повторяющие предыдущую цену игры, удаляются
+    cursor.execute('''
+        SELECT id, app_id, game_title, price, discount, recorded_at,
+               date(recorded_at), date(recorded_at, '-6 days', 'weekday 1')
+        FROM price_history
+        WHERE price IS NOT NULL AND recorded_at IS NOT NULL
+        ORDER BY app_id, recorded_at, id
+    ''')
+    repeated, rollups, extremes = [], {}, {}
+    previous = None
+    for row_id, app_id, title, price, discount, recorded_at, day, week in cursor.fetchall():
+        if previous == (app_id, price, discount):
+            repeated.append((row_id,))
+        previous = (app_id, price, discount)
+
+        for resolution, bucket_start in (('day', day), ('week', week)):
+            rollup = rollups.get((app_id, resolution, bucket_start))
+            if rollup is None:
+                rollups[(app_id, resolution, bucket_start)] = [price, price, price, discount]
+            else:
+                rollup[:] = [min(rollup[0], price), max(rollup[1], price), price, discount]
+
+        extreme = extremes.get(app_id)
+        if extreme is None or price < extreme[1]:
+            extremes[app_id] = [title, price, recorded_at, price, day]
+        else:
+            extreme[0], extreme[3], extreme[4] = title, price, day
+
+    cursor.executemany('DELETE FROM price_history WHERE id = ?', repeated)
+    cursor.executemany(
+        'INSERT OR REPLACE INTO price_rollups VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [key + tuple(values) for key, values in rollups.items()]
+    )
+    cursor.executemany(
+        'INSERT OR REPLACE INTO price_extremes VALUES (?, ?, ?, ?, ?, ?)',
+        [(app_id, *values) for app_id, values in extremes.items()]
+    )
+
+
+def _migration_9_recent_price_low(cursor: sqlite3.Cursor):
+    """Минимум цены за последние PRICE_RECENT_LOW_DAYS дней рядом с историческим минимумом"""
+    columns = _get_columns(cursor, 'price_extremes')
+    if 'recent_min_price' not in columns:
+        cursor.execute('ALTER TABLE price_extremes ADD COLUMN recent_min_price REAL')
+    if 'recent_min_on' not in columns:
+        cursor.execute('ALTER TABLE price_extremes ADD COLUMN recent_min_on DATE')
+
+    cursor.execute('''
+        UPDATE price_extremes SET (recent_min_price, recent_min_on) = (
+            SELECT min_price, bucket_start FROM price_rollups
+            WHERE price_rollups.app_id = price_extremes.app_id
+              AND resolution = 'day' AND bucket_start >= date('now', ?)
+            ORDER BY min_price, bucket_start DESC
+            LIMIT 1
+        )
+    ''', (f'-{PRICE_RECENT_LOW_DAYS} days',))
+
+
+def _migration_10_broadcast_payload(cursor: sqlite3.Cursor):
+    """Данные рассылки (например, список скидок) хранятся вместе с ней"""
+    if 'payload' not in _get_columns(cursor, 'broadcasts'):
+        cursor.execute('ALTER TABLE broadcasts ADD COLUMN payload TEXT')
+
+
+# Новые миграции добавляются только в конец списка, номера не меняются
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, "initial schema", _migration_1_initial_schema),
+    (2, "app metadata cache", _migration_2_app_metadata),
+    (3, "price_history and users indexes", _migration_3_indexes),
+    (4, "broadcast outbox", _migration_4_broadcast_outbox),
+    (5, "scheduled jobs", _migration_5_scheduled_jobs),
+    (6, "deal state", _migration_6_deal_state),
+    (7, "weekly top by week", _migration_7_weekly_top_by_week),
+    (8, "price series", _migration_8_price_series),
+    (9, "recent price low", _migration_9_recent_price_low),
+    (10, "broadcast payload", _migration_10_broadcast_payload),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Текущая версия схемы базы данных"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def apply_migrations(conn: sqlite3.Connection) -> int:
+    """
+    Применяет недостающие миграции
+
+    Returns:
+        Версия схемы после применения миграций
+    """
+    version = get_schema_version(conn)
+    for migration_version, description, migrate in MIGRATIONS:
+        if migration_version <= version:
+            continue
+
+        with conn:
+            conn.execute('BEGIN')
+            migrate(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {migration_version}')
+        version = migration_version
+        logger.info(f"Applied database migration {migration_version}: {description}")
+    return version
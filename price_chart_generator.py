@@ -2,25 +2,62 @@
 Модуль для генерации графиков изменения цен игр
 Использует matplotlib для создания графиков
 """
+import matplotlib
+matplotlib.use('Agg')  # Графики только сохраняются в PNG
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import numpy as np
 import io
 import random
-import aiohttp
 import asyncio
 import logging
+import re
 from typing import List, Dict, Optional, Tuple
 
+from app_metadata_cache import get_app_metadata_cache
+from chart_cache import ChartImageCache, chart_cache_key, get_chart_cache
+from chart_renderer import render_chart
+from config import PRICE_HISTORY_DAILY_RETENTION_DAYS, CHART_DPI
+from database import DatabaseManager
+from http_client import HttpClient, client_session, limited_get
+
 logger = logging.getLogger(__name__)
 
+# Подписи графика на языках бота
+CHART_LABELS = {
+    'ru': {
+        'price': 'Цена',
+        'base_price': 'Базовая цена',
+        'date': 'Дата',
+        'price_axis': 'Цена (₽)',
+        'title': 'График изменения цены: {game_name}',
+        'info': 'Текущая цена: {current}₽\nМинимум: {minimum}₽\nМаксимум: {maximum}₽',
+    },
+    'en': {
+        'price': 'Price',
+        'base_price': 'Base price',
+        'date': 'Date',
+        'price_axis': 'Price (₽)',
+        'title': 'Price history: {game_name}',
+        'info': 'Current price: {current}₽\nLowest: {minimum}₽\nHighest: {maximum}₽',
+    },
+}
+
 class PriceChartGenerator:
-    def __init__(self):
+    def __init__(self, db: Optional[DatabaseManager] = None, http_client: Optional[HttpClient] = None):
+        # История цен; по умолчанию - база общего кэша метаданных
+        self.db = db
+        # Общий HTTP-клиент для поиска игр; без него - собственная сессия на запрос
+        self.http_client = http_client
         # Настройка matplotlib для русского языка
         plt.rcParams['font.family'] = ['DejaVu Sans', 'Liberation Sans', 'Arial']
         plt.rcParams['axes.unicode_minus'] = False
         
+    def get_db(self) -> DatabaseManager:
+        """База с историей цен"""
+        return self.db or get_app_metadata_cache().db
+        
     def generate_sample_price_data(self, game_name: str, months: int = 6) -> List[Dict]:
         """Генерирует примерные данные о ценах для демонстрации"""
         end_date = datetime.now()
@@ -52,22 +89,45 @@ class PriceChartGenerator:
         
         return prices
     
-    async def get_real_price_data(self, app_id: str) -> List[Dict]:
-        """Получает реальные данные о ценах (заглушка для будущей интеграции с SteamDB)"""
+    async def get_real_price_data(self, app_id: str, months: int = 6) -> Optional[List[Dict]]:
+        """
+        Реальные цены игры из истории цен бота
+
+        Точки - дневные агрегаты (цена на конец дня) за последние months месяцев,
+        для периодов длиннее срока хранения дневных агрегатов - недельные.
+        None, если цен игры меньше двух точек.
+        """
         try:
-            # Здесь можно добавить интеграцию с реальными API
-            # Например, SteamDB, IsThereAnyDeal, или SteamSpy
-            
-            # Пока возвращаем None, чтобы использовать sample данные
-            return None
+            if not app_id or not app_id.isdigit():
+                return None
+
+            days = months * 30
+            resolution = 'day' if days <= PRICE_HISTORY_DAILY_RETENTION_DAYS else 'week'
+            since = datetime.now(timezone.utc) - timedelta(days=days)
+            series = await asyncio.to_thread(self.get_db().get_price_series, app_id, since, resolution)
+            if len(series) < 2:
+                return None
+
+            price_data = []
+            for point in series:
+                discount = point['discount'] or 0
+                original_price = point['price'] / (1 - discount / 100) if 0 < discount < 100 else point['price']
+                price_data.append({
+                    'date': datetime.strptime(point['date'], '%Y-%m-%d'),
+                    'price': point['price'],
+                    'original_price': round(original_price, 2)
+                })
+            return price_data
             
         except Exception as e:
             logger.error(f"Error getting real price data: {e}")
             return None
     
-    def create_price_chart(self, game_name: str, price_data: List[Dict]) -> io.BytesIO:
+    def create_price_chart(self, game_name: str, price_data: List[Dict], language: str = 'ru') -> io.BytesIO:
         """Создает график изменения цен"""
         try:
+            labels = CHART_LABELS.get(language, CHART_LABELS['ru'])
+            
             # Настройка размера и стиля графика
             plt.style.use('default')
             fig, ax = plt.subplots(figsize=(12, 7))
@@ -78,17 +138,21 @@ class PriceChartGenerator:
             original_prices = [item['original_price'] for item in price_data]
             
             # Строим основной график цены
-            ax.plot(dates, prices, linewidth=2.5, color='#1f77b4', label='Цена', marker='o', markersize=4)
+            ax.plot(dates, prices, linewidth=2.5, color='#1f77b4', label=labels['price'], marker='o', markersize=4)
             
             # Добавляем линию оригинальной цены
             if original_prices and len(set(original_prices)) > 1:
-                ax.axhline(y=original_prices[0], color='red', linestyle='--', alpha=0.7, label='Базовая цена')
+                ax.axhline(y=original_prices[0], color='red', linestyle='--', alpha=0.7, label=labels['base_price'])
             
-            # Заливка области скидок
+            # Точки со скидкой больше 10% - одним scatter, подпись только в начале каждой скидки
+            discounted = [price < orig_price * 0.9 for price, orig_price in zip(prices, original_prices)]
+            if any(discounted):
+                ax.scatter([date for date, is_discounted in zip(dates, discounted) if is_discounted],
+                           [price for price, is_discounted in zip(prices, discounted) if is_discounted],
+                           color='red', s=80, zorder=5)
             for i, (date, price, orig_price) in enumerate(zip(dates, prices, original_prices)):
-                if price < orig_price * 0.9:  # Если скидка больше 10%
+                if discounted[i] and (i == 0 or not discounted[i - 1] or price != prices[i - 1]):
                     discount_percent = int((1 - price / orig_price) * 100)
-                    ax.scatter(date, price, color='red', s=80, zorder=5)
                     ax.annotate(f'-{discount_percent}%', 
                               (date, price), 
                               xytext=(10, 10), 
@@ -97,9 +161,9 @@ class PriceChartGenerator:
                               color='white', fontsize=9, fontweight='bold')
             
             # Настройка осей
-            ax.set_xlabel('Дата', fontsize=12, fontweight='bold')
-            ax.set_ylabel('Цена (₽)', fontsize=12, fontweight='bold')
-            ax.set_title(f'График изменения цены: {game_name}', fontsize=14, fontweight='bold', pad=20)
+            ax.set_xlabel(labels['date'], fontsize=12, fontweight='bold')
+            ax.set_ylabel(labels['price_axis'], fontsize=12, fontweight='bold')
+            ax.set_title(labels['title'].format(game_name=game_name), fontsize=14, fontweight='bold', pad=20)
             
             # Форматирование дат на оси X
             ax.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
@@ -118,18 +182,17 @@ class PriceChartGenerator:
             max_price = max(prices)
             current_price = prices[-1]
             
-            info_text = f'Текущая цена: {current_price}₽\nМинимум: {min_price}₽\nМаксимум: {max_price}₽'
+            info_text = labels['info'].format(current=current_price, minimum=min_price, maximum=max_price)
             ax.text(0.02, 0.98, info_text, transform=ax.transAxes, 
                    verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8),
                    fontsize=10)
             
-            # Плотная компоновка
+            # Плотная компоновка (bbox_inches='tight' не нужен - это второй проход рендера)
             plt.tight_layout()
             
             # Сохраняем в байты
             buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=300, bbox_inches='tight', 
-                       facecolor='white', edgecolor='none')
+            plt.savefig(buf, format='png', dpi=CHART_DPI, facecolor='white', edgecolor='none')
             buf.seek(0)
             
             # Очищаем память
@@ -145,17 +208,29 @@ class PriceChartGenerator:
     async def search_game_by_name(self, game_name: str) -> Optional[Dict]:
         """Ищет игру в Steam по названию"""
         try:
+            cache = get_app_metadata_cache()
+            cached = await asyncio.to_thread(cache.find_by_name, game_name)
+            if cached:
+                return {
+                    'id': int(cached['app_id']),
+                    'name': cached['name'],
+                    'tiny_image': None,
+                    'small_capsule_image': None
+                }
+            
             # Упрощенный поиск игры
             url = f"https://store.steampowered.com/api/storesearch/?term={game_name}&l=russian&cc=RU"
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
+            async with client_session(self.http_client) as session:
+                async with limited_get(session, url) as response:
                     if response.status == 200:
                         data = await response.json()
                         items = data.get('items', [])
                         
                         if items:
                             game = items[0]  # Берем первый результат
+                            if game.get('id') and game.get('name'):
+                                await asyncio.to_thread(cache.update_static, {str(game['id']): {'name': game['name']}})
                             return {
                                 'id': game.get('id'),
                                 'name': game.get('name'),
@@ -169,31 +244,91 @@ class PriceChartGenerator:
             logger.error(f"Error searching game: {e}")
             return None
 
-async def generate_price_chart(game_name: str) -> Tuple[Optional[io.BytesIO], Optional[Dict]]:
-    """Основная функция для генерации графика цен"""
+def extract_game_id_from_url(text: str) -> Optional[str]:
+    """
+    app_id из ссылки на игру в Steam или из строки, состоящей только из цифр
+
+    Поддерживаются ссылки магазина и сообщества (.../app/1091500/...)
+    и steam://store/1091500. None - это название игры.
+    """
+    text = (text or '').strip()
+    if text.isdigit():
+        return text
+    match = re.search(r'(?:/app/|steam://store/)(\d+)', text)
+    return match.group(1) if match else None
+
+
+async def _resolve_game(generator: PriceChartGenerator, query: str) -> Dict:
+    """Игра по ссылке, app_id или названию; по ссылке и app_id - без запросов к Steam"""
+    app_id = extract_game_id_from_url(query)
+    if app_id is None:
+        return await generator.search_game_by_name(query) or {'name': query, 'id': None}
+
+    names = await asyncio.to_thread(get_app_metadata_cache().get_names, [app_id])
+    name = names.get(app_id)
+    if not name:
+        extremes = await asyncio.to_thread(generator.get_db().get_price_minimum, app_id)
+        name = extremes['title'] if extremes and extremes['title'] else f"App {app_id}"
+    return {'id': int(app_id), 'name': name}
+
+
+async def generate_price_chart(game_name: str, language: str = 'ru', chart_cache: Optional[ChartImageCache] = None,
+                               db: Optional[DatabaseManager] = None,
+                               http_client: Optional[HttpClient] = None) -> Tuple[Optional[io.BytesIO], Optional[Dict]]:
+    """
+    Основная функция для генерации графика цен
+
+    Args:
+        game_name: название игры, ссылка на нее в Steam или app_id
+        language: язык подписей графика
+        chart_cache: кэш готовых графиков (по умолчанию общий)
+        db: база с историей цен (по умолчанию база общего кэша метаданных)
+        http_client: общий HTTP-клиент для поиска игры по названию
+
+    Returns:
+        (PNG, информация об игре); data_source в информации об игре:
+        'cache', 'history' или 'sample' (история цен игры еще не собрана)
+    """
     try:
-        generator = PriceChartGenerator()
+        generator = PriceChartGenerator(db, http_client)
+        if chart_cache is None:
+            chart_cache = get_chart_cache()
         
-        # Ищем игру
-        game_info = await generator.search_game_by_name(game_name)
+        game_info = await _resolve_game(generator, game_name)
+        app_id = str(game_info['id']) if game_info.get('id') else None
         
-        if not game_info:
-            # Если не нашли, создаем базовую информацию
-            game_info = {'name': game_name, 'id': None}
+        # Пока цена игры не менялась и окно графика не сдвинулось, график тот же - отдаем готовый PNG
+        cache_key = None
+        if app_id:
+            last_change = await asyncio.to_thread(generator.get_db().get_last_price_change, app_id)
+            if last_change:
+                today = datetime.now(timezone.utc).date().isoformat()
+                cache_key = chart_cache_key(app_id, last_change, language, today)
+                cached = await asyncio.to_thread(chart_cache.get, cache_key)
+                if cached is not None:
+                    game_info['data_source'] = 'cache'
+                    return io.BytesIO(cached), game_info
         
         # Пытаемся получить реальные данные
-        real_data = await generator.get_real_price_data(str(game_info.get('id', '')))
+        real_data = await generator.get_real_price_data(app_id or '')
         
         # Если нет реальных данных, генерируем примерные
         if not real_data:
             price_data = generator.generate_sample_price_data(game_info['name'])
+            game_info['data_source'] = 'sample'
         else:
             price_data = real_data
+            game_info['data_source'] = 'history'
+        
+        # Создаем график в пуле процессов, не блокируя event loop
+        png = await render_chart(game_info['name'], price_data, language)
+        if png is None:
+            return None, game_info
         
-        # Создаем график
-        chart_buffer = generator.create_price_chart(game_info['name'], price_data)
+        if real_data and cache_key:
+            await asyncio.to_thread(chart_cache.put, cache_key, png)
         
-        return chart_buffer, game_info
+        return io.BytesIO(png), game_info
         
     except Exception as e:
         logger.error(f"Error generating price chart: {e}")
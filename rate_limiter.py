@@ -0,0 +1,178 @@
+"""
+Ограничители частоты запросов к внешним API
+"""
+import asyncio
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from config import HOST_RATE_LIMITS, HOST_RATE_DEFAULT, RATE_LIMIT_INCREASE, RATE_LIMIT_DECREASE
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Пауза из заголовка Retry-After (секунды или HTTP-дата) или None"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def retry_delay(retry_after, base: float, attempt: int) -> float:
+    """Пауза перед повтором: Retry-After, а если его нет - экспоненциальная"""
+    delay = parse_retry_after(retry_after)
+    if delay is not None:
+        return delay
+    return base * (2 ** attempt)
+
+
+class TokenBucket:
+    """
+    Token bucket: в среднем не больше rate запросов в секунду,
+    с возможностью короткого всплеска до burst запросов
+
+    Токен резервируется под блокировкой, а ожидание идет уже без нее,
+    поэтому один ограничитель можно использовать из разных потоков и event loop.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        """Пополняет токены за прошедшее время"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def _reserve(self) -> float:
+        """Занимает токен и возвращает, сколько ждать до отправки запроса (в секундах)"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            # Отрицательный остаток - очередь уже занятых токенов
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    async def acquire(self):
+        """Ждет, пока можно будет отправить следующий запрос"""
+        delay = self._reserve()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            # Пока ждали, сервер мог попросить подождать (429) - ждут все воркеры
+            delay = self.blocked_until - time.monotonic()
+
+    def acquire_blocking(self):
+        """То же, что acquire, для синхронного кода в потоках"""
+        delay = self._reserve()
+        while delay > 0:
+            time.sleep(delay)
+            delay = self.blocked_until - time.monotonic()
+
+    def pause(self, seconds: float):
+        """Приостанавливает выдачу токенов (например, после ответа 429)"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = min(self.tokens, 0.0)
+        logger.info(f"Rate limiter paused for {seconds:.1f}s")
+
+    def observe(self, status: int, retry_after=None):
+        """Обратная связь по ответу сервера: частота постоянная, учитывается только Retry-After"""
+        if status == 429:
+            delay = parse_retry_after(retry_after)
+            if delay:
+                self.pause(delay)
+
+    def observe_error(self):
+        """Обратная связь по ошибке сети; постоянной частоте она не нужна"""
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """
+    Token bucket с AIMD-подстройкой частоты по ответам сервера
+
+    Каждый успешный ответ немного поднимает частоту (аддитивно, примерно на
+    increase запросов/с за секунду работы на полной скорости), а 429, 5xx
+    и ошибки сети снижают ее в 1/decrease раз. Так частота держится у
+    максимума, который сервер выдерживает без ошибок, вместо
+    заранее выбранной осторожной константы.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, min_rate: Optional[float] = None,
+                 max_rate: Optional[float] = None, increase: float = RATE_LIMIT_INCREASE,
+                 decrease: float = RATE_LIMIT_DECREASE, name: str = ''):
+        super().__init__(rate, burst)
+        self.min_rate = min_rate if min_rate is not None else rate
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.increase = increase
+        self.decrease = decrease
+        self.name = name
+        # Ответы на запросы, отправленные до снижения, не снижают частоту повторно
+        self._hold_until = 0.0
+
+    def _slow_down(self, reason: str):
+        with self._lock:
+            now = time.monotonic()
+            if now < self._hold_until:
+                return
+            self._refill(now)
+            old_rate = self.rate
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._hold_until = now + max(1.0, 1 / self.rate)
+        logger.info(f"Rate limit for {self.name or 'host'} lowered after {reason}: {old_rate:.2f} -> {self.rate:.2f} req/s")
+
+    def observe(self, status: int, retry_after=None):
+        """Поднимает частоту после успешного ответа и снижает после 429/5xx"""
+        if status == 429 or status >= 500:
+            self._slow_down(f"HTTP {status}")
+            super().observe(status, retry_after)
+        elif status < 400:
+            with self._lock:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def observe_error(self):
+        """Таймауты и обрывы соединения - тоже признак перегрузки"""
+        self._slow_down("network error")
+
+
+def rate_limit_key(url: str) -> str:
+    """Ключ ограничителя: хост, а для Epic и GOG - один ключ на все их хосты"""
+    host = (urlsplit(url).hostname if '://' in url else url) or ''
+    host = host.lower()
+    if host == 'gog.com' or host.endswith('.gog.com'):
+        return 'gog'
+    if host.startswith('store-site-backend-static') and host.endswith('.epicgames.com'):
+        return 'store-site-backend-static.ak.epicgames.com'
+    return host
+
+
+_host_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_host_limiters_lock = threading.Lock()
+
+
+def get_host_limiter(url: str) -> AdaptiveRateLimiter:
+    """Общий для всего бота ограничитель запросов к хосту из url"""
+    key = rate_limit_key(url)
+    with _host_limiters_lock:
+        limiter = _host_limiters.get(key)
+        if limiter is None:
+            rate, min_rate, max_rate, burst = HOST_RATE_LIMITS.get(key, HOST_RATE_DEFAULT)
+            limiter = AdaptiveRateLimiter(rate, burst, min_rate, max_rate, name=key)
+            _host_limiters[key] = limiter
+        return limiter
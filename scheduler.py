@@ -0,0 +1,210 @@
+"""
+Планировщик периодических задач бота в основном event loop
+Поддерживает интервальные и cron-расписания, случайный сдвиг (jitter),
+догоняющий запуск пропущенных задач, защиту от наложения запусков
+и хранение времени следующего запуска в базе данных
+"""
+import asyncio
+import inspect
+import logging
+import random
+import time
+from datetime import datetime, timedelta, tzinfo
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Union
+from zoneinfo import ZoneInfo
+
+from config import SCHEDULER_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+
+class IntervalTrigger:
+    """Запуск через равные промежутки времени"""
+
+    def __init__(self, hours: float = 0, minutes: float = 0, seconds: float = 0):
+        self.interval = hours * 3600 + minutes * 60 + seconds
+        if self.interval <= 0:
+            raise ValueError("Interval must be positive")
+
+    def next_after(self, timestamp: float) -> float:
+        return timestamp + self.interval
+
+    def __repr__(self):
+        return f"every {self.interval:.0f}s"
+
+
+class CronTrigger:
+    """
+    Cron-расписание из 5 полей: минута, час, день месяца, месяц, день недели
+
+    Поля поддерживают *, числа, списки (1,15), диапазоны (1-5) и шаг (*/10).
+    День недели: 0 или 7 - воскресенье, 1 - понедельник и т.д.
+    """
+
+    FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression: str, timezone: Union[str, tzinfo] = SCHEDULER_TIMEZONE):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: {expression!r}")
+
+        self.expression = expression
+        self.timezone = ZoneInfo(timezone) if isinstance(timezone, str) else timezone
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse_field(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES)
+        )
+        # В cron 7 и 0 - воскресенье, у datetime.weekday() воскресенье - 6
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self.day_restricted = fields[2] != '*'
+        self.weekday_restricted = fields[4] != '*'
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step_text = part.split('/')
+                step = int(step_text)
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-'))
+            else:
+                start = end = int(part)
+            if start < low or end > high or step < 1:
+                raise ValueError(f"Invalid cron field: {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = dt.weekday() in self.weekdays
+        # Как в cron: если заданы оба поля, достаточно совпадения одного
+        if self.day_restricted and self.weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, timestamp: float) -> float:
+        dt = datetime.fromtimestamp(timestamp, self.timezone).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Ищем ближайшую подходящую минуту, пропуская целые месяцы, дни и часы
+        for _ in range(100000):
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt.timestamp()
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+    def __repr__(self):
+        return f"cron '{self.expression}'"
+
+
+class Job:
+    """Задача планировщика"""
+
+    def __init__(self, name: str, func: Callable[[], Union[Awaitable, None]], trigger,
+                 jitter: float = 0, catch_up: bool = True):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.jitter = jitter
+        self.catch_up = catch_up
+        self.next_run_at: Optional[float] = None
+        self.lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+
+    def compute_next_run(self, now: float) -> float:
+        return self.trigger.next_after(now) + (random.uniform(0, self.jitter) if self.jitter else 0)
+
+
+class AsyncScheduler:
+    """
+    Планировщик задач в event loop бота
+
+    Время следующего запуска каждой задачи хранится в таблице scheduled_jobs.
+    Если бот был выключен в момент запуска, задача с catch_up=True выполняется
+    один раз сразу после старта. Запуск, совпавший с еще идущим выполнением
+    той же задачи, пропускается.
+    """
+
+    def __init__(self, async_db):
+        self.async_db = async_db
+        self.jobs: Dict[str, Job] = {}
+
+    def add_job(self, name: str, func: Callable[[], Union[Awaitable, None]], trigger,
+                jitter: float = 0, catch_up: bool = True) -> Job:
+        """Регистрирует задачу (до вызова start)"""
+        job = Job(name, func, trigger, jitter, catch_up)
+        self.jobs[name] = job
+        return job
+
+    async def start(self):
+        """Восстанавливает расписание из базы и запускает задачи"""
+        saved = await self.async_db.get_scheduled_jobs()
+        now = time.time()
+
+        for job in self.jobs.values():
+            next_run_at = saved.get(job.name)
+            if next_run_at is None:
+                next_run_at = job.compute_next_run(now)
+            elif next_run_at <= now:
+                if job.catch_up:
+                    logger.info(f"Job '{job.name}' missed its run at {datetime.fromtimestamp(next_run_at)}, catching up")
+                    next_run_at = now
+                else:
+                    next_run_at = job.compute_next_run(now)
+
+            job.next_run_at = next_run_at
+            await self.async_db.save_scheduled_job(job.name, next_run_at)
+            job.task = asyncio.get_running_loop().create_task(self._run_job_loop(job))
+            logger.info(f"Scheduled job '{job.name}' ({job.trigger}), next run at {datetime.fromtimestamp(next_run_at)}")
+
+    async def stop(self):
+        """Останавливает задачи планировщика"""
+        tasks: List[asyncio.Task] = [job.task for job in self.jobs.values() if job.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in self.jobs.values():
+            job.task = None
+
+    async def _run_job_loop(self, job: Job):
+        while True:
+            await asyncio.sleep(max(0.0, job.next_run_at - time.time()))
+            await self.run_job(job.name)
+
+            # Следующий запуск считается от момента окончания: пропущенные
+            # во время долгого выполнения запуски не накапливаются
+            job.next_run_at = job.compute_next_run(time.time())
+            await self.async_db.save_scheduled_job(job.name, job.next_run_at, time.time())
+
+    async def run_job(self, name: str) -> bool:
+        """
+        Выполняет задачу сейчас, если она еще не выполняется
+
+        Returns:
+            False, если задача уже выполнялась и запуск пропущен
+        """
+        job = self.jobs[name]
+        if job.lock.locked():
+            logger.warning(f"Job '{name}' is still running, skipping overlapping run")
+            return False
+
+        async with job.lock:
+            started = time.monotonic()
+            try:
+                result = job.func()
+                if inspect.isawaitable(result):
+                    await result
+                logger.info(f"Job '{name}' finished in {time.monotonic() - started:.1f}s")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error running job '{name}': {e}")
+        return True
@@ -0,0 +1,299 @@
+"""
+Разбор HTML результатов поиска Steam (results_html из /search/results/)
+Быстрый бэкенд на lxml с заранее скомпилированными XPath-выражениями
+и запасной бэкенд на BeautifulSoup, если lxml не установлен.
+Оба бэкенда возвращают одинаковые словари для каждой строки результатов
+"""
+import logging
+import re
+from typing import Dict, List, Optional
+
+from config import SEARCH_PARSER_BACKEND
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+APP_ID_RE = re.compile(r'/app/(\d+)/')
+DISCOUNT_TEXT_RE = re.compile(r'-(\d+)%')
+DISCOUNT_SPAN_TEXT_RE = re.compile(r'-?(\d+)%')
+DISCOUNT_CLASS_RE = re.compile(r'discount')
+
+
+def _make_row(title: str, url: str, app_id: int, discount: int, original_price: str, discounted_price: str,
+              price_text: str, release_date: str, platform_classes: List[List[str]], genres: List[str]) -> Dict:
+    """Общая для бэкендов сборка словаря строки"""
+    platforms = []
+    for classes in platform_classes:
+        if any('win' in cls for cls in classes):
+            platforms.append('Windows')
+        elif any('mac' in cls for cls in classes):
+            platforms.append('Mac')
+        elif any('linux' in cls for cls in classes):
+            platforms.append('Linux')
+
+    return {
+        'title': title,
+        'url': url,
+        'app_id': app_id,
+        'discount': discount,
+        'original_price': original_price,
+        'discounted_price': discounted_price,
+        'price_text': price_text,
+        'release_date': release_date,
+        'platforms': platforms,
+        'genres': genres
+    }
+
+
+def _parse_app_id(appid_attr: Optional[str], url: str) -> int:
+    """app_id из data-ds-appid или из URL"""
+    if appid_attr:
+        try:
+            return int(appid_attr)
+        except (ValueError, TypeError):
+            return 0
+    if url:
+        match = APP_ID_RE.search(url)
+        if match:
+            return int(match.group(1))
+    return 0
+
+
+class BeautifulSoupSearchParser:
+    """Запасной бэкенд на BeautifulSoup (html.parser)"""
+
+    name = 'bs4'
+
+    def parse(self, html: str) -> List[Dict]:
+        # bs4 импортируется только если используется этот бэкенд
+        import bs4
+
+        soup = bs4.BeautifulSoup(html, 'html.parser')
+        rows = []
+        for container in soup.find_all('a', class_='search_result_row'):
+            try:
+                row = self._parse_row(container)
+            except Exception as e:
+                logger.error(f"Error parsing game container: {e}")
+                continue
+            if row:
+                rows.append(row)
+        return rows
+
+    def _parse_row(self, container) -> Optional[Dict]:
+        title_elem = container.find('span', class_='title')
+        if not title_elem:
+            return None
+
+        url = container.get('href', '')
+        app_id = _parse_app_id(container.get('data-ds-appid'), url)
+
+        # Скидка: атрибут data-discount, затем текст блока скидки, затем любые span со скидкой
+        discount = 0
+        discount_div = container.find('div', attrs={'data-discount': True})
+        if discount_div:
+            try:
+                discount = int(discount_div.get('data-discount', 0))
+            except (ValueError, TypeError):
+                pass
+
+        if discount == 0:
+            discount_elem = container.find('div', class_='search_discount')
+            if discount_elem:
+                match = DISCOUNT_TEXT_RE.search(discount_elem.get_text(strip=True))
+                if match:
+                    discount = int(match.group(1))
+
+        if discount == 0:
+            for span in container.find_all('span', class_=DISCOUNT_CLASS_RE):
+                match = DISCOUNT_SPAN_TEXT_RE.search(span.get_text(strip=True))
+                if match:
+                    discount = int(match.group(1))
+                    break
+
+        original_price = ""
+        discounted_price = ""
+        price_containers = [
+            container.find('div', class_='search_price_discount_combined'),
+            container.find('div', class_='search_price'),
+            container.find('div', class_='col search_price_discount_combined responsive_secondrow')
+        ]
+        for price_container in price_containers:
+            if price_container:
+                original_elem = price_container.find('span', class_='search_discount_orig_price')
+                if original_elem:
+                    original_price = original_elem.get_text(strip=True)
+                discounted_elem = price_container.find('span', class_='search_discount_final_price')
+                if discounted_elem:
+                    discounted_price = discounted_elem.get_text(strip=True)
+                if original_price or discounted_price:
+                    break
+
+        price_elem = container.find('div', class_='search_price')
+        release_elem = container.find('div', class_='search_released')
+
+        platform_classes = [
+            icon.get('class', [])
+            for icon in container.find_all('span', class_=lambda x: x and 'platform_img' in x)
+        ]
+
+        genres = [
+            text for text in (tag.get_text(strip=True) for tag in container.find_all('span', class_='search_tag'))
+            if text
+        ]
+        if not genres:
+            genre_container = container.find('div', class_='search_misc_row')
+            if genre_container:
+                for link in genre_container.find_all('a'):
+                    text = link.get_text(strip=True)
+                    if text and text not in genres:
+                        genres.append(text)
+
+        return _make_row(
+            title_elem.get_text(strip=True), url, app_id, discount, original_price, discounted_price,
+            price_elem.get_text(strip=True) if price_elem else "",
+            release_elem.get_text(strip=True) if release_elem else "",
+            platform_classes, genres
+        )
+
+
+if LXML_AVAILABLE:
+    def _has_class(tag: str, cls: str) -> str:
+        return f"descendant::{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')]"
+
+    def _first(path: str) -> 'etree.XPath':
+        return etree.XPath(f"({path})[1]")
+
+    class LxmlSearchParser:
+        """Быстрый бэкенд на lxml: один разбор страницы и скомпилированные XPath"""
+
+        name = 'lxml'
+
+        ROWS = etree.XPath("//a[contains(concat(' ', normalize-space(@class), ' '), ' search_result_row ')]")
+        TEXT = etree.XPath("descendant-or-self::text()")
+        TITLE = _first(_has_class('span', 'title'))
+        DISCOUNT_ATTR = _first("descendant::div[@data-discount]")
+        SEARCH_DISCOUNT = _first(_has_class('div', 'search_discount'))
+        DISCOUNT_SPANS = etree.XPath("descendant::span[contains(@class, 'discount')]")
+        PRICE_CONTAINERS = [
+            _first(_has_class('div', 'search_price_discount_combined')),
+            _first(_has_class('div', 'search_price')),
+            _first("descendant::div[@class = 'col search_price_discount_combined responsive_secondrow']")
+        ]
+        ORIGINAL_PRICE = _first(_has_class('span', 'search_discount_orig_price'))
+        FINAL_PRICE = _first(_has_class('span', 'search_discount_final_price'))
+        SEARCH_PRICE = _first(_has_class('div', 'search_price'))
+        RELEASED = _first(_has_class('div', 'search_released'))
+        PLATFORMS = etree.XPath("descendant::span[contains(@class, 'platform_img')]")
+        TAGS = etree.XPath(_has_class('span', 'search_tag'))
+        MISC_ROW = _first(_has_class('div', 'search_misc_row'))
+        LINKS = etree.XPath("descendant::a")
+
+        def parse(self, html: str) -> List[Dict]:
+            root = lxml_html.document_fromstring(html)
+            rows = []
+            for container in self.ROWS(root):
+                try:
+                    row = self._parse_row(container)
+                except Exception as e:
+                    logger.error(f"Error parsing game container: {e}")
+                    continue
+                if row:
+                    rows.append(row)
+            return rows
+
+        def _text(self, element) -> str:
+            """Аналог get_text(strip=True) из BeautifulSoup"""
+            return ''.join(text.strip() for text in self.TEXT(element))
+
+        def _first_text(self, xpath, element) -> Optional[str]:
+            found = xpath(element)
+            return self._text(found[0]) if found else None
+
+        def _parse_row(self, container) -> Optional[Dict]:
+            title = self._first_text(self.TITLE, container)
+            if title is None:
+                return None
+
+            url = container.get('href', '')
+            app_id = _parse_app_id(container.get('data-ds-appid'), url)
+
+            discount = 0
+            discount_div = self.DISCOUNT_ATTR(container)
+            if discount_div:
+                try:
+                    discount = int(discount_div[0].get('data-discount', 0))
+                except (ValueError, TypeError):
+                    pass
+
+            if discount == 0:
+                discount_text = self._first_text(self.SEARCH_DISCOUNT, container)
+                if discount_text:
+                    match = DISCOUNT_TEXT_RE.search(discount_text)
+                    if match:
+                        discount = int(match.group(1))
+
+            if discount == 0:
+                for span in self.DISCOUNT_SPANS(container):
+                    match = DISCOUNT_SPAN_TEXT_RE.search(self._text(span))
+                    if match:
+                        discount = int(match.group(1))
+                        break
+
+            original_price = ""
+            discounted_price = ""
+            for price_xpath in self.PRICE_CONTAINERS:
+                found = price_xpath(container)
+                if found:
+                    original_price = self._first_text(self.ORIGINAL_PRICE, found[0]) or original_price
+                    discounted_price = self._first_text(self.FINAL_PRICE, found[0]) or discounted_price
+                    if original_price or discounted_price:
+                        break
+
+            platform_classes = [(icon.get('class') or '').split() for icon in self.PLATFORMS(container)]
+
+            genres = [text for text in (self._text(tag) for tag in self.TAGS(container)) if text]
+            if not genres:
+                misc_row = self.MISC_ROW(container)
+                if misc_row:
+                    for link in self.LINKS(misc_row[0]):
+                        text = self._text(link)
+                        if text and text not in genres:
+                            genres.append(text)
+
+            return _make_row(
+                title, url, app_id, discount, original_price, discounted_price,
+                self._first_text(self.SEARCH_PRICE, container) or "",
+                self._first_text(self.RELEASED, container) or "",
+                platform_classes, genres
+            )
+
+
+def get_search_parser(backend: str = SEARCH_PARSER_BACKEND):
+    """
+    Бэкенд разбора результатов поиска
+
+    Args:
+        backend: 'lxml', 'bs4' или 'auto' (lxml, если установлен)
+    """
+    if backend in ('auto', 'lxml') and LXML_AVAILABLE:
+        return LxmlSearchParser()
+    if backend == 'lxml':
+        logger.warning("lxml is not installed, falling back to BeautifulSoup search parser")
+    return BeautifulSoupSearchParser()
+
+
+def parse_search_results(html: str) -> List[Dict]:
+    """Разбирает results_html выбранным в конфиге бэкендом"""
+    if not html:
+        return []
+    return _default_parser.parse(html)
+
+
+_default_parser = get_search_parser()
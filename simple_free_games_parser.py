@@ -6,12 +6,15 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import re
 
+from http_client import HttpClient, client_session, limited_get
+
 logger = logging.getLogger(__name__)
 
 class SimpleFreeGamesParser:
     """Упрощенный парсер для получения бесплатных игр"""
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[HttpClient] = None):
+        self.http_client = http_client
         self.user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     
     async def get_all_free_games(self) -> List[Dict]:
@@ -115,7 +118,7 @@ class SimpleFreeGamesParser:
         
         try:
             timeout = aiohttp.ClientTimeout(total=15)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with client_session(self.http_client, timeout=timeout) as session:
                 url = "https://store-site-backend-static-ipv4.ak.epicgames.com/freeGamesPromotions"
                 params = {
                     'locale': 'en-US',
@@ -130,7 +133,7 @@ class SimpleFreeGamesParser:
                     'Cache-Control': 'no-cache'
                 }
                 
-                async with session.get(url, params=params, headers=headers) as response:
+                async with limited_get(session, url, params=params, headers=headers, timeout=timeout) as response:
                     if response.status == 200:
                         try:
                             data = await response.json()
@@ -218,9 +221,9 @@ class SimpleFreeGamesParser:
             return None
 
 # Функция для получения актуальной информации о раздачах
-async def get_current_free_games() -> List[Dict]:
+async def get_current_free_games(http_client: Optional[HttpClient] = None) -> List[Dict]:
     """Главная функция для получения актуальных бесплатных игр"""
-    parser = SimpleFreeGamesParser()
+    parser = SimpleFreeGamesParser(http_client)
     
     try:
         games = await parser.get_all_free_games()
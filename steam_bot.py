@@ -1,21 +1,28 @@
-import asyncio
-import json
 import logging
 import os
 from datetime import datetime, timedelta
 from typing import List
 from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, ContextTypes, CallbackQueryHandler
-import schedule
 import time
-import threading
 from steam_scraper import SteamScraper
+from deals_cache import DealsCache
 from database import DatabaseManager
-from steam_wishlist import get_wishlist_discounts
-from steam_library import get_steam_library, get_recently_played_games
-from ai_recommendations import get_game_recommendations
-from ai_game_recommendations import get_ai_game_recommendations
-from config import OPENROUTER_API_KEY, AI_RECOMMENDATIONS_ENABLED, AI_MAX_RECOMMENDATIONS
+from async_database import AsyncDatabase
+from app_metadata_cache import get_app_metadata_cache
+from broadcast import BroadcastEngine, language_key, filter_profile_key
+from deal_state import DealStateStore, deal_price
+from deal_index import DealIndex
+from game_scorer import get_game_scorer, parse_price
+from weekly_top import WeeklyTopAggregator
+from scheduler import AsyncScheduler, IntervalTrigger, CronTrigger
+from chart_renderer import shutdown_chart_renderer
+from http_client import get_http_client
+from config import (
+    OPENROUTER_API_KEY, AI_RECOMMENDATIONS_ENABLED, AI_MAX_RECOMMENDATIONS,
+    NOTIFICATION_INTERVAL, WEEKLY_DIGEST_CRON, SCHEDULER_JITTER, STATES_CLEANUP_INTERVAL,
+    WEEKLY_TOP_FLUSH_INTERVAL, PRICE_HISTORY_RETENTION_INTERVAL, PRICE_RECENT_LOW_DAYS
+)
 from translations import get_text, get_available_languages
 import re
 
@@ -30,9 +37,27 @@ class SteamDiscountBot:
     def __init__(self, bot_token: str):
         self.bot_token = bot_token
         self.bot = Bot(token=bot_token)
-        self.application = Application.builder().token(bot_token).build()
+        self.application = (
+            Application.builder()
+            .token(bot_token)
+            .post_init(self.on_startup)
+            .post_shutdown(self.on_shutdown)
+            .build()
+        )
         self.db = DatabaseManager()
-        self.scraper = SteamScraper()
+        # Кэш метаданных игр работает через те же соединения, что и бот
+        get_app_metadata_cache(self.db)
+        # Обработчики работают с базой через отдельный поток, не блокируя event loop
+        self.async_db = AsyncDatabase(self.db)
+        self.broadcast_engine = BroadcastEngine(self.application.bot, self.async_db)
+        self.deal_state = DealStateStore(self.async_db)
+        self.game_scorer = get_game_scorer()
+        self.weekly_top = WeeklyTopAggregator(self.async_db)
+        self.scheduler = AsyncScheduler(self.async_db)
+        # Одна HTTP-сессия с общим пулом соединений для всех парсеров
+        self.http_client = get_http_client()
+        self.scraper = SteamScraper(self.http_client)
+        self.deals_cache = DealsCache(self.scraper, http_client=self.http_client, async_db=self.async_db)
         
         # Жанры Steam
         self.available_genres = [
@@ -82,6 +107,9 @@ class SteamDiscountBot:
         # Инициализируем базу с примерами бесплатных игр
         self.init_sample_data()
         
+        # Периодические рассылки и обслуживание
+        self.setup_jobs()
+        
     def init_sample_data(self):
         """Инициализация примеров данных"""
         # Добавляем примеры бесплатных игр
@@ -118,6 +146,58 @@ class SteamDiscountBot:
             for game in sample_free_games:
                 self.db.add_free_game(**game)
     
+    def setup_jobs(self):
+        """Регистрирует периодические задачи бота"""
+        self.scheduler.add_job(
+            'deals',
+            self.send_deals_to_subscribers,
+            IntervalTrigger(hours=NOTIFICATION_INTERVAL),
+            jitter=SCHEDULER_JITTER
+        )
+        # Еженедельный дайджест: по умолчанию каждое воскресенье в 18:00 МСК
+        self.scheduler.add_job(
+            'weekly_digest',
+            self.send_weekly_digest_to_all,
+            CronTrigger(WEEKLY_DIGEST_CRON),
+            jitter=SCHEDULER_JITTER
+        )
+        self.scheduler.add_job(
+            'cleanup_states',
+            self.cleanup_expired_states,
+            IntervalTrigger(minutes=STATES_CLEANUP_INTERVAL),
+            catch_up=False
+        )
+        self.scheduler.add_job(
+            'weekly_top_flush',
+            self.weekly_top.flush,
+            IntervalTrigger(minutes=WEEKLY_TOP_FLUSH_INTERVAL),
+            catch_up=False
+        )
+        self.scheduler.add_job(
+            'price_retention',
+            self.async_db.apply_price_retention,
+            IntervalTrigger(hours=PRICE_HISTORY_RETENTION_INTERVAL),
+            catch_up=False
+        )
+    
+    async def on_startup(self, application: Application):
+        """Вызывается после инициализации Application"""
+        await self.http_client.start()
+        self.deals_cache.start()
+        await self.weekly_top.load()
+        # Пропущенные за время простоя рассылки выполняются сразу,
+        # прерванные - продолжаются с места остановки через очередь рассылок
+        await self.scheduler.start()
+    
+    async def on_shutdown(self, application: Application):
+        """Вызывается при остановке Application"""
+        await self.scheduler.stop()
+        await self.deals_cache.stop()
+        await self.weekly_top.flush()
+        await shutdown_chart_renderer()
+        await self.http_client.close()
+        await self.async_db.close()
+    
     def set_user_state(self, user_id: int, state: str):
         """Устанавливает состояние пользователя с таймаутом"""
         import time
@@ -157,10 +237,10 @@ class SteamDiscountBot:
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
         user = update.effective_user
-        self.db.add_user(user.id, user.username, user.first_name, user.last_name)
+        await self.async_db.add_user(user.id, user.username, user.first_name, user.last_name)
         
         # Проверяем, выбрал ли пользователь язык
-        user_language = self.db.get_user_language(user.id)
+        user_language = await self.async_db.get_user_language(user.id)
         
         # Если язык не установлен или это новый пользователь, показываем выбор языка
         if not user_language or user_language == 'ru':
@@ -219,7 +299,7 @@ class SteamDiscountBot:
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /help"""
         user_id = update.effective_user.id
-        language = self.db.get_user_language(user_id)
+        language = await self.async_db.get_user_language(user_id)
         
         help_message = f"""
 {get_text(language, 'all_commands')}
@@ -248,12 +328,12 @@ class SteamDiscountBot:
         """Обработчик команды /subscribe"""
         user_id = update.effective_user.id
         user = update.effective_user
-        language = self.db.get_user_language(user_id)
+        language = await self.async_db.get_user_language(user_id)
         
         # Добавляем пользователя если его нет
-        self.db.add_user(user_id, user.username, user.first_name, user.last_name)
+        await self.async_db.add_user(user_id, user.username, user.first_name, user.last_name)
         
-        if self.db.subscribe_user(user_id):
+        if await self.async_db.subscribe_user(user_id):
             response = get_text(language, 'subscribed_success')
             await update.message.reply_text(response)
         else:
@@ -262,9 +342,9 @@ class SteamDiscountBot:
     async def unsubscribe_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /unsubscribe"""
         user_id = update.effective_user.id
-        language = self.db.get_user_language(user_id)
+        language = await self.async_db.get_user_language(user_id)
         
-        if self.db.unsubscribe_user(user_id):
+        if await self.async_db.unsubscribe_user(user_id):
             await update.message.reply_text(get_text(language, 'unsubscribed_success'))
         else:
             await update.message.reply_text(get_text(language, 'not_subscribed'))
@@ -273,10 +353,10 @@ class SteamDiscountBot:
         """Обработчик команды /genres - настройка жанров"""
         user_id = update.effective_user.id
         user = update.effective_user
-        language = self.db.get_user_language(user_id)
-        self.db.add_user(user_id, user.username, user.first_name, user.last_name)
+        language = await self.async_db.get_user_language(user_id)
+        await self.async_db.add_user(user_id, user.username, user.first_name, user.last_name)
         
-        current_genres = self.db.get_user_genres(user_id)
+        current_genres = await self.async_db.get_user_genres(user_id)
         
         # Создаем inline клавиатуру с жанрами
         keyboard = []
@@ -314,8 +394,8 @@ class SteamDiscountBot:
         """Обработчик команды /free - бесплатные раздачи"""
         user_id = update.effective_user.id
         user = update.effective_user
-        language = self.db.get_user_language(user_id)
-        self.db.add_user(user_id, user.username, user.first_name, user.last_name)
+        language = await self.async_db.get_user_language(user_id)
+        await self.async_db.add_user(user_id, user.username, user.first_name, user.last_name)
         
         await update.message.reply_text(get_text(language, 'searching_free_games'))
         
@@ -324,7 +404,7 @@ class SteamDiscountBot:
             from simple_free_games_parser import get_current_free_games
             
             # Получаем реальные данные
-            all_games = await get_current_free_games()
+            all_games = await get_current_free_games(self.http_client)
             
             # Обновляем базу данных актуальными играми
             await self._update_database_with_live_games(all_games)
@@ -382,16 +462,12 @@ class SteamDiscountBot:
         """Обновляет базу данных актуальными играми"""
         try:
             # Очищаем старые записи
-            import sqlite3
-            with sqlite3.connect(self.db.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('DELETE FROM free_games WHERE created_at < datetime("now", "-1 day")')
-                conn.commit()
+            await self.async_db.delete_old_free_games()
             
             # Добавляем новые игры
             for game in games:
                 try:
-                    self.db.add_free_game(
+                    await self.async_db.add_free_game(
                         title=game.get('title', 'Неизвестная игра'),
                         description=game.get('description', 'Описание отсутствует'),
                         platform=game.get('platform', 'Other'),
@@ -409,10 +485,10 @@ class SteamDiscountBot:
         """Обработчик команды /discount - настройка минимальной скидки"""
         user_id = update.effective_user.id
         user = update.effective_user
-        language = self.db.get_user_language(user_id)
-        self.db.add_user(user_id, user.username, user.first_name, user.last_name)
+        language = await self.async_db.get_user_language(user_id)
+        await self.async_db.add_user(user_id, user.username, user.first_name, user.last_name)
         
-        current_discount = self.db.get_user_min_discount(user_id)
+        current_discount = await self.async_db.get_user_min_discount(user_id)
         
         # Создаем inline клавиатуру с вариантами скидок
         keyboard = [
@@ -438,9 +514,9 @@ class SteamDiscountBot:
         """Обработчик команды /settings - показ настроек пользователя"""
         user_id = update.effective_user.id
         user = update.effective_user
-        self.db.add_user(user_id, user.username, user.first_name, user.last_name)
+        await self.async_db.add_user(user_id, user.username, user.first_name, user.last_name)
         
-        settings = self.db.get_user_settings(user_id)
+        settings = await self.async_db.get_user_settings(user_id)
         language = settings.get('language', 'ru')
         
         subscription_status = get_text(language, 'subscribed') if settings['is_subscribed'] else get_text(language, 'not_subscribed_status')
@@ -484,7 +560,7 @@ class SteamDiscountBot:
         language = data.replace("lang_", "")
         
         # Сохраняем выбранный язык
-        self.db.set_user_language(user_id, language)
+        await self.async_db.set_user_language(user_id, language)
         
         # Отправляем подтверждение и приветственное сообщение
         await query.edit_message_text(get_text(language, 'language_changed'))
@@ -516,7 +592,7 @@ class SteamDiscountBot:
     
     async def handle_change_language_callback(self, query, user_id: int):
         """Обработка callback для смены языка из настроек"""
-        current_language = self.db.get_user_language(user_id)
+        current_language = await self.async_db.get_user_language(user_id)
         
         keyboard = [
             [
@@ -534,12 +610,12 @@ class SteamDiscountBot:
     
     async def handle_genre_callback(self, query, user_id: int, data: str):
         """Обработка callback для жанров"""
-        language = self.db.get_user_language(user_id)
-        current_genres = self.db.get_user_genres(user_id)
+        language = await self.async_db.get_user_language(user_id)
+        current_genres = await self.async_db.get_user_genres(user_id)
         
         if data == "genre_clear":
             # Очищаем все жанры
-            self.db.set_user_genres(user_id, [])
+            await self.async_db.set_user_genres(user_id, [])
             if language == 'ru':
                 message = "🎮 <b>Все жанры очищены!</b>\n\nТеперь будут показываться игры всех жанров.\n\nИспользуйте /genres для новых настроек."
             else:
@@ -565,7 +641,7 @@ class SteamDiscountBot:
             else:
                 current_genres.append(genre)
             
-            self.db.set_user_genres(user_id, current_genres)
+            await self.async_db.set_user_genres(user_id, current_genres)
         
         # Обновляем клавиатуру
         keyboard = []
@@ -599,9 +675,9 @@ class SteamDiscountBot:
     
     async def handle_discount_callback(self, query, user_id: int, data: str):
         """Обработка callback для настройки скидки"""
-        language = self.db.get_user_language(user_id)
+        language = await self.async_db.get_user_language(user_id)
         discount_value = int(data.replace("discount_", ""))
-        self.db.set_user_min_discount(user_id, discount_value)
+        await self.async_db.set_user_min_discount(user_id, discount_value)
         
         message = get_text(language, 'discount_updated', discount=discount_value)
         if language == 'ru':
@@ -613,7 +689,7 @@ class SteamDiscountBot:
 
     async def handle_feedback_callback(self, query, user_id: int, data: str):
         """Обработка callback для отзывов"""
-        language = self.db.get_user_language(user_id)
+        language = await self.async_db.get_user_language(user_id)
         user = query.from_user
         username = user.username or user.first_name or str(user_id)
         
@@ -637,7 +713,7 @@ class SteamDiscountBot:
             
         elif data == "feedback_stats":
             # Показываем статистику отзывов
-            stats = self.db.get_feedback_stats()
+            stats = await self.async_db.get_feedback_stats()
             if stats.get('total', 0) > 0:
                 message = (
                     f"📊 **Статистика отзывов**\n\n"
@@ -658,28 +734,29 @@ class SteamDiscountBot:
     async def deals_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /deals"""
         user_id = update.effective_user.id
-        language = self.db.get_user_language(user_id)
+        language = await self.async_db.get_user_language(user_id)
         
         await update.message.reply_text(get_text(language, 'searching_deals'))
         
         try:
             # Регистрируем пользователя если его нет в базе
-            self.db.add_user(user_id)
+            await self.async_db.add_user(user_id)
             
             # Получаем настройки пользователя
-            user_genres = self.db.get_user_genres(user_id)
-            min_discount = self.db.get_user_min_discount(user_id)
+            user_genres = await self.async_db.get_user_genres(user_id)
+            min_discount = await self.async_db.get_user_min_discount(user_id)
             
-            deals = await self.scraper.get_discounted_games()
+            deals_index = await self.deals_cache.get_index()
+            deals = deals_index.deals
             
             # Фильтруем игры по пользовательским настройкам
-            filtered_deals = self.filter_deals_by_user_preferences(deals, user_genres, min_discount)
+            filtered_deals = deals_index.match(min_discount, user_genres)
             
             # Обновляем данные для еженедельного дайджеста
-            self.update_weekly_digest_data(deals)
+            await self.update_weekly_digest_data(deals)
             
             if filtered_deals:
-                message = self.format_deals_message(filtered_deals, user_id, language)
+                message = await self.format_deals_message(filtered_deals, user_id, language)
                 
                 # Telegram имеет ограничение на длину сообщения в 4096 символов
                 if len(message) > 4000:
@@ -699,27 +776,10 @@ class SteamDiscountBot:
         """Фильтрует игры по пользовательским настройкам"""
         if not deals:
             return []
-        
-        filtered_deals = []
-        
-        for deal in deals:
-            # Проверяем минимальную скидку
-            discount = deal.get('discount', 0)
-            if discount < min_discount:
-                continue
-            
-            # Если у пользователя выбраны жанры, проверяем соответствие
-            if user_genres:
-                game_genres = deal.get('genres', [])
-                if not any(genre in user_genres for genre in game_genres):
-                    continue
-            
-            filtered_deals.append(deal)
-        
-        return filtered_deals
+        return list(DealIndex(deals).match(min_discount, user_genres))
     
-    def format_deals_message(self, deals, user_id: int, language: str = 'ru'):
-        """Форматирует сообщение со скидками с учетом истории цен"""
+    async def format_deals_message(self, deals, user_id: int = None, language: str = 'ru'):
+        """Форматирует сообщение со скидками с учетом истории цен (история пишется при обновлении снимка)"""
         if not deals:
             return get_text(language, 'no_suitable_deals', min_discount=30)
         
@@ -728,6 +788,10 @@ class SteamDiscountBot:
         games_text = "игр" if language == 'ru' else "games"
         message = f"🎮 <b>{title_text} ({len(deals)} {games_text})</b>\n\n"
         
+        # Минимумы цен всех игр сообщения - одним запросом
+        game_ids = [str(deal['app_id']) for deal in deals if deal.get('app_id')]
+        price_extremes = await self.async_db.get_price_extremes(game_ids) if game_ids else {}
+        
         # Показываем все найденные игры, не ограничивая до 20
         for deal in deals:
             discount = deal.get('discount', 0)
@@ -750,47 +814,50 @@ class SteamDiscountBot:
             message += f"{emoji} <b>{title}</b>\n"
             message += f"💸 Скидка: <b>-{discount}%</b>\n"
             
+            # Скидка стала глубже с прошлой рассылки
+            previous_discount = deal.get('previous_discount')
+            if previous_discount is not None and previous_discount < discount:
+                deeper_text = "Скидка выросла" if language == 'ru' else "Discount increased"
+                message += f"📈 {deeper_text}: -{previous_discount}% → <b>-{discount}%</b>\n"
+            
             if original_price and discounted_price:
                 message += f"💰 <s>{original_price}</s> → <b>{discounted_price}</b>\n"
             
             # Добавляем информацию об истории цен
-            price_history = self.db.get_price_history(game_id)
-            if price_history:
-                lowest_price = min([p['price'] for p in price_history])
-                try:
-                    current_price = float(discounted_price.replace('₽', '').replace(',', '').strip())
-                    if current_price <= lowest_price:
-                        message += f"🎯 <b>Исторический минимум!</b>\n"
-                    else:
-                        message += f"📊 Мин. цена: <b>{lowest_price}₽</b>\n"
-                except:
-                    pass
+            current_price = self._get_deal_price(deal)
+            extremes = price_extremes.get(str(game_id))
+            if extremes and current_price is not None:
+                lowest_price = extremes['min_price']
+                recent_low = extremes['recent_min_price']
+                if current_price <= lowest_price:
+                    message += f"🎯 <b>Исторический минимум!</b>\n"
+                else:
+                    if recent_low is not None and current_price <= recent_low:
+                        message += f"📉 <b>Минимум за {PRICE_RECENT_LOW_DAYS} дней</b>\n"
+                    message += f"📊 Мин. цена: <b>{lowest_price}₽</b>\n"
             
             if url:
                 message += f"🔗 <a href='{url}'>Перейти в Steam</a>\n"
             
             message += "\n"
-            
-            # Сохраняем историю цен
-            if game_id and discounted_price:
-                try:
-                    price = float(discounted_price.replace('₽', '').replace(',', '').strip())
-                    self.db.add_price_history(game_id, title, price)
-                except:
-                    pass
         
         return message
     
+    def _get_deal_price(self, deal):
+        """Цена со скидкой: из строки цены со страницы поиска или из price_overview снимка"""
+        return deal_price(deal)
+    
     async def weeklydigest_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Отправляет еженедельный дайджест топ-5 игр с самыми большими скидками"""
         user_id = update.effective_user.id
-        language = self.db.get_user_language(user_id)
+        language = await self.async_db.get_user_language(user_id)
         
         await update.message.reply_text(get_text(language, 'generating_weekly_digest'))
         
         try:
             # Получаем топ-5 игр за неделю
-            weekly_top = self.db.get_weekly_top_games()
+            await self.weekly_top.flush()
+            weekly_top = await self.async_db.get_weekly_top_games()
             
             if weekly_top:
                 message = get_text(language, 'weekly_digest_title') + "\n\n"
@@ -815,268 +882,91 @@ class SteamDiscountBot:
             logger.error(f"Error getting weekly digest: {e}")
             await update.message.reply_text(get_text(language, 'error_getting_digest'))
     
+    def render_weekly_digest(self, weekly_top, language: str) -> str:
+        """Формирует текст еженедельного дайджеста на языке пользователя"""
+        parts = [
+            get_text(language, 'weekly_digest_title') + "\n\n",
+            get_text(language, 'weekly_digest_subtitle') + "\n\n"
+        ]
+        
+        for i, game in enumerate(weekly_top[:5], 1):
+            emoji = ["🥇", "🥈", "🥉", "4️⃣", "5️⃣"][i-1]
+            parts.append(f"{emoji} <b>{game['title']}</b>\n")
+            
+            if language == 'ru':
+                parts.append(f"💸 Скидка: <b>-{game['discount']}%</b>\n")
+                parts.append(f"💰 Цена: <b>{game['price']}₽</b>\n\n")
+            else:
+                parts.append(f"💸 Discount: <b>-{game['discount']}%</b>\n")
+                parts.append(f"💰 Price: <b>${game['price']}</b>\n\n")
+        
+        # Добавляем призыв к действию
+        parts.append(get_text(language, 'weekly_digest_cta'))
+        return "".join(parts)
+    
     async def send_weekly_digest_to_all(self):
         """Отправляет еженедельный дайджест всем пользователям"""
         try:
-            users = self.db.get_subscribed_users()
-            weekly_top = self.db.get_weekly_top_games()
+            await self.weekly_top.flush()
+            weekly_top = await self.async_db.get_weekly_top_games()
             
             if not weekly_top:
                 logger.info("No weekly data available for digest")
                 return
             
-            logger.info(f"Sending weekly digest to {len(users)} users")
+            logger.info("Sending weekly digest to subscribers")
             
-            # Отправляем всем подписанным пользователям
-            sent_count = 0
-            failed_count = 0
-            
-            for user_id in users:
-                try:
-                    # Получаем язык пользователя
-                    language = self.db.get_user_language(user_id)
-                    
-                    # Формируем сообщение на языке пользователя
-                    message = get_text(language, 'weekly_digest_title') + "\n\n"
-                    message += get_text(language, 'weekly_digest_subtitle') + "\n\n"
-                    
-                    for i, game in enumerate(weekly_top[:5], 1):
-                        emoji = ["🥇", "🥈", "🥉", "4️⃣", "5️⃣"][i-1]
-                        message += f"{emoji} <b>{game['title']}</b>\n"
-                        
-                        if language == 'ru':
-                            message += f"💸 Скидка: <b>-{game['discount']}%</b>\n"
-                            message += f"💰 Цена: <b>{game['price']}₽</b>\n\n"
-                        else:
-                            message += f"💸 Discount: <b>-{game['discount']}%</b>\n"
-                            message += f"💰 Price: <b>${game['price']}</b>\n\n"
-                    
-                    # Добавляем призыв к действию
-                    message += get_text(language, 'weekly_digest_cta')
-                    
-                    await self.application.bot.send_message(
-                        chat_id=user_id,
-                        text=message,
-                        parse_mode='HTML'
-                    )
-                    sent_count += 1
-                    await asyncio.sleep(0.1)  # Небольшая задержка между отправками
-                    
-                except Exception as e:
-                    logger.error(f"Failed to send weekly digest to user {user_id}: {e}")
-                    failed_count += 1
+            async def render(language):
+                return self.render_weekly_digest(weekly_top, language)
             
-            logger.info(f"Weekly digest sent: {sent_count} successful, {failed_count} failed")
+            # Дайджест зависит только от языка - рендерим по разу на язык
+            stats = await self.broadcast_engine.run(
+                'weekly_digest',
+                self.async_db.iter_subscribers_with_settings,
+                language_key,
+                render,
+                self.split_message
+            )
+            logger.info(f"Weekly digest sent: {stats}")
             
             # Очищаем данные для новой недели
-            self.db.clear_weekly_top()
+            await self.weekly_top.reset()
             
         except Exception as e:
             logger.error(f"Error sending weekly digest: {e}")
     
-    def start_scheduler(self):
-        """Запускает планировщик для еженедельной рассылки"""
-        def schedule_checker():
-            logger.info("Weekly digest scheduler thread started")
-            while True:
-                try:
-                    schedule.run_pending()
-                    time.sleep(60)  # Проверяем каждую минуту
-                except Exception as e:
-                    logger.error(f"Error in scheduler: {e}")
-                    time.sleep(60)
-        
-        # Планируем отправку каждую неделю в воскресенье в 18:00 МСК
-        def run_weekly_digest():
-            try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(self.send_weekly_digest_to_all())
-                loop.close()
-            except Exception as e:
-                logger.error(f"Error running weekly digest: {e}")
-        
-        schedule.every().sunday.at("18:00").do(run_weekly_digest)
-        
-        # Для тестирования - можно раскомментировать для отправки каждые 5 минут
-        # schedule.every(5).minutes.do(run_weekly_digest)
-        
-        # Запускаем планировщик в отдельном потоке
-        scheduler_thread = threading.Thread(target=schedule_checker, daemon=True)
-        scheduler_thread.start()
-        logger.info("Weekly digest scheduler configured: every Sunday at 18:00 MSK")
-
-    def update_weekly_digest_data(self, deals):
+    async def update_weekly_digest_data(self, deals):
         """Обновляет данные для еженедельного дайджеста на основе полученных скидок с учетом популярности"""
         try:
             if not deals:
                 return
             
             # Рассчитываем рейтинг для каждой игры на основе нескольких факторов
-            scored_deals = []
+            candidates = [deal for deal in deals if deal.get('title', '') and deal.get('discount', 0) > 0]
+            prices = [parse_price(deal.get('discounted_price', '0')) for deal in candidates]
+            scores = self.game_scorer.score_many(candidates, prices)
             
-            for deal in deals:
-                title = deal.get('title', '')
-                discount = deal.get('discount', 0)
-                discounted_price = deal.get('discounted_price', '0')
-                
-                # Извлекаем числовое значение цены
-                try:
-                    price_str = str(discounted_price).replace('₽', '').replace('$', '').replace(',', '.').strip()
-                    price = float(price_str) if price_str else 0.0
-                except (ValueError, AttributeError):
-                    price = 0.0
-                
-                if not title or discount <= 0:
-                    continue
-                
-                # Рассчитываем комплексный рейтинг игры
-                score = self._calculate_game_score(deal)
-                
-                scored_deals.append({
-                    'deal': deal,
-                    'title': title,
-                    'discount': discount,
-                    'price': price,
-                    'score': score
-                })
-            
-            # Сортируем по комплексному рейтингу (по убыванию)
-            sorted_deals = sorted(scored_deals, key=lambda x: x['score'], reverse=True)
-            
-            # Берем топ-15 игр с лучшим рейтингом для еженедельного дайджеста
-            top_deals = sorted_deals[:15]
-            
-            for scored_deal in top_deals:
-                title = scored_deal['title']
-                discount = scored_deal['discount']
-                price = scored_deal['price']
-                score = scored_deal['score']
-                
-                # Сохраняем в базу с дополнительной информацией о рейтинге
-                self.db.add_weekly_top_game(title, discount, price, score)
-                    
-            logger.info(f"Updated weekly digest data with {len(top_deals)} games (algorithm: discount + popularity)")
+            scored_deals = [
+                {'title': deal['title'], 'discount': deal['discount'], 'price': price, 'score': score}
+                for deal, price, score in zip(candidates, prices, scores)
+            ]
+            
+            # Топ недели копится в памяти и сохраняется в базу по таймеру
+            await self.weekly_top.add(scored_deals)
+            
+            logger.debug(f"Updated weekly digest data with {len(scored_deals)} games (algorithm: discount + popularity)")
             
         except Exception as e:
             logger.error(f"Error updating weekly digest data: {e}")
     
     def _calculate_game_score(self, deal):
         """Рассчитывает комплексный рейтинг игры для еженедельного дайджеста"""
-        try:
-            # Базовые параметры
-            discount = deal.get('discount', 0)
-            title = deal.get('title', '').lower()
-            
-            # Извлекаем цену
-            discounted_price = deal.get('discounted_price', '0')
-            try:
-                price_str = str(discounted_price).replace('₽', '').replace('$', '').replace(',', '.').strip()
-                price = float(price_str) if price_str else 0.0
-            except:
-                price = 0.0
-            
-            # 1. Базовый рейтинг скидки (0-100 баллов)
-            discount_score = min(discount, 90)  # Максимум 90 баллов за скидку
-            
-            # 2. Популярность игры (эвристический подход)
-            popularity_score = 0
-            
-            # Известные популярные игры/серии (бонус +30 баллов)
-            popular_keywords = [
-                'cyberpunk', 'witcher', 'gta', 'elder scrolls', 'fallout', 'assassin',
-                'call of duty', 'battlefield', 'counter-strike', 'dota', 'steam',
-                'fifa', 'tomb raider', 'far cry', 'watch dogs', 'rainbow six',
-                'grand theft', 'red dead', 'mass effect', 'dragon age', 'bioshock',
-                'borderlands', 'civilization', 'total war', 'mortal kombat', 'tekken',
-                'street fighter', 'dark souls', 'elden ring', 'sekiro', 'bloodborne',
-                'resident evil', 'silent hill', 'dead space', 'metro', 'stalker',
-                'dying light', 'left 4 dead', 'portal', 'half-life', 'team fortress',
-                'dishonored', 'prey', 'doom', 'wolfenstein', 'quake', 'unreal',
-                'forza', 'need for speed', 'burnout', 'dirt', 'f1', 'wreckfest',
-                'xcom', 'cities skylines', 'europa universalis', 'crusader kings',
-                'hearts of iron', 'stellaris', 'age of empires', 'starcraft',
-                'warcraft', 'world of warcraft', 'overwatch', 'diablo', 'heroes',
-                'destiny', 'division', 'ghost recon', 'splinter cell', 'prince',
-                'just cause', 'saints row', 'mafia', 'hitman', 'deus ex',
-                'batman', 'spider-man', 'mortal kombat', 'injustice', 'marvel',
-                'dc comics', 'lego', 'minecraft', 'terraria', 'stardew valley',
-                'hollow knight', 'ori and', 'cuphead', 'celeste', 'hades',
-                'rocket league', 'fall guys', 'among us', 'valheim', 'rust',
-                'pubg', 'fortnite', 'apex legends', 'titanfall', 'warframe'
-            ]
-            
-            for keyword in popular_keywords:
-                if keyword in title:
-                    popularity_score += 30
-                    break  # Только один бонус за популярность
-            
-            # 3. Ценовая категория (баланс цена/качество)
-            price_score = 0
-            if 0 < price <= 500:      # Доступные игры
-                price_score = 25
-            elif 500 < price <= 1500: # Средний сегмент
-                price_score = 20
-            elif 1500 < price <= 3000: # Премиум игры
-                price_score = 15
-            else:                     # Очень дорогие
-                price_score = 5
-            
-            # 4. Бонусы за особые ключевые слова
-            bonus_score = 0
-            
-            # Свежие/популярные жанры (+10 баллов)
-            trending_keywords = [
-                'battle royale', 'survival', 'crafting', 'open world', 'rpg',
-                'multiplayer', 'co-op', 'indie', 'early access', 'vr',
-                'roguelike', 'metroidvania', 'soulslike', 'tactical', 'strategy'
-            ]
-            
-            game_description = deal.get('description', '').lower()
-            full_text = title + ' ' + game_description
-            
-            for keyword in trending_keywords:
-                if keyword in full_text:
-                    bonus_score += 5
-                    break
-            
-            # 5. Штрафы
-            penalty = 0
-            
-            # Штраф за DLC/Season Pass (-15 баллов)
-            dlc_keywords = ['dlc', 'season pass', 'expansion', 'add-on', 'downloadable content']
-            for keyword in dlc_keywords:
-                if keyword in title:
-                    penalty += 15
-                    break
-            
-            # Штраф за очень старые игры (примерно по году в названии)
-            old_years = ['2010', '2011', '2012', '2013', '2014', '2015']
-            for year in old_years:
-                if year in title:
-                    penalty += 10
-                    break
-            
-            # Финальный рейтинг
-            final_score = discount_score + popularity_score + price_score + bonus_score - penalty
-            
-            # Нормализуем в диапазон 0-200
-            final_score = max(0, min(final_score, 200))
-            
-            logger.debug(f"Game score for '{deal.get('title', '')}': {final_score} "
-                        f"(discount: {discount_score}, popularity: {popularity_score}, "
-                        f"price: {price_score}, bonus: {bonus_score}, penalty: {penalty})")
-            
-            return final_score
-            
-        except Exception as e:
-            logger.error(f"Error calculating game score: {e}")
-            return deal.get('discount', 0)  # Fallback к старому алгоритму
+        return self.game_scorer.score(deal)
 
     async def test_weekly_digest_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда для тестирования еженедельного дайджеста (только для администратора)"""
         user_id = update.effective_user.id
-        language = self.db.get_user_language(user_id)
+        language = await self.async_db.get_user_language(user_id)
         
         # Проверяем, является ли пользователь администратором (можно добавить список админов)
         admin_ids = [user_id]  # Временно делаем пользователя админом для тестирования
@@ -1086,7 +976,8 @@ class SteamDiscountBot:
             return
         
         try:
-            weekly_top = self.db.get_weekly_top_games()
+            await self.weekly_top.flush()
+            weekly_top = await self.async_db.get_weekly_top_games()
             
             if not weekly_top:
                 message = get_text(language, 'digest_test_title') + "\n\n" + get_text(language, 'no_digest_data')
@@ -1109,7 +1000,7 @@ class SteamDiscountBot:
     async def admin_send_digest_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда для принудительной отправки еженедельного дайджеста (только для администратора)"""
         user_id = update.effective_user.id
-        language = self.db.get_user_language(user_id)
+        language = await self.async_db.get_user_language(user_id)
         
         # Проверяем, является ли пользователь администратором
         admin_ids = [user_id]  # Временно делаем пользователя админом для тестирования
@@ -1120,8 +1011,11 @@ class SteamDiscountBot:
         
         try:
             await update.message.reply_text(get_text(language, 'sending_digest'))
-            await self.send_weekly_digest_to_all()
-            await update.message.reply_text(get_text(language, 'digest_sent'))
+            # Через планировщик, чтобы не наложиться на плановую рассылку
+            if await self.scheduler.run_job('weekly_digest'):
+                await update.message.reply_text(get_text(language, 'digest_sent'))
+            else:
+                await update.message.reply_text(get_text(language, 'digest_skipped'))
                 
         except Exception as e:
             logger.error(f"Error in admin send digest command: {e}")
@@ -1158,48 +1052,63 @@ class SteamDiscountBot:
             
         return chunks
     
+    async def _broadcast_deals(self, changed_deals):
+        """Продолжает открытую рассылку скидок changed_deals или начинает новую"""
+        # Индекс строится один раз на рассылку, подбор для варианта - пересечения множеств
+        changed_index = DealIndex(changed_deals)
+        
+        async def render(variant):
+            language, min_discount, genres = variant
+            filtered_deals = changed_index.match(min_discount, genres)
+            if not filtered_deals:
+                return None
+            message = await self.format_deals_message(filtered_deals, language=language)
+            return get_text(language, 'new_deals_broadcast') + "\n\n" + message
+        
+        # Сообщение рендерится один раз на сочетание языка и фильтров, а не на подписчика
+        stats = await self.broadcast_engine.run(
+            'deals',
+            self.async_db.iter_subscribers_with_settings,
+            filter_profile_key,
+            render,
+            self.split_message
+        )
+        logger.info(f"Deals sent: {stats}")
+    
     async def send_deals_to_subscribers(self):
-        """Отправляет скидки всем подписчикам"""
-        if not self.subscribers:
-            logger.info("No subscribers to send deals to")
-            return
-        
+        """Отправляет подписчикам новые скидки и скидки, ставшие глубже с прошлой рассылки"""
         try:
-            deals = await self.scraper.get_discounted_games()
+            # Прерванная рассылка сначала доводится до конца с теми скидками,
+            # для которых она была начата, и только потом считается новый diff
+            unfinished = await self.async_db.get_unfinished_broadcast('deals')
+            if unfinished:
+                if unfinished['payload'] is None:
+                    logger.warning(f"Deals broadcast {unfinished['id']} has no stored deals, abandoning it")
+                    await self.async_db.set_broadcast_status(unfinished['id'], 'abandoned')
+                else:
+                    logger.info(f"Finishing interrupted deals broadcast {unfinished['id']}")
+                    await self._broadcast_deals(unfinished['payload'])
+            
+            deals = await self.deals_cache.get_deals()
             if not deals:
                 logger.info("No deals found to send")
                 return
             
-            message = "🔔 <b>Новые скидки в Steam!</b>\n\n" + self.format_deals_message(deals)
-            
-            failed_sends = []
-            for subscriber_id in self.subscribers.copy():
-                try:
-                    if len(message) > 4000:
-                        chunks = self.split_message(message, 4000)
-                        for chunk in chunks:
-                            await self.bot.send_message(
-                                chat_id=subscriber_id,
-                                text=chunk,
-                                parse_mode='HTML'
-                            )
-                    else:
-                        await self.bot.send_message(
-                            chat_id=subscriber_id,
-                            text=message,
-                            parse_mode='HTML'
-                        )
-                    logger.info(f"Sent deals to subscriber {subscriber_id}")
-                except Exception as e:
-                    logger.error(f"Failed to send to subscriber {subscriber_id}: {e}")
-                    failed_sends.append(subscriber_id)
-            
-            # Удаляем неактивных подписчиков
-            for failed_id in failed_sends:
-                self.subscribers.discard(failed_id)
+            events = await self.deal_state.diff(deals)
+            changed_deals = events['new'] + events['deepened']
+            if not changed_deals:
+                logger.info("No new or deeper deals since the last broadcast, skipping")
+                await self.deal_state.commit(deals, events)
+                return
+            changed_deals.sort(key=lambda deal: deal.get('discount', 0), reverse=True)
             
-            if failed_sends:
-                self.save_subscribers()
+            # Рассылка сохраняется вместе со своими скидками до записи состояния:
+            # после перезапуска она продолжится с ними, а не со скидками нового снимка
+            broadcast_id = await self.async_db.create_broadcast('deals', changed_deals)
+            if broadcast_id is None:
+                return
+            await self.deal_state.commit(deals, events)
+            await self._broadcast_deals(changed_deals)
                 
         except Exception as e:
             logger.error(f"Error sending deals to subscribers: {e}")
@@ -1210,8 +1119,8 @@ class SteamDiscountBot:
         """Обработчик команды /wishlist - анализ Steam Wishlist"""
         user_id = update.effective_user.id
         user = update.effective_user
-        language = self.db.get_user_language(user_id)
-        self.db.add_user(user_id, user.username, user.first_name, user.last_name)
+        language = await self.async_db.get_user_language(user_id)
+        await self.async_db.add_user(user_id, user.username, user.first_name, user.last_name)
         
         # Проверяем, есть ли аргументы команды (ссылка на профиль)
         if context.args:
@@ -1282,9 +1191,10 @@ Send a link to your <b>public</b> Steam profile to check discounts on games from
                 await update.message.reply_text(error_msg, parse_mode='HTML')
                 return
             
-            # Получаем скидки из wishlist
+            # Получаем скидки из wishlist (модуль загружается при первом использовании команды)
+            from steam_wishlist import get_wishlist_discounts
             logger.info(f"🔍 Starting wishlist analysis for URL: {profile_url}")
-            discounted_games = await get_wishlist_discounts(profile_url)
+            discounted_games = await get_wishlist_discounts(profile_url, self.http_client)
             logger.info(f"📊 Wishlist analysis result: found {len(discounted_games) if discounted_games else 0} discounted games")
             
             if discounted_games:
@@ -1407,8 +1317,8 @@ Steam → Профиль → Редактировать профиль → На
         """Обработчик команды /recommend - AI-рекомендации игр на основе wishlist и библиотеки"""
         user_id = update.effective_user.id
         user = update.effective_user
-        language = self.db.get_user_language(user_id)
-        self.db.add_user(user_id, user.username, user.first_name, user.last_name)
+        language = await self.async_db.get_user_language(user_id)
+        await self.async_db.add_user(user_id, user.username, user.first_name, user.last_name)
         
         # Проверяем, включены ли ИИ-рекомендации
         if not AI_RECOMMENDATIONS_ENABLED:
@@ -1503,15 +1413,18 @@ Send a link to your Steam profile, and AI will analyze your wishlist and suggest
         loading_message = await update.message.reply_text(loading_text)
         
         try:
-            # Получаем данные wishlist
+            # Получаем данные wishlist; модули библиотеки (bs4) и ИИ (openai)
+            # загружаются только при использовании команды, а не при старте бота
             from steam_wishlist import SteamWishlistParser
+            from steam_library import get_steam_library
+            from ai_game_recommendations import get_ai_game_recommendations
             
             wishlist_games = []
             owned_games = []
             
             # Получаем wishlist
             try:
-                async with SteamWishlistParser() as parser:
+                async with SteamWishlistParser(http_client=self.http_client) as parser:
                     steam_id = parser.extract_steam_id(profile_url)
                     if not steam_id:
                         await loading_message.edit_text("❌ Не удалось извлечь Steam ID из ссылки. Проверьте правильность ссылки.")
@@ -1529,7 +1442,7 @@ Send a link to your Steam profile, and AI will analyze your wishlist and suggest
             
             # Получаем библиотеку игр
             try:
-                owned_games = await get_steam_library(profile_url, limit=30)
+                owned_games = await get_steam_library(profile_url, limit=30, http_client=self.http_client)
                 
                 if owned_games:
                     total_games = len(wishlist_games) + len(owned_games)
@@ -1765,10 +1678,10 @@ Send a link to your Steam profile, and AI will analyze your wishlist and suggest
             user = update.effective_user
             user_id = user.id
             username = user.username or user.first_name or str(user_id)
-            language = self.db.get_user_language(user_id)
+            language = await self.async_db.get_user_language(user_id)
             
             # Добавляем/обновляем пользователя в БД
-            self.db.add_user(user_id, user.username, user.first_name, user.last_name)
+            await self.async_db.add_user(user_id, user.username, user.first_name, user.last_name)
             
             # Проверяем аргументы команды
             args = context.args
@@ -1811,7 +1724,7 @@ Send a link to your Steam profile, and AI will analyze your wishlist and suggest
                 return
                 
             # Сохраняем отзыв в БД
-            feedback_id = self.db.add_feedback(user_id, username, "general", feedback_text)
+            feedback_id = await self.async_db.add_feedback(user_id, username, "general", feedback_text)
             
             if feedback_id:
                 await update.message.reply_text(
@@ -1853,7 +1766,7 @@ Send a link to your Steam profile, and AI will analyze your wishlist and suggest
             return
             
         # Сохраняем баг-репорт
-        feedback_id = self.db.add_feedback(user_id, username, "bug", message_text)
+        feedback_id = await self.async_db.add_feedback(user_id, username, "bug", message_text)
         
         if feedback_id:
             await update.message.reply_text(
@@ -1887,7 +1800,7 @@ Send a link to your Steam profile, and AI will analyze your wishlist and suggest
             return
             
         # Сохраняем предложение
-        feedback_id = self.db.add_feedback(user_id, username, "feature", message_text)
+        feedback_id = await self.async_db.add_feedback(user_id, username, "feature", message_text)
         
         if feedback_id:
             await update.message.reply_text(
@@ -1941,7 +1854,7 @@ Send a link to your Steam profile, and AI will analyze your wishlist and suggest
                 break
         
         # Сохраняем отзыв
-        feedback_id = self.db.add_feedback(user_id, username, "compliment", message_text, rating)
+        feedback_id = await self.async_db.add_feedback(user_id, username, "compliment", message_text, rating)
         
         if feedback_id:
             rating_text = f" (⭐ {rating}/5)" if rating else ""
@@ -1960,25 +1873,8 @@ Send a link to your Steam profile, and AI will analyze your wishlist and suggest
 
     # ================== КОНЕЦ НОВЫХ ФУНКЦИЙ ==================
     
-    def run_scheduler(self):
-        """Запускает планировщик в отдельном потоке"""
-        schedule.every(6).hours.do(lambda: asyncio.run(self.send_deals_to_subscribers()))
-        # Добавляем очистку просроченных состояний каждые 5 минут
-        schedule.every(5).minutes.do(self.cleanup_expired_states)
-        
-        while True:
-            schedule.run_pending()
-            time.sleep(60)  # Проверяем каждую минуту
-    
     def run(self):
-        """Запускает бота"""
-        # Запускаем планировщик скидок в отдельном потоке
-        scheduler_thread = threading.Thread(target=self.run_scheduler, daemon=True)
-        scheduler_thread.start()
-        
-        # Запускаем планировщик еженедельного дайджеста
-        self.start_scheduler()
-        
+        """Запускает бота (планировщик стартует вместе с Application)"""
         logger.info("Starting bot...")
         self.application.run_polling()
 
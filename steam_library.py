@@ -10,13 +10,20 @@ import logging
 from typing import List, Dict, Optional
 from bs4 import BeautifulSoup
 
+from app_metadata_cache import get_app_metadata_cache
+from http_client import HttpClient, limited_get
+
 logger = logging.getLogger(__name__)
 
 class SteamLibraryParser:
-    def __init__(self):
+    def __init__(self, http_client: Optional[HttpClient] = None):
         self.session = None
+        self.http_client = http_client
         
     async def __aenter__(self):
+        if self.http_client is not None:
+            self.session = await self.http_client.get_session()
+            return self
         timeout = aiohttp.ClientTimeout(total=60, connect=15)
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -27,7 +34,8 @@ class SteamLibraryParser:
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
+        # Сессию общего клиента закрывает его владелец
+        if self.session and self.http_client is None:
             await self.session.close()
     
     def extract_steam_id(self, profile_url: str) -> Optional[str]:
@@ -57,7 +65,7 @@ class SteamLibraryParser:
             # Попробуем получить Steam ID64 через страницу профиля
             profile_url = f"https://steamcommunity.com/id/{identifier}"
             
-            async with self.session.get(profile_url) as response:
+            async with limited_get(self.session, profile_url) as response:
                 if response.status == 200:
                     content = await response.text()
                     
@@ -88,7 +96,7 @@ class SteamLibraryParser:
         try:
             games_url = f"https://steamcommunity.com/profiles/{steam_id64}/games/?tab=all"
             
-            async with self.session.get(games_url) as response:
+            async with limited_get(self.session, games_url) as response:
                 if response.status == 200:
                     content = await response.text()
                     
@@ -155,6 +163,12 @@ class SteamLibraryParser:
             # Ограничиваем количество и сортируем по времени игры
             games = sorted(games, key=lambda x: x.get('playtime_forever', 0), reverse=True)
             
+            # Названия из библиотеки пригодятся остальным модулям (wishlist, графики цен)
+            await asyncio.to_thread(get_app_metadata_cache().update_static, {
+                str(game['appid']): {'name': game['name']}
+                for game in games if game.get('appid') and game.get('name')
+            })
+            
             logger.info(f"Found {len(games)} games for Steam ID64: {steam_id64}")
             return games[:limit]
             
@@ -167,7 +181,7 @@ class SteamLibraryParser:
         try:
             games_url = f"https://steamcommunity.com/profiles/{steam_id64}/games/?tab=all"
             
-            async with self.session.get(games_url) as response:
+            async with limited_get(self.session, games_url) as response:
                 if response.status != 200:
                     return []
                 
@@ -270,9 +284,8 @@ class SteamLibraryParser:
             
             for url in ajax_urls:
                 try:
-                    await asyncio.sleep(1)  # Пауза между запросами
-                    
-                    async with self.session.get(url) as response:
+                    # Паузу между запросами выдерживает ограничитель steamcommunity.com
+                    async with limited_get(self.session, url) as response:
                         if response.status == 200:
                             content = await response.text()
                             
@@ -354,18 +367,19 @@ class SteamLibraryParser:
 
 
 # Функция для удобного использования в боте
-async def get_steam_library(profile_url: str, limit: int = 50) -> List[Dict]:
+async def get_steam_library(profile_url: str, limit: int = 50, http_client: Optional[HttpClient] = None) -> List[Dict]:
     """
     Получает библиотеку игр Steam пользователя
     
     Args:
         profile_url: URL профиля Steam
         limit: Максимальное количество игр для возврата
+        http_client: общий HTTP-клиент (по умолчанию - собственная сессия)
     
     Returns:
         Список словарей с информацией об играх
     """
-    async with SteamLibraryParser() as parser:
+    async with SteamLibraryParser(http_client) as parser:
         # Извлекаем Steam ID
         steam_identifier = parser.extract_steam_id(profile_url)
         if not steam_identifier:
@@ -383,18 +397,20 @@ async def get_steam_library(profile_url: str, limit: int = 50) -> List[Dict]:
         return games
 
 
-async def get_recently_played_games(profile_url: str, limit: int = 20) -> List[Dict]:
+async def get_recently_played_games(profile_url: str, limit: int = 20,
+                                    http_client: Optional[HttpClient] = None) -> List[Dict]:
     """
     Получает недавно сыгранные игры пользователя
     
     Args:
         profile_url: URL профиля Steam
         limit: Максимальное количество игр
+        http_client: общий HTTP-клиент (по умолчанию - собственная сессия)
     
     Returns:
         Список словарей с информацией об играх
     """
-    async with SteamLibraryParser() as parser:
+    async with SteamLibraryParser(http_client) as parser:
         steam_identifier = parser.extract_steam_id(profile_url)
         if not steam_identifier:
             return []
@@ -7,21 +7,37 @@ import asyncio
 import re
 import logging
 from typing import List, Dict, Optional
-from config import WISHLIST_MAX_GAMES_CHECK, WISHLIST_CHECK_DELAY, WISHLIST_ENABLE_FULL_CHECK
+from config import (
+    WISHLIST_MAX_GAMES_CHECK, WISHLIST_ENABLE_FULL_CHECK,
+    WISHLIST_PRICE_CONCURRENCY,
+    WISHLIST_PRICE_MAX_RETRIES, WISHLIST_RETRY_BACKOFF, WISHLIST_PRICE_BATCH_SIZE
+)
+from rate_limiter import get_host_limiter, retry_delay
+from app_metadata_cache import AppMetadataCache, get_app_metadata_cache
+from http_client import HttpClient, limited_get
 
 logger = logging.getLogger(__name__)
 
 class SteamWishlistParser:
-    def __init__(self):
+    def __init__(self, metadata_cache: Optional[AppMetadataCache] = None,
+                 http_client: Optional[HttpClient] = None):
         self.session = None
+        self.http_client = http_client
+        # Общий для всех модулей AIMD-ограничитель запросов к store.steampowered.com
+        self.price_limiter = get_host_limiter('store.steampowered.com')
+        self.metadata_cache = metadata_cache or get_app_metadata_cache()
         
     async def __aenter__(self):
+        if self.http_client is not None:
+            self.session = await self.http_client.get_session()
+            return self
         timeout = aiohttp.ClientTimeout(total=30, connect=10)
         self.session = aiohttp.ClientSession(timeout=timeout)
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
+        # Сессию общего клиента закрывает его владелец
+        if self.session and self.http_client is None:
             await self.session.close()
     
     def extract_steam_id(self, profile_url: str) -> Optional[str]:
@@ -57,7 +73,7 @@ class SteamWishlistParser:
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
             }
             
-            async with self.session.get(url, headers=headers, timeout=15) as response:
+            async with limited_get(self.session, url, headers=headers, timeout=15) as response:
                 if response.status == 200:
                     content = await response.text()
                     
@@ -95,7 +111,7 @@ class SteamWishlistParser:
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
             }
             
-            async with self.session.get(url, headers=headers, timeout=15, allow_redirects=False) as response:
+            async with limited_get(self.session, url, headers=headers, timeout=15, allow_redirects=False) as response:
                 logger.info(f"Wishlist page status: {response.status} for Steam ID64: {steam_id64}")
                 
                 if response.status == 200:
@@ -203,7 +219,7 @@ class SteamWishlistParser:
                 'Accept': 'application/json'
             }
             
-            async with self.session.get(url, params=params, headers=headers, timeout=15) as response:
+            async with limited_get(self.session, url, params=params, headers=headers, timeout=15) as response:
                 logger.info(f"🌐 Official API response: {response.status}")
                 
                 if response.status == 200:
@@ -253,7 +269,7 @@ class SteamWishlistParser:
                 'format': 'json'
             }
             
-            async with self.session.get(count_url, params=count_params, headers=headers, timeout=10) as count_response:
+            async with limited_get(self.session, count_url, params=count_params, headers=headers, timeout=10) as count_response:
                 if count_response.status == 200:
                     try:
                         count_data = await count_response.json()
@@ -279,16 +295,29 @@ class SteamWishlistParser:
         games = []
         
         try:
+            known_names = {
+                str(item['appid']): item['name']
+                for item in items
+                if item.get('appid') and item.get('name') and item.get('name') != 'Unknown Game'
+            }
+            await asyncio.to_thread(
+                self.metadata_cache.update_static,
+                {app_id: {'name': name} for app_id, name in known_names.items()}
+            )
+            
+            # Недостающие названия берем из кэша, остальные - параллельно из Steam Store API
+            missing_ids = [
+                str(item['appid']) for item in items
+                if item.get('appid') and str(item['appid']) not in known_names
+            ]
+            names = {**known_names, **await self.get_game_names(missing_ids)}
+            
             for item in items:
                 # Структура данных из официального API может отличаться
                 app_id = str(item.get('appid', ''))
                 
                 if app_id:
-                    game_name = item.get('name', '')
-                    
-                    # Если нет названия, попробуем получить его через Steam Store API
-                    if not game_name or game_name == 'Unknown Game':
-                        game_name = await self.get_game_name(app_id)
+                    game_name = names.get(app_id)
                     
                     game = {
                         'app_id': app_id,
@@ -320,19 +349,50 @@ class SteamWishlistParser:
             
         return games
 
+    async def get_game_names(self, app_ids: List[str]) -> Dict[str, str]:
+        """
+        Получает названия игр: сначала из кэша метаданных,
+        недостающие - параллельно из Steam Store API под ограничителем хоста
+        """
+        app_ids = list(dict.fromkeys(str(app_id) for app_id in app_ids if str(app_id).isdigit()))
+        if not app_ids:
+            return {}
+        
+        names = await asyncio.to_thread(self.metadata_cache.get_names, app_ids)
+        missing_ids = [app_id for app_id in app_ids if app_id not in names]
+        if not missing_ids:
+            return names
+        
+        logger.info(f"📋 Game names: {len(names)} cached, {len(missing_ids)} to fetch")
+        semaphore = asyncio.Semaphore(WISHLIST_PRICE_CONCURRENCY)
+        
+        async def fetch_name(app_id: str):
+            # Частоту запросов выдерживает limited_get внутри get_game_name
+            async with semaphore:
+                return app_id, await self.get_game_name(app_id)
+        
+        for app_id, name in await asyncio.gather(*(fetch_name(app_id) for app_id in missing_ids)):
+            if name:
+                names[app_id] = name
+        return names
+
     async def get_game_name(self, app_id: str) -> Optional[str]:
-        """Получает название игры по app_id"""
+        """Получает название игры по app_id (название и жанры сохраняются в кэш)"""
         try:
             if not app_id or not str(app_id).isdigit():
                 return None
+            
+            cached = await asyncio.to_thread(self.metadata_cache.get_names, [app_id])
+            if app_id in cached:
+                return cached[app_id]
                 
-            url = f"https://store.steampowered.com/api/appdetails?appids={app_id}&filters=basic"
+            url = f"https://store.steampowered.com/api/appdetails?appids={app_id}&filters=basic,genres"
             
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
             }
             
-            async with self.session.get(url, headers=headers, timeout=10) as response:
+            async with limited_get(self.session, url, self.price_limiter, headers=headers, timeout=10) as response:
                 if response.status == 200:
                     try:
                         data = await response.json()
@@ -346,6 +406,14 @@ class SteamWishlistParser:
                                 
                                 if game_name:
                                     logger.debug(f"📋 Got game name for {app_id}: {game_name}")
+                                    genres = [
+                                        genre.get('description') for genre in game_data.get('genres', [])
+                                        if isinstance(genre, dict) and genre.get('description')
+                                    ]
+                                    await asyncio.to_thread(
+                                        self.metadata_cache.update_static,
+                                        {app_id: {'name': game_name, 'genres': genres}}
+                                    )
                                     return game_name
                                     
                     except Exception as json_error:
@@ -386,7 +454,7 @@ class SteamWishlistParser:
                 'X-Requested-With': 'XMLHttpRequest'
             }
             
-            async with self.session.get(url, headers=headers, timeout=30, allow_redirects=False) as response:
+            async with limited_get(self.session, url, headers=headers, timeout=30, allow_redirects=False) as response:
                 logger.info(f"📡 Legacy response status: {response.status}, content-type: {response.content_type}")
                 
                 # Проверяем на редиректы
@@ -474,7 +542,7 @@ class SteamWishlistParser:
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
             }
             
-            async with self.session.get(url, headers=headers, timeout=30) as response:
+            async with limited_get(self.session, url, headers=headers, timeout=30) as response:
                 if response.status == 200:
                     content = await response.text()
                     
@@ -617,37 +685,21 @@ class SteamWishlistParser:
                 max_games_to_check = min(WISHLIST_MAX_GAMES_CHECK, len(wishlist_games))
                 logger.info(f"🎯 FALLBACK LIMITED CHECK MODE: Will check {max_games_to_check} out of {len(wishlist_games)} games for discounts")
             
-            check_delay = WISHLIST_CHECK_DELAY + 0.1  # Немного больше задержка для fallback
+            games_to_check = wishlist_games[:max_games_to_check]
+            price_infos = await self.fetch_price_infos([game['app_id'] for game in games_to_check])
             
-            for i, game in enumerate(wishlist_games[:max_games_to_check]):
-                app_id = game['app_id']
+            for game, price_info in zip(games_to_check, price_infos):
                 game_name = game.get('name', 'Unknown')
-                logger.info(f"🔍 Checking price for game {i+1}/{max_games_to_check}: {game_name} (ID: {app_id})")
                 
-                try:
-                    price_info = await self.get_game_price_info(app_id)
+                if price_info and price_info.get('discount_percent', 0) > 0:
+                    game.update(price_info)
+                    discounted_games.append(game)
                     
-                    if price_info and price_info.get('discount_percent', 0) > 0:
-                        game.update(price_info)
-                        discounted_games.append(game)
-                        
-                        discount = price_info.get('discount_percent', 0)
-                        final_price = price_info.get('final_formatted', 'N/A')
-                        logger.info(f"🎉 FOUND DISCOUNT: {game_name} - {discount}% off, now {final_price}!")
-                    else:
-                        logger.debug(f"💸 No discount for {game_name}")
-                    
-                    # Используем настраиваемую задержку между запросами
-                    if i < max_games_to_check - 1:
-                        await asyncio.sleep(check_delay)
-                        
-                        # Показываем прогресс каждые 25 игр
-                        if (i + 1) % 25 == 0:
-                            logger.info(f"🔄 FALLBACK Progress: {i+1}/{max_games_to_check} games checked, {len(discounted_games)} discounts found so far")
-                        
-                except Exception as e:
-                    logger.warning(f"⚠️ Error checking price for {game_name}: {e}")
-                    continue
+                    discount = price_info.get('discount_percent', 0)
+                    final_price = price_info.get('final_formatted', 'N/A')
+                    logger.info(f"🎉 FOUND DISCOUNT: {game_name} - {discount}% off, now {final_price}!")
+                else:
+                    logger.debug(f"💸 No discount for {game_name}")
             
             logger.info(f"✅ FINAL RESULT: Found {len(discounted_games)} games with discounts (fallback method)!")
             
@@ -691,44 +743,23 @@ class SteamWishlistParser:
                 max_games_to_check = min(WISHLIST_MAX_GAMES_CHECK, len(wishlist_items))
                 logger.info(f"🎯 LIMITED CHECK MODE: Will check {max_games_to_check} out of {len(wishlist_items)} games for discounts")
             
-            check_delay = WISHLIST_CHECK_DELAY
+            games_to_check = [game for game in wishlist_items[:max_games_to_check] if game.get('app_id')]
+            price_infos = await self.fetch_price_infos([game['app_id'] for game in games_to_check])
             
-            for i, game in enumerate(wishlist_items[:max_games_to_check]):
-                app_id = game.get('app_id', '')
+            for game, price_info in zip(games_to_check, price_infos):
                 game_name = game.get('name', 'Unknown Game')
                 
-                if not app_id:
-                    logger.debug(f"⚠️ Skipping game {i+1}: no app_id")
-                    continue
-                
-                logger.info(f"🔍 Checking discounts for {i+1}/{max_games_to_check}: {game_name} (ID: {app_id})")
-                
-                try:
-                    price_info = await self.get_game_price_info(app_id)
-                    
-                    if price_info and price_info.get('discount_percent', 0) > 0:
-                        # Объединяем данные игры с информацией о цене
-                        discounted_game = game.copy()
-                        discounted_game.update(price_info)
-                        discounted_games.append(discounted_game)
-                        
-                        discount = price_info.get('discount_percent', 0)
-                        final_price = price_info.get('final_formatted', 'N/A')
-                        logger.info(f"🎉 FOUND DISCOUNT: {game_name} - {discount}% off, now {final_price}!")
-                    else:
-                        logger.debug(f"💸 No discount for {game_name}")
+                if price_info and price_info.get('discount_percent', 0) > 0:
+                    # Объединяем данные игры с информацией о цене
+                    discounted_game = game.copy()
+                    discounted_game.update(price_info)
+                    discounted_games.append(discounted_game)
                     
-                    # Используем настраиваемую задержку между запросами
-                    if i < max_games_to_check - 1:
-                        await asyncio.sleep(check_delay)
-                        
-                        # Показываем прогресс каждые 25 игр
-                        if (i + 1) % 25 == 0:
-                            logger.info(f"🔄 Progress: {i+1}/{max_games_to_check} games checked, {len(discounted_games)} discounts found so far")
-                        
-                except Exception as e:
-                    logger.warning(f"⚠️ Error checking price for {game_name}: {e}")
-                    continue
+                    discount = price_info.get('discount_percent', 0)
+                    final_price = price_info.get('final_formatted', 'N/A')
+                    logger.info(f"🎉 FOUND DISCOUNT: {game_name} - {discount}% off, now {final_price}!")
+                else:
+                    logger.debug(f"💸 No discount for {game_name}")
             
             logger.info(f"✅ FINAL RESULT: Found {len(discounted_games)} games with discounts out of {max_games_to_check} checked!")
             
@@ -750,97 +781,149 @@ class SteamWishlistParser:
             logger.error(f"Full traceback: {traceback.format_exc()}")
             return []
     
-    async def get_game_price_info(self, app_id: str) -> Optional[Dict]:
-        """Получает информацию о цене игры"""
-        try:
-            if not app_id or not str(app_id).isdigit():
+    async def fetch_price_infos(self, app_ids: List[str]) -> List[Optional[Dict]]:
+        """
+        Получает цены для списка игр, сохраняя порядок app_ids
+        
+        Запросы идут пачками через get_prices_bulk, поэтому 600 игр
+        из wishlist - это десяток запросов к Steam, а не 600.
+        """
+        prices = await self.get_prices_bulk(app_ids)
+        return [prices.get(str(app_id)) for app_id in app_ids]
+    
+    async def get_prices_bulk(self, app_ids: List[str], cc: str = 'ru',
+                              max_age: Optional[float] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Получает цены для многих игр пачками appdetails-запросов
+        
+        Endpoint appdetails принимает список appids через запятую, если
+        запрашивается только price_overview. ID делятся на пачки по
+        WISHLIST_PRICE_BATCH_SIZE, пачки запрашиваются параллельно
+        (не больше WISHLIST_PRICE_CONCURRENCY) под token bucket.
+        
+        Свежие цены (не старше max_age, если он задан) берутся из кэша
+        метаданных, запрашиваются только остальные.
+        
+        Returns:
+            Словарь app_id -> информация о цене (None, если цены нет)
+        """
+        unique_ids = []
+        for app_id in app_ids:
+            app_id = str(app_id)
+            if not app_id.isdigit():
                 logger.warning(f"⚠️ Invalid app_id: {app_id}")
-                return None
-                
-            url = f"https://store.steampowered.com/api/appdetails?appids={app_id}&filters=price_overview&cc=ru"
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            }
-            
-            async with self.session.get(url, headers=headers, timeout=15) as response:
-                if response.status == 200:
-                    content_type = response.content_type
+                continue
+            if app_id not in unique_ids:
+                unique_ids.append(app_id)
+        
+        prices: Dict[str, Optional[Dict]] = await asyncio.to_thread(
+            self.metadata_cache.get_prices, unique_ids, cc, max_age
+        )
+        missing_ids = [app_id for app_id in unique_ids if app_id not in prices]
+        if prices:
+            logger.info(f"💾 {len(prices)}/{len(unique_ids)} prices taken from cache")
+        
+        chunks = [
+            missing_ids[i:i + WISHLIST_PRICE_BATCH_SIZE]
+            for i in range(0, len(missing_ids), WISHLIST_PRICE_BATCH_SIZE)
+        ]
+        semaphore = asyncio.Semaphore(WISHLIST_PRICE_CONCURRENCY)
+        
+        async def fetch_chunk(chunk: List[str]):
+            async with semaphore:
+                data = await self._fetch_price_chunk(chunk, cc)
+            
+            fetched = {}
+            for app_id in chunk:
+                prices[app_id] = self._parse_price_overview(app_id, data.get(app_id))
+                # Кэшируем только полученные ответы, а не ошибки запроса
+                if isinstance(data.get(app_id), dict):
+                    fetched[app_id] = prices[app_id]
+            await asyncio.to_thread(self.metadata_cache.update_prices, fetched, cc)
+            
+            logger.info(f"🔄 Progress: {len(prices)}/{len(unique_ids)} games checked")
+        
+        await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks))
+        return prices
+    
+    def _get_retry_delay(self, response, attempt: int) -> float:
+        """Пауза перед повтором после 429: Retry-After или экспоненциальная"""
+        return retry_delay(response.headers.get('Retry-After'), WISHLIST_RETRY_BACKOFF, attempt)
+    
+    async def _fetch_price_chunk(self, app_ids: List[str], cc: str) -> Dict:
+        """Один appdetails-запрос цен для пачки игр"""
+        url = f"https://store.steampowered.com/api/appdetails?appids={','.join(app_ids)}&filters=price_overview&cc={cc}"
+        
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+        }
+        
+        try:
+            for attempt in range(WISHLIST_PRICE_MAX_RETRIES + 1):
+                async with limited_get(self.session, url, self.price_limiter, headers=headers, timeout=15) as response:
+                    if response.status == 429 and attempt < WISHLIST_PRICE_MAX_RETRIES:
+                        delay = self._get_retry_delay(response, attempt)
+                        logger.warning(f"⏱️ Rate limited (429) for {len(app_ids)} apps, retrying in {delay:.1f}s")
+                        self.price_limiter.pause(delay)
+                        continue
                     
-                    if 'application/json' in content_type:
-                        try:
-                            data = await response.json()
-                            
-                            # Проверяем структуру ответа
-                            if isinstance(data, dict) and app_id in data:
-                                app_data = data[app_id]
-                                
-                                # Добавляем проверку типа app_data
-                                if not isinstance(app_data, dict):
-                                    logger.warning(f"⚠️ app_data for {app_id} is not dict: {type(app_data)} - {app_data}")
-                                    return None
-                                
-                                if app_data.get('success'):
-                                    game_data = app_data.get('data', {})
-                                    
-                                    # Проверяем тип game_data
-                                    if not isinstance(game_data, dict):
-                                        logger.warning(f"⚠️ game_data for {app_id} is not dict: {type(game_data)} - {game_data}")
-                                        return None
-                                        
-                                    price_data = game_data.get('price_overview')
-                                    
-                                    if isinstance(price_data, dict):
-                                        return {
-                                            'currency': price_data.get('currency', 'RUB'),
-                                            'initial_price': price_data.get('initial', 0),
-                                            'final_price': price_data.get('final', 0),
-                                            'discount_percent': price_data.get('discount_percent', 0),
-                                            'initial_formatted': price_data.get('initial_formatted', ''),
-                                            'final_formatted': price_data.get('final_formatted', ''),
-                                            'url': f"https://store.steampowered.com/app/{app_id}/"
-                                        }
-                                    else:
-                                        logger.debug(f"💰 No price_overview for app {app_id} (free game or not available)")
-                                        return None
-                                else:
-                                    logger.debug(f"⚠️ API returned success=false for app {app_id}")
-                                    return None
-                            else:
-                                logger.warning(f"⚠️ Unexpected data structure for app {app_id}: {type(data)}")
-                                if isinstance(data, dict):
-                                    logger.debug(f"Available keys: {list(data.keys())}")
-                                return None
-                                
-                        except Exception as json_error:
-                            logger.error(f"❌ JSON decode error for app {app_id}: {json_error}")
-                            # Попробуем получить текст для диагностики
-                            try:
-                                text_content = await response.text()
-                                logger.debug(f"Response text preview for app {app_id}: {text_content[:200]}")
-                            except:
-                                pass
-                            return None
-                    else:
-                        logger.warning(f"⚠️ Unexpected content type for app {app_id}: {content_type}")
-                        return None
-                else:
-                    logger.warning(f"⚠️ Failed to get price info for app {app_id}: HTTP {response.status}")
-                    return None
+                    if response.status != 200:
+                        logger.warning(f"⚠️ Failed to get price info for {len(app_ids)} apps: HTTP {response.status}")
+                        return {}
+                    
+                    if 'application/json' not in response.content_type:
+                        logger.warning(f"⚠️ Unexpected content type for price info: {response.content_type}")
+                        return {}
+                    
+                    data = await response.json()
+                    if not isinstance(data, dict):
+                        logger.warning(f"⚠️ Unexpected data structure for price info: {type(data)}")
+                        return {}
+                    return data
             
         except asyncio.TimeoutError:
-            logger.warning(f"⏱️ Timeout getting price info for app {app_id}")
-            return None
+            logger.warning(f"⏱️ Timeout getting price info for {len(app_ids)} apps")
         except Exception as e:
-            logger.error(f"❌ Error getting price info for {app_id}: {e}")
-            import traceback
-            logger.debug(f"Traceback for app {app_id}: {traceback.format_exc()}")
+            logger.error(f"❌ Error getting price info for {len(app_ids)} apps: {e}")
+        return {}
+    
+    def _parse_price_overview(self, app_id: str, app_data) -> Optional[Dict]:
+        """Разбирает ответ appdetails для одной игры"""
+        if not isinstance(app_data, dict):
+            logger.debug(f"⚠️ No appdetails entry for app {app_id}: {app_data}")
+            return None
+        
+        if not app_data.get('success'):
+            logger.debug(f"⚠️ API returned success=false for app {app_id}")
+            return None
+        
+        # Для бесплатных игр Steam возвращает "data": [] вместо словаря
+        game_data = app_data.get('data', {})
+        price_data = game_data.get('price_overview') if isinstance(game_data, dict) else None
+        
+        if not isinstance(price_data, dict):
+            logger.debug(f"💰 No price_overview for app {app_id} (free game or not available)")
             return None
+        
+        return {
+            'currency': price_data.get('currency', 'RUB'),
+            'initial_price': price_data.get('initial', 0),
+            'final_price': price_data.get('final', 0),
+            'discount_percent': price_data.get('discount_percent', 0),
+            'initial_formatted': price_data.get('initial_formatted', ''),
+            'final_formatted': price_data.get('final_formatted', ''),
+            'url': f"https://store.steampowered.com/app/{app_id}/"
+        }
+    
+    async def get_game_price_info(self, app_id: str) -> Optional[Dict]:
+        """Получает информацию о цене игры"""
+        prices = await self.get_prices_bulk([app_id])
+        return prices.get(str(app_id))
 
-async def get_wishlist_discounts(profile_url: str) -> List[Dict]:
+async def get_wishlist_discounts(profile_url: str, http_client: Optional[HttpClient] = None) -> List[Dict]:
     """Основная функция для получения скидок из wishlist"""
     try:
-        async with SteamWishlistParser() as parser:
+        async with SteamWishlistParser(http_client=http_client) as parser:
             steam_id = parser.extract_steam_id(profile_url)
             if not steam_id:
                 logger.error(f"Could not extract Steam ID from URL: {profile_url}")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Тест кэша метаданных игр (LRU + SQLite + TTL) без обращения к Steam
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app_metadata_cache
+from app_metadata_cache import AppMetadataCache, get_app_metadata_cache
+from database import DatabaseManager
+from steam_wishlist import SteamWishlistParser
+
+
+def make_cache(tmp, **kwargs):
+    return AppMetadataCache(DatabaseManager(os.path.join(tmp, 'test.db')), **kwargs)
+
+
+def test_lru_eviction_falls_back_to_db():
+    """Вытесненные из памяти записи читаются из базы данных"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = make_cache(tmp, max_entries=2)
+        cache.update_static({'1': {'name': 'Half-Life', 'genres': ['Action']}})
+        cache.update_static({'2': {'name': 'Portal'}, '3': {'name': 'Dota 2'}})
+
+        assert list(cache._entries) == ['2', '3']
+        assert cache.get_static(['1']) == {'1': {'name': 'Half-Life', 'genres': ['Action']}}
+        assert len(cache._entries) == 2
+
+        # Новый экземпляр (перезапуск бота) видит то же самое
+        restored = make_cache(tmp)
+        assert restored.get_names(['1', '2', '3']) == {'1': 'Half-Life', '2': 'Portal', '3': 'Dota 2'}
+        print("✅ LRU вытесняет записи, база данных их сохраняет")
+
+
+def test_static_and_price_ttl_are_separate():
+    """Цена устаревает раньше названия и привязана к региону"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = make_cache(tmp, static_ttl=3600, price_ttl=60)
+        cache.update_static({'10': {'name': 'Team Fortress 2', 'genres': ['Action']}})
+        cache.update_prices({'10': None, '20': {'final_price': 19900}}, cc='ru')
+
+        # Бесплатная игра закэширована как None, чтобы не спрашивать Steam снова
+        assert cache.get_prices(['10', '20'], 'ru') == {'10': None, '20': {'final_price': 19900}}
+        assert cache.get_prices(['10', '20'], 'us') == {}
+
+        # Вызывающий может потребовать цену свежее TTL кэша
+        cache._entries['20']['volatile_updated_at'] = time.time() - 30
+        assert '20' in cache.get_prices(['20'], 'ru')
+        assert '20' not in cache.get_prices(['20'], 'ru', max_age=10)
+
+        cache._entries['20']['volatile_updated_at'] = time.time() - 120
+        assert '20' not in cache.get_prices(['20'], 'ru')
+        # Обновление цены не затирает название и жанры
+        assert cache.get_static(['10']) == {'10': {'name': 'Team Fortress 2', 'genres': ['Action']}}
+        print("✅ TTL названия и цены независимы")
+
+
+def test_find_by_name():
+    """Поиск игры по названию без учета регистра"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = make_cache(tmp)
+        cache.update_static({'292030': {'name': 'The Witcher 3: Wild Hunt'}})
+        assert cache.find_by_name('the witcher 3: wild hunt')['app_id'] == '292030'
+        assert cache.find_by_name('Cyberpunk 2077') is None
+        print("✅ Поиск по названию работает")
+
+
+def test_wishlist_names_from_cache():
+    """Названия из кэша не запрашиваются у Steam"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = make_cache(tmp)
+        cache.update_static({'400': {'name': 'Portal'}})
+        parser = SteamWishlistParser(metadata_cache=cache)
+        # Любое обращение к сети сломает тест
+        parser.session = None
+
+        games = asyncio.run(parser.parse_api_wishlist_data([
+            {'appid': 400},
+            {'appid': 620, 'name': 'Portal 2'}
+        ]))
+
+        assert [game['name'] for game in games] == ['Portal', 'Portal 2']
+        assert cache.get_names(['620']) == {'620': 'Portal 2'}
+        print("✅ Названия wishlist взяты из кэша")
+
+
+
+def test_shared_cache_uses_given_db():
+    """Общий кэш работает через переданную базу бота, а не открывает свою"""
+    previous = app_metadata_cache._shared_cache
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseManager(os.path.join(tmp, 'test.db'))
+            cache = get_app_metadata_cache(db)
+            assert cache.db is db
+            assert get_app_metadata_cache() is cache
+            assert get_app_metadata_cache(db) is cache
+    finally:
+        # Остальные тесты не должны получить кэш над удаленной временной базой
+        app_metadata_cache._shared_cache = previous
+    print("✅ Общий кэш использует базу бота")
+
+
+if __name__ == "__main__":
+    test_lru_eviction_falls_back_to_db()
+    test_static_and_price_ttl_are_separate()
+    test_find_by_name()
+    test_wishlist_names_from_cache()
+    test_shared_cache_uses_given_db()
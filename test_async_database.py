@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Тест асинхронной обертки над DatabaseManager
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from async_database import AsyncDatabase
+from database import DatabaseManager
+
+
+def test_methods_run_in_database_thread():
+    """Методы DatabaseManager выполняются вне потока event loop"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        threads = []
+        original = db.get_user_language
+
+        def get_user_language(user_id):
+            threads.append(threading.current_thread().name)
+            return original(user_id)
+
+        db.get_user_language = get_user_language
+        async_db = AsyncDatabase(db)
+
+        async def run():
+            await async_db.add_user(1, 'user')
+            await async_db.set_user_language(1, 'en')
+            languages = await asyncio.gather(*(async_db.get_user_language(1) for _ in range(20)))
+            await async_db.close()
+            return languages
+
+        languages = asyncio.run(run())
+
+        assert languages == ['en'] * 20
+        assert all(name.startswith('database') for name in threads)
+        assert async_db.db_path == db.db_path
+        print("✅ Запросы выполняются в потоке базы данных")
+
+
+def test_iter_subscribers_with_settings():
+    """Подписчики читаются пачками вместе с настройками"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        for user_id in range(1, 8):
+            db.add_user(user_id)
+            if user_id != 4:
+                db.subscribe_user(user_id)
+        db.set_user_language(2, 'en')
+        db.set_user_min_discount(3, 70)
+        db.set_user_genres(5, ['RPG'])
+
+        batches = list(db.iter_subscriber_batches(batch_size=4))
+        assert [len(batch) for batch in batches] == [4, 2]
+
+        async_db = AsyncDatabase(db)
+
+        async def run():
+            subscribers = []
+            async for subscriber in async_db.iter_subscribers_with_settings(batch_size=2):
+                subscribers.append(subscriber)
+            await async_db.close()
+            return subscribers
+
+        subscribers = asyncio.run(run())
+
+        assert [s['user_id'] for s in subscribers] == [1, 2, 3, 5, 6, 7]
+        assert subscribers[1]['language'] == 'en'
+        assert subscribers[2]['min_discount'] == 70
+        assert subscribers[3]['genres'] == ['RPG']
+        print("✅ Подписчики с настройками получены за один проход")
+
+
+if __name__ == "__main__":
+    test_methods_run_in_database_thread()
+    test_iter_subscribers_with_settings()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Тест подготовки сообщений для рассылок
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from telegram.error import Forbidden, RetryAfter, TimedOut
+
+import broadcast
+from async_database import AsyncDatabase
+from broadcast import BroadcastEngine, BroadcastRenderer, language_key, filter_profile_key
+from database import DatabaseManager
+
+
+def make_subscribers(count):
+    return [
+        {
+            'user_id': user_id,
+            'language': 'en' if user_id % 3 == 0 else 'ru',
+            'min_discount': 50 if user_id % 2 else 30,
+            'genres': ['RPG', 'Action'] if user_id % 5 == 0 else []
+        }
+        for user_id in range(count)
+    ]
+
+
+def test_render_once_per_variant():
+    """Каждый вариант рендерится и разбивается один раз"""
+    renders = []
+    splits = []
+
+    async def render(key):
+        renders.append(key)
+        return f"{key}\n" + "line\n" * 2000
+
+    def split(message, max_length):
+        splits.append(len(message))
+        return [message[i:i + max_length] for i in range(0, len(message), max_length)]
+
+    async def run():
+        renderer = BroadcastRenderer(render, split)
+        chunk_lists = await asyncio.gather(*(
+            renderer.get_chunks(filter_profile_key(subscriber)) for subscriber in make_subscribers(10000)
+        ))
+        return renderer, chunk_lists
+
+    renderer, chunk_lists = asyncio.run(run())
+
+    # 2 языка x 2 минимальные скидки x 2 набора жанров
+    assert renderer.variant_count == 8
+    assert len(renders) == 8 and len(splits) == 8
+    assert all(len(chunks) == 3 for chunks in chunk_lists)
+    print(f"✅ 10000 получателей -> {len(renders)} рендеров")
+
+
+def test_empty_variant_and_keys():
+    """Вариант без текста дает пустой список частей"""
+    async def render(key):
+        return None if key == 'en' else 'Привет'
+
+    async def run():
+        renderer = BroadcastRenderer(render, lambda message, max_length: [message])
+        return await renderer.get_chunks('en'), await renderer.get_chunks('ru')
+
+    assert asyncio.run(run()) == ([], ['Привет'])
+
+    subscriber = {'user_id': 1, 'language': 'ru', 'min_discount': 30, 'genres': ['RPG', 'Action']}
+    assert language_key(subscriber) == 'ru'
+    assert filter_profile_key(subscriber) == ('ru', 30, ('Action', 'RPG'))
+    print("✅ Пустые варианты пропускаются")
+
+
+class FakeBot:
+    """Бот, который один раз отвечает RetryAfter, блокирует user 3 и теряет сеть для user 5"""
+
+    def __init__(self):
+        self.sent = []
+        self.calls = 0
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.calls += 1
+        if self.calls == 1:
+            raise RetryAfter(0)
+        if chat_id == 3:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        if chat_id == 5 and self.calls < 10:
+            raise TimedOut()
+        self.sent.append((chat_id, text))
+
+
+def make_engine(tmp, bot):
+    db = DatabaseManager(os.path.join(tmp, 'test.db'))
+    for user_id in range(1, 7):
+        db.add_user(user_id)
+        db.subscribe_user(user_id)
+    db.set_user_language(2, 'en')
+    async_db = AsyncDatabase(db)
+    return db, async_db, BroadcastEngine(bot, async_db, rate=1000, workers=3, per_chat_interval=0)
+
+
+def test_engine_retries_and_unsubscribes_blocked():
+    """RetryAfter и сетевые ошибки повторяются, заблокировавшие бота отписываются"""
+    broadcast.BROADCAST_RETRY_BACKOFF = 0.01
+
+    async def render(language):
+        return f"digest {language}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bot = FakeBot()
+        db, async_db, engine = make_engine(tmp, bot)
+
+        async def run():
+            stats = await engine.run('weekly_digest', async_db.iter_subscribers_with_settings,
+                                     language_key, render, lambda message, max_length: [message])
+            await async_db.close()
+            return stats
+
+        stats = asyncio.run(run())
+
+        assert stats == {'sent': 5, 'blocked': 1}
+        assert sorted(bot.sent) == [(1, 'digest ru'), (2, 'digest en'), (4, 'digest ru'), (5, 'digest ru'), (6, 'digest ru')]
+        assert 3 not in db.get_subscribed_users()
+        assert db.get_unfinished_broadcast('weekly_digest') is None
+        print(f"✅ Рассылка завершена: {stats}")
+
+
+def test_engine_resumes_unfinished_broadcast():
+    """После перезапуска отправляются только неотправленные сообщения"""
+    async def render(language):
+        return "x" * 5000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bot = FakeBot()
+        bot.calls = 1  # без RetryAfter
+        db, async_db, engine = make_engine(tmp, bot)
+
+        # Рассылка прервалась: user 1 получил все, user 2 - только первую часть
+        broadcast_id = db.create_broadcast('deals')
+        db.enqueue_broadcast_recipients(broadcast_id, [(user_id, '"ru"') for user_id in (1, 2, 4)])
+        db.set_broadcast_status(broadcast_id, 'sending')
+        db.update_outbox_entry(broadcast_id, 1, 'sent', 2, 0)
+        db.update_outbox_entry(broadcast_id, 2, 'pending', 1, 0)
+
+        async def run():
+            stats = await engine.run('deals', async_db.iter_subscribers_with_settings,
+                                     language_key, render, lambda message, max_length: [message[:max_length], message[max_length:]])
+            await async_db.close()
+            return stats
+
+        stats = asyncio.run(run())
+
+        assert stats == {'sent': 3}
+        assert [(chat_id, len(text)) for chat_id, text in bot.sent] == [(2, 1000), (4, 4000), (4, 1000)]
+        print("✅ Прерванная рассылка продолжена без повторов")
+
+
+class FloodedBot:
+    """Бот, который всегда отвечает RetryAfter пользователю 1"""
+
+    def __init__(self):
+        self.sent = []
+        self.flood_calls = 0
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if chat_id == 1:
+            self.flood_calls += 1
+            raise RetryAfter(0)
+        self.sent.append((chat_id, text))
+
+
+def test_engine_gives_up_after_repeated_retry_after():
+    """Повторяющийся RetryAfter не держит воркер бесконечно"""
+    async def render(language):
+        return f"digest {language}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bot = FloodedBot()
+        db, async_db, engine = make_engine(tmp, bot)
+
+        async def run():
+            stats = await asyncio.wait_for(
+                engine.run('weekly_digest', async_db.iter_subscribers_with_settings,
+                           language_key, render, lambda message, max_length: [message]),
+                timeout=10
+            )
+            await async_db.close()
+            return stats
+
+        stats = asyncio.run(run())
+
+        assert stats == {'sent': 5, 'failed': 1}
+        assert bot.flood_calls == broadcast.BROADCAST_MAX_RETRIES + 1
+        print(f"✅ RetryAfter ограничен повторами: {stats}")
+
+
+def test_broadcast_keeps_its_payload():
+    """Рассылка хранит свои данные, брошенная рассылка не продолжается"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        deals = [{'app_id': '10', 'title': 'Игра', 'discount': 75}]
+
+        old_id = db.create_broadcast('deals')
+        db.set_broadcast_status(old_id, 'abandoned')
+        broadcast_id = db.create_broadcast('deals', deals)
+        db.set_broadcast_status(broadcast_id, 'sending')
+
+        assert db.get_unfinished_broadcast('deals') == {'id': broadcast_id, 'status': 'sending', 'payload': deals}
+        db.set_broadcast_status(broadcast_id, 'done')
+        assert db.get_unfinished_broadcast('deals') is None
+        db.close()
+        print("✅ Рассылка продолжается со своими скидками")
+
+
+if __name__ == "__main__":
+    test_render_once_per_variant()
+    test_empty_variant_and_keys()
+    test_engine_retries_and_unsubscribes_blocked()
+    test_engine_resumes_unfinished_broadcast()
+    test_engine_gives_up_after_repeated_retry_after()
+    test_broadcast_keeps_its_payload()
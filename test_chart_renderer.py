@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Тест рендера графиков цен в пуле процессов
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from chart_renderer import ChartRenderPool
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def sample_price_data(points=30):
+    start = datetime(2025, 3, 1)
+    return [
+        {'date': start + timedelta(days=day), 'price': 1000 if day % 7 else 400, 'original_price': 1000}
+        for day in range(points)
+    ]
+
+
+def test_renders_in_worker_process():
+    """График рисуется в процессе пула, event loop продолжает работать"""
+    print("🧪 Рендер графика в пуле процессов...")
+
+    async def scenario():
+        pool = ChartRenderPool(workers=2)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker_task = asyncio.create_task(ticker())
+        try:
+            charts = await asyncio.gather(*(pool.render_chart(f'Game {i}', sample_price_data()) for i in range(3)))
+        finally:
+            ticker_task.cancel()
+            await pool.close()
+        return charts, ticks
+
+    charts, ticks = asyncio.run(scenario())
+    assert all(chart and chart.startswith(PNG_SIGNATURE) for chart in charts)
+    assert ticks > 10, "Event loop не должен блокироваться на время рендера"
+    print(f"   ✅ Графиков: {len(charts)}, тиков event loop за время рендера: {ticks}")
+
+
+def test_queue_backpressure():
+    """При заполненной очереди запрос ждет не дольше queue_timeout и получает None"""
+    print("🧪 Ограничение очереди рендера...")
+
+    async def scenario():
+        pool = ChartRenderPool(workers=1, max_pending=1, queue_timeout=0.05)
+        try:
+            first = asyncio.create_task(pool.render_chart('First', sample_price_data()))
+            await asyncio.sleep(0)
+            assert pool.pending == 1
+            second = await pool.render_chart('Second', sample_price_data())
+            return await first, second, pool.pending
+        finally:
+            await pool.close()
+
+    first, second, pending = asyncio.run(scenario())
+    assert first.startswith(PNG_SIGNATURE)
+    assert second is None
+    assert pending == 0
+    print("   ✅ Лишний запрос отклонен, очередь освобождена")
+
+
+if __name__ == "__main__":
+    test_renders_in_worker_process()
+    test_queue_backpressure()
+    print("\n🎉 Все тесты пула рендера графиков пройдены!")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Тест пула соединений DatabaseManager
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import DatabaseManager
+
+
+def test_connection_reused_per_thread():
+    """Один поток - одно соединение, у другого потока свое"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+
+        with db.connection() as first, db.connection() as second:
+            assert first is second
+            assert first.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            assert first.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(db._get_connection()))
+        thread.start()
+        thread.join()
+        assert other[0] is not first
+
+        db.close()
+        print("✅ Соединения переиспользуются внутри потока")
+
+
+def test_methods_share_connection():
+    """Методы DatabaseManager работают через общее соединение"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        db.add_user(1, 'user')
+        db.set_user_language(1, 'en')
+        db.subscribe_user(1)
+
+        assert db.get_user_language(1) == 'en'
+        assert db.get_subscribed_users() == [1]
+        assert len(db._connections) == 1
+        db.close()
+        print("✅ Методы не открывают новых соединений")
+
+
+def test_rollback_on_error():
+    """Ошибка внутри connection() откатывает транзакцию"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        try:
+            with db.connection() as conn:
+                conn.execute("INSERT INTO users (user_id) VALUES (42)")
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+
+        with db.connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
+        db.close()
+        print("✅ Транзакция откатывается при ошибке")
+
+
+if __name__ == "__main__":
+    test_connection_reused_per_thread()
+    test_methods_share_connection()
+    test_rollback_on_error()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Тест индекса скидок для подбора по настройкам пользователя
+"""
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from deal_index import DealIndex
+from deals_cache import DealsCache
+
+GENRES = ['Action', 'RPG', 'Strategy', 'Indie', 'Adventure', 'Simulation', 'Casual', 'Racing', 'Sports', 'Puzzle']
+
+
+def reference_filter(deals, user_genres, min_discount):
+    """Прежний построчный фильтр"""
+    filtered = []
+    for deal in deals:
+        if deal.get('discount', 0) < min_discount:
+            continue
+        if user_genres and not any(genre in user_genres for genre in deal.get('genres', [])):
+            continue
+        filtered.append(deal)
+    return filtered
+
+
+def random_deals(count, seed=7):
+    rng = random.Random(seed)
+    return [
+        {
+            'app_id': 1000 + i,
+            'title': f'Game {i}',
+            'discount': rng.choice([10, 20, 25, 30, 33, 40, 50, 60, 75, 80, 90, 100]),
+            'genres': rng.sample(GENRES, rng.randint(0, 3)),
+        }
+        for i in range(count)
+    ]
+
+
+def random_profiles(count, seed=11):
+    rng = random.Random(seed)
+    return [
+        (rng.choice([0, 10, 30, 50, 70, 90]), rng.sample(GENRES + ['Horror'], rng.randint(0, 3)))
+        for _ in range(count)
+    ]
+
+
+def test_matches_reference_filter():
+    """Индекс подбирает те же скидки в том же порядке, что и прежний фильтр"""
+    print("🧪 Сравнение индекса с прежним фильтром...")
+    deals = random_deals(500)
+    index = DealIndex(deals)
+    for min_discount, genres in random_profiles(300):
+        assert index.match(min_discount, genres) == reference_filter(deals, genres, min_discount)
+    assert DealIndex([]).match(30, ['RPG']) == []
+    print(f"   ✅ Совпадает для 300 профилей ({index.profile_count} различных)")
+
+
+def test_same_profile_is_computed_once():
+    """Одинаковые настройки (в любом порядке жанров) дают один и тот же результат"""
+    print("🧪 Повторное использование результата для профиля...")
+    index = DealIndex(random_deals(100))
+    first = index.match(50, ['RPG', 'Action'])
+    assert index.match(50, ('Action', 'RPG')) is first
+    assert index.profile_count == 1
+    print("   ✅ Профиль вычисляется один раз")
+
+
+def test_scales_to_many_users():
+    """100k пользователей с типичными настройками подбираются быстрее прежнего фильтра"""
+    print("🧪 Подбор для 100k пользователей...")
+    deals = random_deals(800)
+    profiles = random_profiles(100000)
+
+    started = time.perf_counter()
+    index = DealIndex(deals)
+    for min_discount, genres in profiles:
+        index.match(min_discount, genres)
+    indexed = time.perf_counter() - started
+
+    sample = profiles[:2000]
+    started = time.perf_counter()
+    for min_discount, genres in sample:
+        reference_filter(deals, genres, min_discount)
+    reference = (time.perf_counter() - started) * len(profiles) / len(sample)
+
+    print(f"   ✅ Индекс: {indexed:.2f} с, прежний фильтр (оценка): {reference:.2f} с")
+    assert indexed < reference
+
+
+def test_deals_cache_builds_index_once_per_snapshot():
+    """DealsCache строит индекс заново только для нового снимка"""
+    print("🧪 Индекс снимка в DealsCache...")
+
+    class NoScraper:
+        async def get_discounted_games(self):
+            return []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = DealsCache(NoScraper(), cache_file=os.path.join(tmp, 'deals.json'), ttl=60)
+        cache.deals = random_deals(50)
+        cache.updated_at = time.time()
+
+        async def run():
+            first = await cache.get_index()
+            same = await cache.get_index()
+            cache.deals = random_deals(60, seed=3)
+            renewed = await cache.get_index()
+            return first, same, renewed
+
+        first, same, renewed = asyncio.run(run())
+
+    assert first is same
+    assert renewed is not first and len(renewed.deals) == 60
+    print("   ✅ Индекс пересобирается только при смене снимка")
+
+
+if __name__ == "__main__":
+    test_matches_reference_filter()
+    test_same_profile_is_computed_once()
+    test_scales_to_many_users()
+    test_deals_cache_builds_index_once_per_snapshot()
+    print("\n🎉 Все тесты индекса скидок пройдены!")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Тест сравнения снимков скидок (новые, ставшие глубже, закончившиеся)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from async_database import AsyncDatabase
+from database import DatabaseManager
+from deal_state import DealStateStore, deal_price, diff_deals
+
+
+def deal(app_id, discount, price=None, title=None):
+    return {
+        'app_id': app_id,
+        'title': title or f'Game {app_id}',
+        'discount': discount,
+        'final_price': int(price * 100) if price is not None else None,
+        'url': f'https://store.steampowered.com/app/{app_id}/'
+    }
+
+
+def test_diff_deals():
+    """Новые, более глубокие и закончившиеся скидки"""
+    print("🧪 Сравнение снимков скидок...")
+    previous = {
+        '1': {'title': 'Game 1', 'discount': 50, 'price': 500.0},
+        '2': {'title': 'Game 2', 'discount': 50, 'price': 500.0},
+        '3': {'title': 'Game 3', 'discount': 40, 'price': 300.0},
+        '4': {'title': 'Game 4', 'discount': 30, 'price': 700.0},
+    }
+    events = diff_deals(previous, [
+        deal(1, 50, 500),   # без изменений
+        deal(2, 75, 250),   # скидка выросла
+        deal(3, 40, 250),   # та же скидка, но цена ниже
+        deal(5, 90, 100),   # новая
+        deal(5, 90, 100),   # дубликат в снимке
+    ])
+
+    assert [d['app_id'] for d in events['new']] == [5]
+    assert [d['app_id'] for d in events['deepened']] == [2, 3]
+    assert events['deepened'][0]['previous_discount'] == 50
+    assert [d['app_id'] for d in events['ended']] == ['4']
+    print("   ✅ События определены верно")
+
+
+def test_store_roundtrip():
+    """Повторный снимок без изменений не дает событий, вернувшаяся скидка снова новая"""
+    print("🧪 Хранение состояния скидок в базе...")
+    with tempfile.TemporaryDirectory() as tmp:
+        async_db = AsyncDatabase(DatabaseManager(os.path.join(tmp, 'test.db')))
+        store = DealStateStore(async_db)
+
+        async def snapshot(deals):
+            events = await store.diff(deals)
+            await store.commit(deals, events)
+            return events
+
+        async def run():
+            first = await snapshot([deal(1, 50, 500), deal(2, 30, 700)])
+            repeated = await snapshot([deal(1, 50, 500), deal(2, 30, 700)])
+            shallower = await snapshot([deal(1, 40, 600)])
+            returned = await snapshot([deal(1, 50, 500), deal(2, 30, 700)])
+            await async_db.close()
+            return first, repeated, shallower, returned
+
+        first, repeated, shallower, returned = asyncio.run(run())
+
+    assert len(first['new']) == 2
+    assert not any(repeated.values()), "Одинаковый снимок не должен давать событий"
+    assert not shallower['new'] and not shallower['deepened']
+    assert [s['app_id'] for s in shallower['ended']] == ['2']
+    assert [d['app_id'] for d in returned['new']] == [2], "Закончившаяся скидка снова считается новой"
+    assert [d['app_id'] for d in returned['deepened']] == [1]
+    print("   ✅ Состояние сохраняется между снимками")
+
+
+def test_deal_price_prefers_scraped_price():
+    """Цена со страницы поиска важнее цены из кэша appdetails"""
+    assert deal_price({'discounted_price': '839 pуб.', 'final_price': 99900}) == 839.0
+    assert deal_price({'discounted_price': '1 299,50 ₽'}) == 1299.5
+    assert deal_price({'discounted_price': 'Free', 'final_price': 19900}) == 199.0
+    assert deal_price({'discounted_price': ''}) is None
+    print("✅ Цена со страницы поиска в приоритете")
+
+
+if __name__ == "__main__":
+    test_diff_deals()
+    test_store_roundtrip()
+    test_deal_price_prefers_scraped_price()
+    print("\n🎉 Все тесты состояния скидок пройдены!")
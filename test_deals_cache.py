@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Тест общего снимка скидок (DealsCache) без обращения к Steam
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from deals_cache import DealsCache
+
+
+class FakeScraper:
+    """Подменяет SteamScraper и считает количество парсингов"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def get_discounted_games(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return [{'title': f'Game {self.calls}', 'app_id': 1, 'discount': 50}]
+
+
+def make_cache(scraper, cache_file):
+    """DealsCache без запросов цен к Steam"""
+    cache = DealsCache(scraper, cache_file=cache_file, ttl=60)
+
+    async def no_prices(deals):
+        pass
+
+    cache._attach_prices = no_prices
+    return cache
+
+
+def test_concurrent_misses_coalesce():
+    """Параллельные запросы при пустом снимке вызывают один парсинг"""
+    with tempfile.TemporaryDirectory() as tmp:
+        scraper = FakeScraper()
+        cache = make_cache(scraper, os.path.join(tmp, 'deals.json'))
+
+        async def run():
+            return await asyncio.gather(*(cache.get_deals() for _ in range(50)))
+
+        results = asyncio.run(run())
+
+        assert scraper.calls == 1
+        assert all(result == results[0] for result in results)
+        print("✅ 50 параллельных /deals -> 1 парсинг Steam")
+
+
+def test_snapshot_persisted_to_disk():
+    """Снимок сохраняется на диск и читается новым экземпляром"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_file = os.path.join(tmp, 'deals.json')
+        scraper = FakeScraper()
+        asyncio.run(make_cache(scraper, cache_file).get_deals())
+
+        restored = DealsCache(FakeScraper(), cache_file=cache_file, ttl=60)
+        assert restored.is_fresh()
+        assert restored.deals[0]['title'] == 'Game 1'
+        print("✅ Снимок восстановлен с диска")
+
+
+def test_stale_snapshot_served_while_refreshing():
+    """Устаревший снимок отдается сразу, обновление идет в фоне"""
+    with tempfile.TemporaryDirectory() as tmp:
+        scraper = FakeScraper()
+        cache = make_cache(scraper, os.path.join(tmp, 'deals.json'))
+        cache.deals = [{'title': 'Old Game', 'app_id': 2, 'discount': 40}]
+        cache.updated_at = time.time() - 3600
+
+        async def run():
+            stale = await cache.get_deals()
+            await cache._refresh_task
+            return stale, cache.deals
+
+        stale, fresh = asyncio.run(run())
+
+        assert stale[0]['title'] == 'Old Game'
+        assert fresh[0]['title'] == 'Game 1'
+        assert scraper.calls == 1
+        print("✅ Устаревший снимок отдан без ожидания парсинга")
+
+
+class RecordingDatabase:
+    """Запоминает записи истории цен"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def add_price_records(self, records):
+        self.calls.append(records)
+
+
+def test_prices_recorded_once_per_snapshot():
+    """История цен пишется при обновлении снимка, чтение снимка ничего не пишет"""
+    with tempfile.TemporaryDirectory() as tmp:
+        async_db = RecordingDatabase()
+        scraper = FakeScraper()
+        cache = make_cache(scraper, os.path.join(tmp, 'deals.json'))
+        cache.async_db = async_db
+
+        async def priced_deals():
+            return [{'title': 'Portal', 'app_id': 400, 'discount': 75, 'discounted_price': '99₽'}]
+
+        scraper.get_discounted_games = priced_deals
+
+        async def run():
+            await cache.get_deals()
+            for _ in range(10):
+                await cache.get_deals()
+
+        asyncio.run(run())
+
+        assert async_db.calls == [[('400', 'Portal', 99.0, 75)]]
+        print("✅ Цены записаны один раз на снимок")
+
+
+if __name__ == "__main__":
+    test_concurrent_misses_coalesce()
+    test_snapshot_persisted_to_disk()
+    test_stale_snapshot_served_while_refreshing()
+    test_prices_recorded_once_per_snapshot()
@@ -6,7 +6,7 @@
 import asyncio
 import logging
 from steam_wishlist import get_wishlist_discounts
-from config import WISHLIST_MAX_GAMES_CHECK, WISHLIST_CHECK_DELAY, WISHLIST_ENABLE_FULL_CHECK
+from config import WISHLIST_MAX_GAMES_CHECK, HOST_RATE_LIMITS, WISHLIST_PRICE_CONCURRENCY, WISHLIST_ENABLE_FULL_CHECK
 
 # Настройка логирования
 logging.basicConfig(
@@ -22,7 +22,8 @@ async def test_full_wishlist_check():
     # Проверяем текущие настройки
     print(f"📋 Current Settings:")
     print(f"   WISHLIST_MAX_GAMES_CHECK: {WISHLIST_MAX_GAMES_CHECK}")
-    print(f"   WISHLIST_CHECK_DELAY: {WISHLIST_CHECK_DELAY}")
+    print(f"   HOST_RATE_LIMITS[store.steampowered.com]: {HOST_RATE_LIMITS['store.steampowered.com']}")
+    print(f"   WISHLIST_PRICE_CONCURRENCY: {WISHLIST_PRICE_CONCURRENCY}")
     print(f"   WISHLIST_ENABLE_FULL_CHECK: {WISHLIST_ENABLE_FULL_CHECK}")
     
     if WISHLIST_ENABLE_FULL_CHECK:
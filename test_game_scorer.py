@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Регрессионный тест рейтинга игр для еженедельного дайджеста
+GameScorer.score и score_many должны давать те же баллы, что и прежний
+построчный алгоритм из SteamDealsBot._calculate_game_score
+"""
+
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from game_scorer import (
+    DLC_KEYWORDS, OLD_YEARS, POPULAR_KEYWORDS, TRENDING_KEYWORDS, GameScorer, parse_price
+)
+
+
+def reference_score(deal):
+    """Прежний алгоритм рейтинга (без изменений)"""
+    try:
+        discount = deal.get('discount', 0)
+        title = deal.get('title', '').lower()
+        discounted_price = deal.get('discounted_price', '0')
+        try:
+            price_str = str(discounted_price).replace('₽', '').replace('$', '').replace(',', '.').strip()
+            price = float(price_str) if price_str else 0.0
+        except:
+            price = 0.0
+
+        discount_score = min(discount, 90)
+        popularity_score = 0
+        for keyword in POPULAR_KEYWORDS:
+            if keyword in title:
+                popularity_score += 30
+                break
+
+        if 0 < price <= 500:
+            price_score = 25
+        elif 500 < price <= 1500:
+            price_score = 20
+        elif 1500 < price <= 3000:
+            price_score = 15
+        else:
+            price_score = 5
+
+        bonus_score = 0
+        full_text = title + ' ' + deal.get('description', '').lower()
+        for keyword in TRENDING_KEYWORDS:
+            if keyword in full_text:
+                bonus_score += 5
+                break
+
+        penalty = 0
+        for keyword in DLC_KEYWORDS:
+            if keyword in title:
+                penalty += 15
+                break
+        for year in OLD_YEARS:
+            if year in title:
+                penalty += 10
+                break
+
+        final_score = discount_score + popularity_score + price_score + bonus_score - penalty
+        return max(0, min(final_score, 200))
+    except Exception:
+        return deal.get('discount', 0)
+
+
+WORDS = ['Super', 'Legend', 'of', 'the', 'Night', 'Edition', 'Remastered', 'II', '3', 'Deluxe', 'Простая', 'игра']
+
+
+def synthetic_deals(count, seed=42):
+    """Синтетические скидки с ключевыми словами в разных местах названия"""
+    rng = random.Random(seed)
+    keywords = POPULAR_KEYWORDS + TRENDING_KEYWORDS + DLC_KEYWORDS + OLD_YEARS
+    deals = []
+    for i in range(count):
+        parts = rng.sample(WORDS, rng.randint(1, 4))
+        for _ in range(rng.randint(0, 2)):
+            keyword = rng.choice(keywords)
+            parts.insert(rng.randint(0, len(parts)), keyword.upper() if rng.random() < 0.3 else keyword.title())
+        price = rng.choice(['', '0', '149₽', '499', '500', '501 ₽', '1499,99', '$19,99', '1500', '2999', '3000',
+                            '3001', '4999₽', 'Free', None, 'бесплатно'])
+        deal = {
+            'title': ' '.join(parts),
+            'discount': rng.choice([0, 5, 10, 33, 50, 75, 90, 95, 100, -10, 250]),
+            'discounted_price': price,
+        }
+        if rng.random() < 0.3:
+            deal['description'] = rng.choice(['An Open World survival game', 'Co-op roguelike', 'Puzzle', ''])
+        deals.append(deal)
+    return deals
+
+
+def test_score_matches_reference():
+    """score() совпадает с прежним алгоритмом"""
+    print("🧪 Сравнение score() с прежним алгоритмом...")
+    scorer = GameScorer()
+    for deal in synthetic_deals(3000):
+        assert scorer.score(deal) == reference_score(deal), deal
+    print("   ✅ 3000 игр, баллы совпадают")
+
+
+def test_score_many_matches_reference():
+    """score_many() совпадает с прежним алгоритмом, включая нестандартные записи"""
+    print("🧪 Сравнение score_many() с прежним алгоритмом...")
+    deals = synthetic_deals(3000, seed=7)
+    deals += [
+        {'title': None, 'discount': 50},
+        {'title': 'Portal 2', 'discount': 70, 'description': None},
+        {'title': 'Half-Life', 'discount': 40.5, 'discounted_price': '99'},
+        {'title': 'Doom', 'discount': True},
+        {'discount': 60},
+        {'title': 'Gta' + 'x' * 10 + 'dlc', 'discount': 80, 'discounted_price': '1000'},
+    ]
+    expected = [reference_score(deal) for deal in deals]
+    assert GameScorer().score_many(deals) == expected
+    assert GameScorer().score_many([]) == []
+
+    prices = [parse_price(deal.get('discounted_price', '0')) for deal in deals]
+    assert GameScorer().score_many(deals, prices) == expected
+    print(f"   ✅ {len(deals)} игр, баллы совпадают")
+
+
+if __name__ == "__main__":
+    test_score_matches_reference()
+    test_score_many_matches_reference()
+    print("\n🎉 Все тесты рейтинга игр пройдены!")
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Тест общего HTTP-клиента на локальном сервере, без обращения к Steam
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from aiohttp import web
+
+from http_client import HttpClient, client_session, get_http_client, limited_get
+from rate_limiter import AdaptiveRateLimiter
+from steam_scraper import SteamScraper
+from steam_wishlist import SteamWishlistParser
+
+
+class LocalServer:
+    """HTTP-сервер на 127.0.0.1: запоминает порты клиентов и одновременные запросы"""
+
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.rate_limited = 0
+        self.peer_ports = []
+        self.user_agents = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request):
+        if self.rate_limited:
+            self.rate_limited -= 1
+            return web.Response(status=429, headers={'Retry-After': '1'})
+        self.peer_ports.append(request.transport.get_extra_info('peername')[1])
+        self.user_agents.append(request.headers.get('User-Agent'))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        return web.json_response({'ok': True})
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get('/', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.url = f"http://127.0.0.1:{port}/"
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.runner.cleanup()
+
+
+def test_keep_alive_reuses_connection():
+    """Последовательные запросы идут по одному соединению с заголовками по умолчанию"""
+    async def run():
+        client = HttpClient()
+        async with LocalServer() as server:
+            session = await client.start()
+            for _ in range(5):
+                async with session.get(server.url) as response:
+                    assert response.status == 200
+                    await response.read()
+            await client.close()
+        return server
+
+    server = asyncio.run(run())
+    print(f"Client ports: {set(server.peer_ports)}")
+    assert len(server.peer_ports) == 5
+    assert len(set(server.peer_ports)) == 1, "Keep-alive соединение должно переиспользоваться"
+    assert all(agent and agent.startswith('Mozilla/5.0') for agent in server.user_agents)
+    print("✅ Keep-alive and default headers test passed")
+
+
+def test_limit_per_host():
+    """Одновременных запросов к одному хосту не больше limit_per_host"""
+    async def run():
+        client = HttpClient(limit_per_host=2)
+        async with LocalServer(delay=0.05) as server:
+            session = await client.get_session()
+
+            async def fetch():
+                async with session.get(server.url) as response:
+                    await response.read()
+
+            await asyncio.gather(*(fetch() for _ in range(6)))
+            await client.close()
+        return server
+
+    server = asyncio.run(run())
+    print(f"Max in flight: {server.max_in_flight}")
+    assert len(server.peer_ports) == 6
+    assert server.max_in_flight == 2
+    print("✅ Per-host connection limit test passed")
+
+
+def test_injected_session_is_not_closed():
+    """Парсеры используют общую сессию и не закрывают ее при выходе"""
+    async def run():
+        client = HttpClient()
+        shared = await client.start()
+
+        async with SteamScraper(client) as scraper:
+            assert scraper.session is shared
+        async with SteamWishlistParser(http_client=client) as parser:
+            assert parser.session is shared
+        async with client_session(client) as session:
+            assert session is shared
+        assert not shared.closed
+
+        # Без общего клиента парсер по-прежнему создает и закрывает свою сессию
+        async with SteamScraper() as scraper:
+            own = scraper.session
+            assert own is not shared
+        assert own.closed
+
+        await client.close()
+        assert shared.closed
+        assert client.closed
+        # После остановки клиент можно запустить снова
+        restarted = await client.start()
+        assert restarted is not shared and not restarted.closed
+        await client.close()
+
+    asyncio.run(run())
+    print("✅ Injected session lifecycle test passed")
+
+
+def test_second_event_loop_is_rejected():
+    """Открытую сессию нельзя использовать из другого event loop, после close() - можно"""
+    client = HttpClient()
+
+    async def start():
+        return await client.start()
+
+    first = asyncio.run(start())
+    try:
+        asyncio.run(start())
+        assert False, "Ожидалась ошибка RuntimeError"
+    except RuntimeError as e:
+        assert 'another event loop' in str(e)
+    assert client._session is first
+
+    async def restart():
+        await first.close()
+        session = await client.start()
+        assert session is not first
+        await client.close()
+
+    asyncio.run(restart())
+    print("✅ Second event loop test passed")
+
+
+def test_limited_get_feeds_limiter():
+    """Ответ 429 с Retry-After снижает частоту хоста и приостанавливает запросы"""
+    async def run():
+        client = HttpClient()
+        limiter = AdaptiveRateLimiter(rate=50, burst=5, min_rate=1, max_rate=100)
+        async with LocalServer() as server:
+            server.rate_limited = 1
+            session = await client.get_session()
+            async with limited_get(session, server.url, limiter) as response:
+                assert response.status == 429
+            assert limiter.rate == 25
+            started = asyncio.get_running_loop().time()
+            async with limited_get(session, server.url, limiter) as response:
+                assert response.status == 200
+            waited = asyncio.get_running_loop().time() - started
+            await client.close()
+        return limiter, waited
+
+    limiter, waited = asyncio.run(run())
+    assert waited >= 0.9, "Повтор должен ждать Retry-After"
+    assert limiter.rate > 25, "Успешный ответ снова поднимает частоту"
+    print(f"✅ limited_get: 429 -> {limiter.rate:.2f} req/s, ожидание {waited:.2f}с")
+
+
+def test_shared_client_singleton():
+    """get_http_client возвращает один клиент на все приложение"""
+    assert get_http_client() is get_http_client()
+    print("✅ Shared client test passed")
+
+
+if __name__ == "__main__":
+    test_keep_alive_reuses_connection()
+    test_limit_per_host()
+    test_injected_session_is_not_closed()
+    test_second_event_loop_is_rejected()
+    test_limited_get_feeds_limiter()
+    test_shared_client_singleton()
+    print("\n🎉 All HTTP client tests passed!")
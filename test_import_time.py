@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Тест времени запуска бота: python -X importtime для steam_bot
+Тяжелые модули (ИИ-клиенты, bs4, numpy, matplotlib) должны загружаться
+только командами, которые их используют, а импорт бота - укладываться в бюджет
+"""
+
+import os
+import re
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Бюджет импорта steam_bot (в миллисекундах); на медленных машинах можно увеличить
+IMPORT_TIME_BUDGET_MS = int(os.getenv("IMPORT_TIME_BUDGET_MS", "350"))
+
+# Модули, которые не должны загружаться при старте бота
+DEFERRED_MODULES = [
+    'openai', 'bs4', 'numpy', 'matplotlib',
+    'ai_recommendations', 'ai_game_recommendations', 'steam_library', 'steam_wishlist',
+    'price_chart_generator',
+]
+
+IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def import_steam_bot():
+    """Импортирует steam_bot в чистом процессе: (время импорта в мс, загруженные модули)"""
+    code = (
+        "import sys, steam_bot\n"
+        f"print(','.join(name for name in {DEFERRED_MODULES!r} if name in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=PROJECT_DIR, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match and match.group(4) == 'steam_bot':
+            cumulative_us = int(match.group(2))
+    assert cumulative_us is not None, "steam_bot не найден в выводе -X importtime"
+
+    loaded = [name for name in result.stdout.strip().split(',') if name]
+    return cumulative_us / 1000, loaded
+
+
+def test_heavy_modules_are_deferred():
+    """Тяжелые зависимости не загружаются при импорте бота"""
+    print("🧪 Отложенная загрузка тяжелых модулей...")
+    _, loaded = import_steam_bot()
+    assert loaded == [], f"При старте загружены: {', '.join(loaded)}"
+    print("   ✅ openai, bs4, numpy и matplotlib не загружаются при старте")
+
+
+def test_import_time_budget():
+    """Импорт steam_bot укладывается в бюджет (лучший из трех запусков)"""
+    print("🧪 Время импорта steam_bot...")
+    best_ms = min(import_steam_bot()[0] for _ in range(3))
+    assert best_ms <= IMPORT_TIME_BUDGET_MS, \
+        f"Импорт steam_bot занял {best_ms:.0f} мс при бюджете {IMPORT_TIME_BUDGET_MS} мс"
+    print(f"   ✅ {best_ms:.0f} мс (бюджет {IMPORT_TIME_BUDGET_MS} мс)")
+
+
+if __name__ == "__main__":
+    test_heavy_modules_are_deferred()
+    test_import_time_budget()
+    print("\n🎉 Все тесты времени запуска пройдены!")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Тест версионных миграций схемы базы данных
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import DatabaseManager
+from migrations import SCHEMA_VERSION
+
+
+def test_fresh_database_gets_indexes():
+    """Новая база получает последнюю версию схемы и индексы"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        with db.connection() as conn:
+            assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT price FROM price_history WHERE app_id = ? ORDER BY recorded_at DESC",
+                ('10',)
+            ).fetchall()
+
+        assert {'idx_price_history_app_recorded', 'idx_users_subscribed', 'idx_users_language'} <= indexes
+        assert any('idx_price_history_app_recorded' in row[-1] for row in plan)
+        db.close()
+        print("✅ Индексы созданы и используются")
+
+
+def test_legacy_database_upgraded_once():
+    """Старая база без версии получает недостающие колонки"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'legacy.db')
+        with sqlite3.connect(path) as conn:
+            conn.execute('CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, is_subscribed BOOLEAN DEFAULT 0)')
+            conn.execute('CREATE TABLE weekly_top (id INTEGER PRIMARY KEY AUTOINCREMENT, game_title TEXT, discount INTEGER, discounted_price TEXT)')
+            conn.execute("INSERT INTO users (user_id, username) VALUES (1, 'old')")
+        conn.close()
+
+        db = DatabaseManager(path)
+        db.add_weekly_top_game('Portal', 75, 99.0, 80.5)
+
+        assert db.get_user_language(1) == 'ru'
+        assert db.get_weekly_top_games() == [{'title': 'Portal', 'discount': 75, 'price': '99.0', 'score': 80.5}]
+        db.close()
+
+        # Повторный запуск ничего не меняет
+        db = DatabaseManager(path)
+        with db.connection() as conn:
+            assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+        db.close()
+        print("✅ Старая база обновлена до текущей схемы")
+
+
+if __name__ == "__main__":
+    test_fresh_database_gets_indexes()
+    test_legacy_database_upgraded_once()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Тест графиков цен по сохраненной истории и дискового кэша готовых графиков
+"""
+
+import asyncio
+import os
+import struct
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from chart_cache import ChartImageCache, chart_cache_key
+from config import CHART_DPI
+from database import DatabaseManager
+from price_chart_generator import extract_game_id_from_url, generate_price_chart
+
+
+def png_size(data: bytes):
+    """Ширина и высота PNG из заголовка IHDR"""
+    return struct.unpack('>II', data[16:24])
+
+
+def test_extract_game_id():
+    """app_id из ссылок Steam и строки из цифр, название - None"""
+    print("🧪 Разбор ссылок на игры...")
+    assert extract_game_id_from_url("https://store.steampowered.com/app/1091500/Cyberpunk_2077/") == '1091500'
+    assert extract_game_id_from_url("steamcommunity.com/app/730") == '730'
+    assert extract_game_id_from_url("steam://store/570") == '570'
+    assert extract_game_id_from_url(" 292030 ") == '292030'
+    assert extract_game_id_from_url("Counter-Strike 2") is None
+    print("   ✅ Ссылки разобраны")
+
+
+def test_cache_evicts_least_recently_used():
+    """Кэш не превышает max_bytes и вытесняет давно не запрашивавшиеся графики"""
+    print("🧪 LRU-вытеснение графиков...")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ChartImageCache(tmp, max_bytes=300)
+        for name in ('a', 'b', 'c'):
+            cache.put(name + '.png', name.encode() * 100)
+        assert cache.get('a.png') == b'a' * 100  # 'a' становится самым свежим
+
+        cache.put('d.png', b'd' * 100)
+        assert cache.get('b.png') is None
+        assert sorted(os.listdir(tmp)) == ['a.png', 'c.png', 'd.png']
+        assert cache.total_bytes == 300
+
+        # После перезапуска порядок восстанавливается по времени изменения файлов
+        for age, name in enumerate(('a.png', 'd.png', 'c.png')):
+            os.utime(os.path.join(tmp, name), (1000 + age, 1000 + age))
+        cache = ChartImageCache(tmp, max_bytes=200)
+        assert len(cache) == 2 and cache.get('a.png') is None
+        print("   ✅ Размер кэша ограничен, вытесняются старые графики")
+
+
+def test_chart_from_history_is_cached():
+    """Повторный график игры без изменения цены читается из кэша"""
+    print("🧪 График по истории цен и его кэширование...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        cache = ChartImageCache(os.path.join(tmp, 'charts'))
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        for day, (price, discount) in enumerate([(1000.0, 0), (1000.0, 0), (400.0, 60), (1000.0, 0)]):
+            db.add_price_record('10', 'Portal', price, discount, today - timedelta(days=40 - day * 10))
+
+        chart, info = asyncio.run(generate_price_chart('10', chart_cache=cache, db=db))
+        assert info == {'id': 10, 'name': 'Portal', 'data_source': 'history'}
+        png = chart.getvalue()
+        assert png_size(png) == (12 * CHART_DPI, 7 * CHART_DPI)
+
+        chart, info = asyncio.run(generate_price_chart('https://store.steampowered.com/app/10/', chart_cache=cache, db=db))
+        assert info['data_source'] == 'cache' and chart.getvalue() == png
+
+        # Другой язык - другой график, новая цена - новая версия графика
+        _, info = asyncio.run(generate_price_chart('10', language='en', chart_cache=cache, db=db))
+        assert info['data_source'] == 'history'
+        db.add_price_record('10', 'Portal', 250.0, 75, today)
+        _, info = asyncio.run(generate_price_chart('10', chart_cache=cache, db=db))
+        assert info['data_source'] == 'history'
+        assert len(cache) == 3
+        last_change = db.get_last_price_change('10')
+        assert cache.get(chart_cache_key('10', last_change, 'ru', today.date().isoformat())) is not None
+        # На следующий день окно графика сдвигается - ключ другой
+        tomorrow = (today + timedelta(days=1)).date().isoformat()
+        assert cache.get(chart_cache_key('10', last_change, 'ru', tomorrow)) is None
+        db.close()
+        print(f"   ✅ PNG {png_size(png)[0]}x{png_size(png)[1]}, {len(png)} байт")
+
+
+if __name__ == "__main__":
+    test_extract_game_id()
+    test_cache_evicts_least_recently_used()
+    test_chart_from_history_is_cached()
+    print("\n🎉 Все тесты графиков цен пройдены!")
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Тест хранилища истории цен: запись только изменений, агрегаты, минимумы и срок хранения
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import DatabaseManager
+from price_chart_generator import PriceChartGenerator
+
+START = datetime(2025, 3, 3, 12, 0)  # Понедельник
+
+
+def count_rows(db, table):
+    with db.connection() as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_writes_only_price_changes():
+    """Повторные наблюдения той же цены не добавляют строк"""
+    print("🧪 Запись только изменений цены...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        observations = [1000.0] * 5 + [500.0] * 3 + [1000.0]
+        changes = [
+            db.add_price_record('10', 'Portal', price, 50 if price == 500.0 else 0, START + timedelta(hours=hour))
+            for hour, price in enumerate(observations)
+        ]
+
+        assert changes == [True, False, False, False, False, True, False, False, True]
+        assert count_rows(db, 'price_history') == 3
+        assert [row['price'] for row in db.get_price_history('10')] == [1000.0, 500.0, 1000.0]
+        # Все наблюдения пришлись на один день и одну неделю
+        assert count_rows(db, 'price_rollups') == 2
+        db.close()
+        print("   ✅ 9 наблюдений -> 3 строки истории")
+
+
+def test_precomputed_minimum():
+    """Минимум цены хранится отдельно и не зависит от срока хранения истории"""
+    print("🧪 Исторический минимум...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        assert db.get_price_minimum('10') is None
+
+        db.add_price_records([('10', 'Portal', 800.0, 20), ('20', 'Doom', 300.0, 0)], START)
+        db.add_price_records([('10', 'Portal', 400.0, 60)], START + timedelta(days=1))
+        db.add_price_records([('10', 'Portal', 900.0, 10)], START + timedelta(days=200))
+
+        minimum = db.get_price_minimum('10')
+        assert minimum == {
+            'min_price': 400.0, 'min_price_at': '2025-03-04 12:00:00',
+            'recent_min_price': 900.0, 'recent_min_on': '2025-09-19',
+            'last_price': 900.0, 'last_seen_on': '2025-09-19', 'title': 'Portal'
+        }
+
+        db.apply_price_retention(raw_days=90, daily_days=90, now=START + timedelta(days=200))
+        assert db.get_price_minimum('10')['min_price'] == 400.0
+        db.close()
+        print("   ✅ Минимум 400₽ сохранился после очистки истории")
+
+
+def test_recent_low_window():
+    """Недавний минимум учитывает только цены за последние PRICE_RECENT_LOW_DAYS дней"""
+    print("🧪 Минимум за последние дни...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        for day, price in ((0, 300.0), (40, 700.0), (50, 500.0), (60, 900.0)):
+            db.add_price_record('10', 'Portal', price, 0, START + timedelta(days=day))
+
+        minimum = db.get_price_minimum('10')
+        assert (minimum['min_price'], minimum['recent_min_price']) == (300.0, 300.0)
+
+        # Через 100 дней цена 300₽ вышла из окна, минимум окна - 500₽ (день 50)
+        db.add_price_record('10', 'Portal', 900.0, 0, START + timedelta(days=100))
+        minimum = db.get_price_minimum('10')
+        assert (minimum['min_price'], minimum['recent_min_price']) == (300.0, 500.0)
+        assert minimum['recent_min_on'] == '2025-04-22'
+
+        # Игра без новых наблюдений пересчитывается при очистке истории
+        db.apply_price_retention(now=START + timedelta(days=145))
+        assert db.get_price_minimum('10')['recent_min_price'] == 900.0
+        db.close()
+        print("   ✅ Недавний минимум сдвигается вместе с окном")
+
+
+def test_bulk_extremes_lookup():
+    """Минимумы для списка игр читаются одним запросом"""
+    print("🧪 Минимумы цен списком...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        db.add_price_records([(str(app_id), f'Game {app_id}', 100.0 + app_id, 0) for app_id in range(1200)], START)
+
+        statements = []
+        with db.connection() as conn:
+            conn.set_trace_callback(statements.append)
+        extremes = db.get_price_extremes([str(app_id) for app_id in range(1200)] + ['10', 'missing'])
+        with db.connection() as conn:
+            conn.set_trace_callback(None)
+
+        assert len(extremes) == 1200
+        assert extremes['10']['min_price'] == 110.0
+        assert sum('FROM price_extremes' in statement for statement in statements) == 3  # Пачки по 500
+        assert db.get_price_extremes([]) == {}
+        db.close()
+        print(f"   ✅ 1200 игр за {len(statements)} запросов")
+
+
+def test_price_series_resolutions():
+    """Изменения цены, дневные и недельные агрегаты за период"""
+    print("🧪 Выборка цен по периодам...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        for day in range(14):
+            for hour, price in enumerate((1000.0, 600.0 if day % 2 else 700.0)):
+                db.add_price_record('10', 'Portal', price, 0, START + timedelta(days=day, hours=hour))
+
+        daily = db.get_price_series('10', resolution='day')
+        assert len(daily) == 14
+        assert daily[1] == {'date': '2025-03-04', 'price': 600.0, 'min_price': 600.0, 'max_price': 1000.0, 'discount': 0}
+
+        weekly = db.get_price_series('10', resolution='week')
+        assert [point['date'] for point in weekly] == ['2025-03-03', '2025-03-10']
+        assert weekly[0]['min_price'] == 600.0 and weekly[0]['max_price'] == 1000.0
+
+        since = START + timedelta(days=13, minutes=30)
+        raw = db.get_price_series('10', since=since)
+        # Первая точка - цена, действовавшая в момент since
+        assert [point['price'] for point in raw] == [1000.0, 600.0]
+        assert raw[0]['date'] == '2025-03-16 12:00:00'
+        assert db.get_price_series('10', since=since, resolution='day')[0]['date'] == '2025-03-16'
+        db.close()
+        print(f"   ✅ Дней: {len(daily)}, недель: {len(weekly)}")
+
+
+def test_retention_keeps_current_price():
+    """Старые изменения и дневные агрегаты удаляются, действующая цена остается"""
+    print("🧪 Срок хранения истории...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        db.add_price_record('10', 'Portal', 1000.0, 0, START)
+        db.add_price_record('10', 'Portal', 500.0, 50, START + timedelta(days=10))
+        db.add_price_record('10', 'Portal', 1000.0, 0, START + timedelta(days=100))
+        # Цена не менялась с начала - единственная серия должна остаться
+        db.add_price_record('20', 'Doom', 300.0, 0, START)
+
+        now = START + timedelta(days=120)
+        deleted = db.apply_price_retention(raw_days=90, daily_days=60, now=now)
+
+        assert deleted == {'raw': 1, 'day': 3}
+        # Скидка до 10 + 100 дня еще действовала 90 дней назад
+        assert [point['price'] for point in db.get_price_series('10')] == [500.0, 1000.0]
+        assert [point['price'] for point in db.get_price_series('20')] == [300.0]
+        assert len(db.get_price_series('10', resolution='week')) == 3
+        assert db.apply_price_retention(raw_days=90, daily_days=60, now=now) == {'raw': 0, 'day': 0}
+        db.close()
+        print(f"   ✅ Удалено: {deleted}")
+
+
+def test_legacy_history_collapsed():
+    """Миграция сворачивает повторяющиеся записи старой истории и строит агрегаты"""
+    print("🧪 Миграция старой истории цен...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'legacy.db')
+        db = DatabaseManager(path)
+        db.close()
+        with sqlite3.connect(path) as conn:
+            conn.execute('DROP TABLE price_rollups')
+            conn.execute('DROP TABLE price_extremes')
+            conn.executemany(
+                'INSERT INTO price_history (app_id, game_title, price, discount, recorded_at) VALUES (?, ?, ?, ?, ?)',
+                [('10', 'Portal', price, 0, f'2025-03-0{day} 10:00:00')
+                 for day, price in enumerate([1000.0, 1000.0, 700.0, 700.0, 700.0, 1000.0], start=1)]
+            )
+            conn.execute('PRAGMA user_version = 7')
+        conn.close()
+
+        db = DatabaseManager(path)
+        assert [row['price'] for row in db.get_price_history('10')] == [1000.0, 700.0, 1000.0]
+        assert db.get_price_minimum('10')['min_price_at'] == '2025-03-03 10:00:00'
+        assert len(db.get_price_series('10', resolution='day')) == 6
+        # Повторная цена после миграции не пишется
+        assert not db.add_price_record('10', 'Portal', 1000.0, 0, datetime(2025, 3, 7, 10))
+        db.close()
+        print("   ✅ 6 записей -> 3 изменения цены")
+
+
+def test_chart_reads_stored_history():
+    """График цен строится по сохраненной истории"""
+    print("🧪 Данные для графика из истории цен...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        generator = PriceChartGenerator(db)
+        assert asyncio.run(generator.get_real_price_data('10')) is None
+
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        db.add_price_record('10', 'Portal', 1000.0, 0, today - timedelta(days=3))
+        db.add_price_record('10', 'Portal', 250.0, 75, today - timedelta(days=1))
+
+        price_data = asyncio.run(generator.get_real_price_data('10'))
+        assert [point['price'] for point in price_data] == [1000.0, 250.0]
+        assert [point['original_price'] for point in price_data] == [1000.0, 1000.0]
+        assert price_data[-1]['date'] == today - timedelta(days=1)
+        assert asyncio.run(generator.get_real_price_data('None')) is None
+        db.close()
+        print(f"   ✅ Точек графика: {len(price_data)}")
+
+
+if __name__ == "__main__":
+    test_writes_only_price_changes()
+    test_precomputed_minimum()
+    test_recent_low_window()
+    test_bulk_extremes_lookup()
+    test_price_series_resolutions()
+    test_retention_keeps_current_price()
+    test_legacy_history_collapsed()
+    test_chart_reads_stored_history()
+    print("\n🎉 Все тесты истории цен пройдены!")
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Тест ограничителя частоты и параллельной проверки цен wishlist без обращения к Steam
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app_metadata_cache import AppMetadataCache
+from database import DatabaseManager
+from rate_limiter import (
+    AdaptiveRateLimiter, TokenBucket, get_host_limiter, parse_retry_after, rate_limit_key, retry_delay
+)
+from steam_wishlist import SteamWishlistParser
+
+
+class FakeResponse:
+    """Минимальный ответ aiohttp на appdetails-запрос цен"""
+
+    def __init__(self, status, app_ids, headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self.content_type = 'application/json'
+        self.app_ids = app_ids
+
+    async def json(self):
+        return {app_id: {'success': True, 'data': {'price_overview': {
+            'currency': 'RUB', 'initial': 100000, 'final': 50000, 'discount_percent': int(app_id) % 100,
+            'initial_formatted': '1000 руб.', 'final_formatted': '500 руб.'
+        }}} for app_id in self.app_ids}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class FakeSession:
+    """Отвечает 429 на первый запрос каждой пачки, затем 200"""
+
+    def __init__(self):
+        self.requests = 0
+        self.seen = set()
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        appids = url.split('appids=')[1].split('&')[0]
+        if appids not in self.seen:
+            self.seen.add(appids)
+            return FakeResponse(429, appids.split(','), headers={'Retry-After': '0'})
+        return FakeResponse(200, appids.split(','))
+
+
+def test_token_bucket_rate():
+    """Token bucket не выпускает больше burst + rate * t запросов"""
+    async def run():
+        bucket = TokenBucket(rate=50, burst=5)
+        started = time.monotonic()
+        for _ in range(30):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    # 5 токенов сразу, остальные 25 со скоростью 50/с -> не меньше 0.5 с
+    assert elapsed >= 0.45
+    print(f"✅ 30 запросов при 50/с и burst 5 заняли {elapsed:.2f}с")
+
+
+def test_aimd_rate_adjustment():
+    """Успешные ответы поднимают частоту до max_rate, 429/5xx снижают ее в разы"""
+    limiter = AdaptiveRateLimiter(rate=4, burst=1, min_rate=1, max_rate=8, increase=1, decrease=0.5)
+    for _ in range(4):
+        limiter.observe(200)
+    # 4 успешных ответа при 4 запросах/с - примерно секунда работы -> +1 запрос/с
+    assert 4.9 < limiter.rate < 5.1
+    for _ in range(1000):
+        limiter.observe(200)
+    assert limiter.rate == 8
+
+    limiter.observe(429)
+    assert limiter.rate == 4
+    # Ответы на запросы, отправленные до снижения, не снижают частоту повторно
+    limiter.observe(503)
+    limiter.observe_error()
+    assert limiter.rate == 4
+    limiter.observe(404)
+    assert limiter.rate == 4
+
+    for _ in range(10):
+        limiter._hold_until = 0
+        limiter.observe(500)
+    assert limiter.rate == 1, "Частота не опускается ниже min_rate"
+    print(f"✅ AIMD: рост до 8/с, снижение до 4/с и не ниже 1/с")
+
+
+def test_retry_after_pauses_limiter():
+    """Retry-After в секундах или HTTP-датой приостанавливает выдачу токенов"""
+    assert parse_retry_after('5') == 5.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    assert 0 <= parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') <= 0.01
+    assert retry_delay('3', base=2, attempt=4) == 3.0
+    assert retry_delay(None, base=2, attempt=2) == 8.0
+
+    async def run():
+        bucket = TokenBucket(rate=1000, burst=10)
+        bucket.observe(429, '1')
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    assert elapsed >= 0.9
+    print(f"✅ Retry-After: 1 приостановил запросы на {elapsed:.2f}с")
+
+
+def test_host_limiters_are_shared():
+    """Один ограничитель на хост: для store, community, Epic и всех хостов GOG"""
+    assert rate_limit_key('https://store.steampowered.com/api/appdetails?appids=1') == 'store.steampowered.com'
+    assert rate_limit_key('https://steamcommunity.com/id/test/?xml=1') == 'steamcommunity.com'
+    assert rate_limit_key('https://store-site-backend-static-ipv4.ak.epicgames.com/freeGamesPromotions') == \
+        'store-site-backend-static.ak.epicgames.com'
+    assert rate_limit_key('https://www.gog.com/games/ajax/filtered') == 'gog'
+    assert rate_limit_key('https://api.gog.com/products') == 'gog'
+
+    store = get_host_limiter('https://store.steampowered.com/search/results/')
+    assert store is get_host_limiter('store.steampowered.com')
+    assert store is not get_host_limiter('https://steamcommunity.com/')
+    assert get_host_limiter('https://steamcommunity.com/').rate < store.rate
+    assert SteamWishlistParser().price_limiter is store
+    print("✅ Ограничители общие для всех модулей, обращающихся к хосту")
+
+
+def test_limiter_shared_between_threads_and_loops():
+    """Ограничитель работает из потоков и из разных event loop"""
+    bucket = TokenBucket(rate=100, burst=1)
+    started = time.monotonic()
+    threads = [threading.Thread(target=bucket.acquire_blocking) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    async def run():
+        await asyncio.gather(*(bucket.acquire() for _ in range(5)))
+
+    for _ in range(2):
+        asyncio.run(run())
+    elapsed = time.monotonic() - started
+    # 1 токен сразу, остальные 19 со скоростью 100/с
+    assert elapsed >= 0.17
+    print(f"✅ 20 запросов из потоков и двух event loop заняли {elapsed:.2f}с")
+
+
+def test_price_fetch_ordered_with_429_retry():
+    """Цены возвращаются в порядке app_ids пачками, 429 повторяется"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AppMetadataCache(DatabaseManager(os.path.join(tmp, 'test.db')))
+        parser = SteamWishlistParser(metadata_cache=cache)
+        parser.price_limiter = TokenBucket(rate=1000, burst=100)
+        parser.session = FakeSession()
+        app_ids = [str(app_id) for app_id in range(600, 0, -1)]
+
+        results = asyncio.run(parser.fetch_price_infos(app_ids))
+
+    assert [r['discount_percent'] for r in results] == [int(a) % 100 for a in app_ids]
+    # 600 игр / 50 в пачке = 12 запросов, каждый повторен один раз после 429
+    assert parser.session.requests == 12 * 2
+    print(f"✅ {len(app_ids)} цен получены по порядку за {parser.session.requests} запросов")
+
+
+class CountingBucket(TokenBucket):
+    """Token bucket, считающий выданные токены"""
+
+    def __init__(self):
+        super().__init__(rate=1000, burst=100)
+        self.acquired = 0
+
+    async def acquire(self):
+        self.acquired += 1
+        await super().acquire()
+
+
+class FakeNameResponse(FakeResponse):
+    """Ответ appdetails с названием игры"""
+
+    async def json(self):
+        return {app_id: {'success': True, 'data': {'name': f"Game {app_id}", 'genres': []}}
+                for app_id in self.app_ids}
+
+
+class FakeNameSession:
+    def __init__(self):
+        self.requests = 0
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        return FakeNameResponse(200, [url.split('appids=')[1].split('&')[0]])
+
+
+def test_game_names_spend_one_token_per_request():
+    """Запрос названия тратит один токен ограничителя, а не два"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = AppMetadataCache(DatabaseManager(os.path.join(tmp, 'test.db')))
+        parser = SteamWishlistParser(metadata_cache=cache)
+        parser.price_limiter = CountingBucket()
+        parser.session = FakeNameSession()
+        app_ids = [str(app_id) for app_id in range(1, 21)]
+
+        names = asyncio.run(parser.get_game_names(app_ids))
+
+    assert names == {app_id: f"Game {app_id}" for app_id in app_ids}
+    assert parser.session.requests == 20
+    assert parser.price_limiter.acquired == 20
+    print(f"✅ {len(names)} названий за {parser.price_limiter.acquired} токенов")
+
+
+def test_bulk_prices_skip_free_games():
+    """Бесплатные игры (data: []) и неизвестные ID дают None"""
+    parser = SteamWishlistParser()
+    assert parser._parse_price_overview('10', {'success': True, 'data': []}) is None
+    assert parser._parse_price_overview('10', {'success': False}) is None
+    assert parser._parse_price_overview('10', None) is None
+    print("✅ Игры без price_overview пропущены")
+
+
+if __name__ == "__main__":
+    test_token_bucket_rate()
+    test_aimd_rate_adjustment()
+    test_retry_after_pauses_limiter()
+    test_host_limiters_are_shared()
+    test_limiter_shared_between_threads_and_loops()
+    test_price_fetch_ordered_with_429_retry()
+    test_game_names_spend_one_token_per_request()
+    test_bulk_prices_skip_free_games()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Тест планировщика периодических задач
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from async_database import AsyncDatabase
+from database import DatabaseManager
+from scheduler import AsyncScheduler, CronTrigger, IntervalTrigger
+
+MSK = ZoneInfo("Europe/Moscow")
+
+
+def test_cron_trigger():
+    """Cron-расписание дайджеста: воскресенье 18:00 МСК"""
+    trigger = CronTrigger("0 18 * * 0", timezone=MSK)
+
+    friday = datetime(2025, 8, 1, 12, 0, tzinfo=MSK).timestamp()
+    assert datetime.fromtimestamp(trigger.next_after(friday), MSK) == datetime(2025, 8, 3, 18, 0, tzinfo=MSK)
+
+    sunday_evening = datetime(2025, 8, 3, 18, 0, tzinfo=MSK).timestamp()
+    assert datetime.fromtimestamp(trigger.next_after(sunday_evening), MSK) == datetime(2025, 8, 10, 18, 0, tzinfo=MSK)
+
+    every_15 = CronTrigger("*/15 9-10 1 * *", timezone=MSK)
+    start = datetime(2025, 8, 1, 10, 50, tzinfo=MSK).timestamp()
+    assert datetime.fromtimestamp(every_15.next_after(start), MSK) == datetime(2025, 9, 1, 9, 0, tzinfo=MSK)
+    print("✅ Cron-расписание считается верно")
+
+
+def test_catch_up_and_persisted_next_run():
+    """Пропущенный запуск выполняется один раз, следующее время сохраняется"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        # Бот был выключен во время запуска задач
+        db.save_scheduled_job('missed', time.time() - 3600)
+        db.save_scheduled_job('skipped', time.time() - 3600)
+        async_db = AsyncDatabase(db)
+        runs = []
+
+        async def job():
+            runs.append('missed')
+
+        async def run():
+            scheduler = AsyncScheduler(async_db)
+            scheduler.add_job('missed', job, IntervalTrigger(hours=6))
+            scheduler.add_job('skipped', lambda: runs.append('skipped'), IntervalTrigger(hours=6), catch_up=False)
+            await scheduler.start()
+            await asyncio.sleep(0.1)
+            await scheduler.stop()
+            await async_db.close()
+
+        asyncio.run(run())
+
+        assert runs == ['missed']
+        saved = db.get_scheduled_jobs()
+        assert saved['missed'] > time.time() + 5 * 3600
+        assert saved['skipped'] > time.time() + 5 * 3600
+        print("✅ Пропущенная задача догнана, расписание сохранено")
+
+
+def test_overlapping_run_skipped():
+    """Запуск задачи, которая еще выполняется, пропускается"""
+    with tempfile.TemporaryDirectory() as tmp:
+        async_db = AsyncDatabase(DatabaseManager(os.path.join(tmp, 'test.db')))
+        runs = []
+
+        async def slow_job():
+            runs.append(1)
+            await asyncio.sleep(0.1)
+
+        async def run():
+            scheduler = AsyncScheduler(async_db)
+            scheduler.add_job('slow', slow_job, IntervalTrigger(hours=1))
+            results = await asyncio.gather(scheduler.run_job('slow'), scheduler.run_job('slow'))
+            await async_db.close()
+            return results
+
+        assert asyncio.run(run()) == [True, False]
+        assert runs == [1]
+        print("✅ Наложение запусков предотвращено")
+
+
+if __name__ == "__main__":
+    test_cron_trigger()
+    test_catch_up_and_persisted_next_run()
+    test_overlapping_run_skipped()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Тест параллельного обхода страниц поиска SteamScraper без обращения к Steam
+"""
+
+import asyncio
+import json
+import os
+import re
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import MAX_SEARCH_PAGES, SEARCH_CONCURRENCY, SEARCH_PAGE_SIZE
+from rate_limiter import TokenBucket
+from steam_scraper import SteamScraper
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_fixtures', 'steam_search', 'specials_page_1.json')
+
+
+class FakeResponse:
+    def __init__(self, status, payload):
+        self.status = status
+        self.payload = payload
+        self.headers = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def read(self):
+        return json.dumps(self.payload).encode('utf-8')
+
+
+class FakeSession:
+    """Отдает сохраненную страницу поиска и считает одновременные запросы"""
+
+    def __init__(self, total_count, rate_limited_starts=()):
+        with open(FIXTURE, encoding='utf-8') as fp:
+            self.page = json.load(fp)
+        self.page['total_count'] = total_count
+        self.rate_limited_starts = set(rate_limited_starts)
+        self.starts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def get(self, url, params=None):
+        return self._respond(params['start'])
+
+    def _respond(self, start):
+        session = self
+
+        class Response(FakeResponse):
+            async def __aenter__(self):
+                session.in_flight += 1
+                session.max_in_flight = max(session.max_in_flight, session.in_flight)
+                await asyncio.sleep(0.02)
+                session.in_flight -= 1
+                return self
+
+        self.starts.append(start)
+        if start in self.rate_limited_starts:
+            self.rate_limited_starts.discard(start)
+            return Response(429, {})
+        if start >= self.page['total_count']:
+            return Response(200, {'results_html': '', 'total_count': self.page['total_count']})
+        return Response(200, self.page)
+
+
+class FakeCatalogSession:
+    """
+    Каталог скидок из сохраненных строк поиска, отдаваемый постранично
+    В порядке релевантности или по убыванию скидки - в зависимости от sort_by
+    """
+
+    def __init__(self, copies=20):
+        rows = []
+        for name in ('specials_page_1.json', 'specials_page_2.json'):
+            with open(os.path.join(os.path.dirname(FIXTURE), name), encoding='utf-8') as fp:
+                rows.extend(re.split(r'\n(?=<a )', json.load(fp)['results_html']))
+        self.rows = [(row, int(re.search(r'data-discount="(\d+)"', row).group(1))) for row in rows] * copies
+        self.starts = []
+
+    def get(self, url, params=None):
+        self.starts.append(params['start'])
+        rows = self.rows
+        if params['sort_by'] == 'Discount_DESC':
+            rows = sorted(rows, key=lambda row: row[1], reverse=True)
+        page = rows[params['start']:params['start'] + params['count']]
+        return FakeResponse(200, {'results_html': '\n'.join(row for row, _ in page), 'total_count': len(rows)})
+
+
+def make_scraper(session):
+    scraper = SteamScraper()
+    scraper.session = session
+    scraper.search_limiter = TokenBucket(rate=1000, burst=100)
+    return scraper
+
+
+def test_crawls_pages_concurrently():
+    """Первая страница дает total_count, остальные запрашиваются параллельно"""
+    print("🧪 Параллельный обход страниц...")
+    session = FakeSession(total_count=SEARCH_PAGE_SIZE * 5)
+    games = asyncio.run(make_scraper(session)._fetch_discounted_games(min_discount=0, max_results=10000))
+
+    assert session.starts[0] == 0
+    assert sorted(session.starts) == [SEARCH_PAGE_SIZE * i for i in range(5)]
+    assert 1 < session.max_in_flight <= SEARCH_CONCURRENCY
+    assert len(games) == 50 * 5
+    assert games == sorted(games, key=lambda game: game['discount'], reverse=True)
+    print(f"   ✅ Страниц: {len(session.starts)}, одновременно: {session.max_in_flight}")
+
+
+def test_respects_page_limit_and_early_stop():
+    """Не больше MAX_SEARCH_PAGES страниц и остановка после max_results игр"""
+    print("🧪 Ограничение числа страниц...")
+    session = FakeSession(total_count=100000)
+    asyncio.run(make_scraper(session)._fetch_discounted_games(min_discount=0, max_results=100000))
+    assert len(session.starts) == MAX_SEARCH_PAGES
+
+    session = FakeSession(total_count=100000)
+    games = asyncio.run(make_scraper(session)._fetch_discounted_games(min_discount=0, max_results=60))
+    assert len(games) == 60
+    # Первая страница + не больше одной волны параллельных запросов
+    assert len(session.starts) <= 1 + SEARCH_CONCURRENCY
+    print(f"   ✅ Для 60 игр запрошено страниц: {len(session.starts)}")
+
+
+def test_retries_rate_limited_page():
+    """Ответ 429 приостанавливает запросы и страница запрашивается повторно"""
+    print("🧪 Повтор после 429...")
+    session = FakeSession(total_count=SEARCH_PAGE_SIZE * 2, rate_limited_starts=[SEARCH_PAGE_SIZE])
+    scraper = make_scraper(session)
+    # Не ждем реальную паузу после 429
+    scraper.search_limiter.pause = lambda seconds: None
+    games = asyncio.run(scraper._fetch_discounted_games(min_discount=0, max_results=10000))
+    assert session.starts.count(SEARCH_PAGE_SIZE) == 2
+    assert len(games) == 100
+    print("   ✅ Страница получена со второй попытки")
+
+
+def test_sorted_results_stop_below_threshold():
+    """При сортировке по скидке обход останавливается на странице ниже порога"""
+    print("🧪 Остановка на странице ниже порога скидки...")
+    session = FakeCatalogSession()
+    scraper = make_scraper(session)
+    games = asyncio.run(scraper._fetch_discounted_games(min_discount=85, max_results=10000))
+
+    assert games and all(game['discount'] >= 85 for game in games)
+    expected = sum(1 for _, discount in session.rows if discount >= 85)
+    assert len(games) == expected, "Все подходящие игры должны быть найдены"
+    assert len(session.starts) < MAX_SEARCH_PAGES
+    print(f"   ✅ Игр от 85%: {len(games)}, страниц: {len(session.starts)}, байт: {scraper.bytes_fetched}")
+
+
+def test_unsorted_results_are_crawled_fully():
+    """Если Steam не отсортировал результаты, ранняя остановка не срабатывает"""
+    print("🧪 Обход без сортировки...")
+    session = FakeCatalogSession()
+    session.get = lambda url, params=None, get=session.get: get(url, dict(params, sort_by='_ASC'))
+    asyncio.run(make_scraper(session)._fetch_discounted_games(min_discount=85, max_results=10000))
+    assert len(session.starts) == MAX_SEARCH_PAGES
+    print(f"   ✅ Страниц: {len(session.starts)}")
+
+
+if __name__ == "__main__":
+    test_crawls_pages_concurrently()
+    test_respects_page_limit_and_early_stop()
+    test_retries_rate_limited_page()
+    test_sorted_results_stop_below_threshold()
+    test_unsorted_results_are_crawled_fully()
+    print("\n🎉 Все тесты обхода страниц поиска пройдены!")
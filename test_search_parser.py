@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Тест бэкендов разбора результатов поиска Steam на сохраненных страницах
+Быстрый бэкенд (lxml) должен давать те же строки, что и BeautifulSoup
+"""
+
+import glob
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from search_parser import BeautifulSoupSearchParser, LXML_AVAILABLE, get_search_parser
+from steam_scraper import SteamScraper
+from free_games_parser import FreeGamesParser
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_fixtures', 'steam_search')
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as fp:
+        return json.load(fp)['results_html']
+
+
+def test_backends_parity():
+    """Все бэкенды разбирают корпус одинаково"""
+    print("🧪 Сравнение бэкендов на сохраненных страницах...")
+    if not LXML_AVAILABLE:
+        print("   ⚠️ lxml не установлен, сравнивать не с чем")
+        return
+
+    fixtures = sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.json')))
+    assert fixtures, "Нет сохраненных страниц поиска"
+
+    fast = get_search_parser('lxml')
+    reference = BeautifulSoupSearchParser()
+    for path in fixtures:
+        html = load_fixture(os.path.basename(path))
+        fast_rows = fast.parse(html)
+        reference_rows = reference.parse(html)
+        assert fast_rows, f"{path}: нет строк"
+        assert fast_rows == reference_rows, f"{path}: результаты бэкендов различаются"
+        print(f"   ✅ {os.path.basename(path)}: {len(fast_rows)} строк совпадают")
+
+
+def test_row_fields():
+    """Скидка, цены, платформы и жанры разбираются из разной разметки"""
+    print("🧪 Разбор полей строк...")
+    rows = get_search_parser().parse(load_fixture('free_games.json'))
+    by_title = {row['title']: row for row in rows}
+
+    assert by_title['Dota 2']['app_id'] == 570
+    assert by_title['Dota 2']['price_text'] == 'Free to Play'
+    assert by_title['Dota 2']['platforms'] == ['Windows']
+
+    bundle = by_title['Valve CompletePack']
+    assert bundle['app_id'] == 0
+    assert bundle['discount'] == 92
+    assert bundle['original_price'] == '10 490 pуб.'
+    assert bundle['discounted_price'] == '839 pуб.'
+
+    # Строка без названия пропускается
+    assert all(row['url'] != 'https://store.steampowered.com/sub/12345/' for row in rows)
+
+    legacy = get_search_parser().parse(load_fixture('legacy_markup.json'))
+    assert any(row['genres'] for row in legacy)
+    assert all(row['app_id'] for row in legacy), "app_id должен извлекаться из URL"
+    print("   ✅ Поля разобраны верно")
+
+
+def test_scraper_and_free_games_filters():
+    """Фильтры скрапера и парсера бесплатных игр работают со строками поиска"""
+    print("🧪 Фильтрация строк поиска...")
+    rows = get_search_parser().parse(load_fixture('specials_page_1.json'))
+
+    scraper = SteamScraper()
+    deals = [game for game in (scraper._filter_search_row(row, 50) for row in rows) if game]
+    assert deals and all(game['discount'] >= 50 for game in deals)
+    assert all('price_text' not in game for game in deals)
+
+    free_rows = get_search_parser().parse(load_fixture('free_games.json'))
+    free_games = [game for game in (FreeGamesParser()._parse_steam_free_game(row) for row in free_rows) if game]
+    titles = [game['title'] for game in free_games]
+    assert 'Paid Game' not in titles
+    assert 'Warframe' in titles
+    print(f"   ✅ Скидок от 50%: {len(deals)}, бесплатных игр: {len(free_games)}")
+
+
+if __name__ == "__main__":
+    test_backends_parity()
+    test_row_fields()
+    test_scraper_and_free_games_filters()
+    print("\n🎉 Все тесты разбора результатов поиска пройдены!")
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Тест агрегации еженедельного топа в памяти с сохранением в базу по таймеру
+"""
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import weekly_top
+from async_database import AsyncDatabase
+from database import DatabaseManager
+from weekly_top import WeeklyTopAggregator
+
+
+def game(title, score, discount=50, price=499.0):
+    return {'title': title, 'discount': discount, 'price': price, 'score': score}
+
+
+class CountingDatabase:
+    """Считает записи топа в базу"""
+
+    def __init__(self, async_db):
+        self.async_db = async_db
+        self.writes = 0
+
+    def __getattr__(self, name):
+        return getattr(self.async_db, name)
+
+    async def replace_weekly_top(self, week_start, games):
+        self.writes += 1
+        return await self.async_db.replace_weekly_top(week_start, games)
+
+
+def test_keeps_top_k_in_memory():
+    """В памяти остаются лучшие игры, повторы игры не дублируются"""
+    print("🧪 Топ-K в памяти...")
+    aggregator = WeeklyTopAggregator(async_db=None, size=5)
+    games = [game(f'Game {i}', score) for i, score in enumerate(random.Random(3).sample(range(1000), 200))]
+
+    async def run():
+        await aggregator.add(games)
+        await aggregator.add([game('Game 0', 5000), game('Game 0', 1)])
+
+    asyncio.run(run())
+    ranked = aggregator.ranked()
+    expected = sorted(games, key=lambda g: g['score'], reverse=True)[:4]
+    assert [g['title'] for g in ranked] == ['Game 0'] + [g['title'] for g in expected]
+    assert ranked[0]['score'] == 5000
+    print("   ✅ Топ-5 из 200 игр посчитан верно")
+
+
+def test_flushes_once_per_interval():
+    """Частые обновления не пишут в базу, сохранение - одной транзакцией"""
+    print("🧪 Сохранение топа в базу...")
+    with tempfile.TemporaryDirectory() as tmp:
+        async_db = AsyncDatabase(DatabaseManager(os.path.join(tmp, 'test.db')))
+        counting_db = CountingDatabase(async_db)
+
+        async def run():
+            aggregator = WeeklyTopAggregator(counting_db, size=3)
+            for i in range(100):
+                await aggregator.add([game(f'Game {i % 10}', i)])
+            assert counting_db.writes == 0, "Обновления топа не должны писать в базу"
+
+            assert await aggregator.flush()
+            assert not await aggregator.flush(), "Неизмененный топ повторно не сохраняется"
+            stored = await async_db.get_weekly_top_games(10)
+
+            # После перезапуска топ восстанавливается из базы
+            restored = WeeklyTopAggregator(counting_db, size=3)
+            await restored.load()
+            await async_db.close()
+            return stored, restored.ranked()
+
+        stored, restored = asyncio.run(run())
+
+    assert counting_db.writes == 1
+    assert [g['title'] for g in stored] == ['Game 9', 'Game 8', 'Game 7']
+    assert [g['score'] for g in stored] == [99, 98, 97]
+    assert [g['title'] for g in restored] == ['Game 9', 'Game 8', 'Game 7']
+    print("   ✅ 100 обновлений - одна запись в базу")
+
+
+def test_new_week_flushes_previous_top():
+    """При смене недели топ прошлой недели сохраняется, новый начинается с нуля"""
+    print("🧪 Смена недели...")
+    with tempfile.TemporaryDirectory() as tmp:
+        async_db = AsyncDatabase(DatabaseManager(os.path.join(tmp, 'test.db')))
+        original = weekly_top.current_week_start
+
+        async def run():
+            weekly_top.current_week_start = lambda: '2026-10-05'
+            aggregator = WeeklyTopAggregator(async_db, size=3)
+            await aggregator.add([game('Old Game', 90)])
+
+            weekly_top.current_week_start = lambda: '2026-10-12'
+            await aggregator.add([game('New Game', 10)])
+            await aggregator.flush()
+
+            previous = await async_db.get_weekly_top_games(5, '2026-10-05')
+            latest = await async_db.get_weekly_top_games(5)
+            await async_db.close()
+            return previous, latest
+
+        try:
+            previous, latest = asyncio.run(run())
+        finally:
+            weekly_top.current_week_start = original
+
+    assert [g['title'] for g in previous] == ['Old Game']
+    assert [g['title'] for g in latest] == ['New Game'], "Дайджест читает последнюю неделю"
+    print("   ✅ Недели хранятся раздельно")
+
+
+def test_concurrent_adds_at_week_rollover():
+    """Два параллельных add при смене недели не теряют игры новой недели"""
+    print("🧪 Параллельные add при смене недели...")
+    with tempfile.TemporaryDirectory() as tmp:
+        async_db = AsyncDatabase(DatabaseManager(os.path.join(tmp, 'test.db')))
+        original = weekly_top.current_week_start
+
+        class SlowDatabase(CountingDatabase):
+            async def replace_weekly_top(self, week_start, games):
+                # Запись старой недели долгая: второй add успевает начаться
+                await asyncio.sleep(0.05)
+                return await super().replace_weekly_top(week_start, games)
+
+        async def run():
+            weekly_top.current_week_start = lambda: '2026-10-05'
+            db = SlowDatabase(async_db)
+            aggregator = WeeklyTopAggregator(db, size=3)
+            await aggregator.add([game('Old Game', 90)])
+
+            weekly_top.current_week_start = lambda: '2026-10-12'
+            await asyncio.gather(
+                aggregator.add([game('First', 50)]),
+                aggregator.add([game('Second', 40)])
+            )
+            titles = [g['title'] for g in aggregator.ranked()]
+            await async_db.close()
+            return titles, db.writes
+
+        try:
+            titles, writes = asyncio.run(run())
+        finally:
+            weekly_top.current_week_start = original
+
+    assert titles == ['First', 'Second'], titles
+    assert writes == 1, "Топ прошлой недели сохраняется один раз"
+    print("   ✅ Обе игры новой недели в топе")
+
+
+def test_reset_clears_only_sent_week():
+    """Сброс после дайджеста очищает только свою неделю"""
+    print("🧪 Сброс топа после дайджеста...")
+    with tempfile.TemporaryDirectory() as tmp:
+        async_db = AsyncDatabase(DatabaseManager(os.path.join(tmp, 'test.db')))
+        original = weekly_top.current_week_start
+
+        async def run():
+            weekly_top.current_week_start = lambda: '2026-10-05'
+            aggregator = WeeklyTopAggregator(async_db, size=3)
+            await aggregator.add([game('Old Game', 90)])
+            await aggregator.flush()
+
+            weekly_top.current_week_start = lambda: '2026-10-12'
+            await aggregator.add([game('New Game', 10)])
+            await aggregator.flush()
+            await asyncio.gather(aggregator.reset(), aggregator.flush())
+
+            previous = await async_db.get_weekly_top_games(5, '2026-10-05')
+            latest = await async_db.get_weekly_top_games(5, '2026-10-12')
+            await async_db.close()
+            return previous, latest, aggregator.ranked()
+
+        try:
+            previous, latest, ranked = asyncio.run(run())
+        finally:
+            weekly_top.current_week_start = original
+
+    assert [g['title'] for g in previous] == ['Old Game'], "Топы других недель не удаляются"
+    assert latest == [] and ranked == []
+    print("   ✅ Очищена только отправленная неделя")
+
+
+def test_add_weekly_top_game_keeps_best_entry():
+    """Повторное добавление игры не создает дубликатов"""
+    print("🧪 Добавление игры в топ без дубликатов...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'test.db'))
+        db.add_weekly_top_game('Portal', 50, 199.0, 70)
+        db.add_weekly_top_game('Portal', 75, 99.0, 90)
+        db.add_weekly_top_game('Portal', 30, 299.0, 40)
+        top = db.get_weekly_top_games(10)
+        db.close()
+
+    assert top == [{'title': 'Portal', 'discount': 75, 'price': '99.0', 'score': 90}]
+    print("   ✅ В топе одна лучшая запись игры")
+
+
+if __name__ == "__main__":
+    test_keeps_top_k_in_memory()
+    test_flushes_once_per_interval()
+    test_new_week_flushes_previous_top()
+    test_concurrent_adds_at_week_rollover()
+    test_reset_clears_only_sent_week()
+    test_add_weekly_top_game_keeps_best_entry()
+    print("\n🎉 Все тесты еженедельного топа пройдены!")
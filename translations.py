@@ -149,12 +149,14 @@ TRANSLATIONS = {
         'digest_data_found': '✅ Найдено {count} игр в базе:',
         'sending_digest': '📤 Отправляю еженедельный дайджест всем подписчикам...',
         'digest_sent': '✅ Еженедельный дайджест отправлен!',
+        'digest_skipped': '⏳ Рассылка дайджеста уже идет, повторный запуск пропущен.',
         'digest_error': '❌ Ошибка при тестировании дайджеста.',
         'digest_send_error': '❌ Ошибка при отправке дайджеста.',
         
         # Прочее
         'free_games_title': '🎁 <b>Актуальные бесплатные раздачи:</b>',
         'current_deals': '🔥 <b>Текущие скидки от {min_discount}%:</b>',
+        'new_deals_broadcast': '🔔 <b>Новые скидки в Steam!</b>',
         'game_ends': 'До: ',
         'forever_free': 'Навсегда',
         'original_price': 'Обычная цена: ',
@@ -263,6 +265,7 @@ TRANSLATIONS = {
         'digest_data_found': '✅ Found {count} games in database:',
         'sending_digest': '📤 Sending weekly digest to all subscribers...',
         'digest_sent': '✅ Weekly digest sent!',
+        'digest_skipped': '⏳ The weekly digest is already being sent, this run was skipped.',
         'digest_error': '❌ Error testing digest.',
         'digest_send_error': '❌ Error sending digest.',
         
@@ -311,6 +314,7 @@ TRANSLATIONS = {
         # Miscellaneous
         'free_games_title': '🎁 <b>Current free giveaways:</b>',
         'current_deals': '🔥 <b>Current deals from {min_discount}%:</b>',
+        'new_deals_broadcast': '🔔 <b>New Steam deals!</b>',
         'game_ends': 'Until: ',
         'forever_free': 'Forever',
         'original_price': 'Regular price: ',
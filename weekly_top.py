@@ -0,0 +1,130 @@
+"""
+Агрегация еженедельного топа игр
+Рейтинг игр недели накапливается в памяти (куча из WEEKLY_TOP_SIZE лучших
+игр) и сбрасывается в таблицу weekly_top одной транзакцией по таймеру,
+поэтому частые вызовы /deals не пишут в базу. Дайджест читает уже
+упорядоченный топ из weekly_top
+"""
+import asyncio
+import heapq
+import logging
+from typing import Dict, Iterable, List, Tuple
+
+from config import WEEKLY_TOP_SIZE
+from database import current_week_start
+
+logger = logging.getLogger(__name__)
+
+
+def _rank_key(game: Dict) -> Tuple[float, int, str]:
+    """Порядок в топе: рейтинг, затем скидка"""
+    return game['score'] or 0, game['discount'] or 0, game['title']
+
+
+class WeeklyTopAggregator:
+    """Топ-K игр текущей недели в памяти с периодическим сохранением в базу"""
+
+    def __init__(self, async_db, size: int = WEEKLY_TOP_SIZE):
+        self.async_db = async_db
+        self.size = size
+        self.week_start = current_week_start()
+        # Мин-куча ключей рейтинга: в вершине - худшая игра топа
+        self._heap: List[Tuple[float, int, str]] = []
+        self._games: Dict[str, Dict] = {}
+        self._dirty = False
+        self._flush_lock = asyncio.Lock()
+
+    def _reset(self, week_start: str):
+        self.week_start = week_start
+        self._heap = []
+        self._games = {}
+        self._dirty = False
+
+    def _offer(self, game: Dict) -> bool:
+        """Добавляет игру в топ, если она туда попадает; True - топ изменился"""
+        key = _rank_key(game)
+        title = game['title']
+
+        current = self._games.get(title)
+        if current is not None:
+            if key <= _rank_key(current):
+                return False
+            # Игра уже в топе с меньшим рейтингом: топ маленький, проще пересобрать кучу
+            self._games[title] = game
+            self._heap = [_rank_key(existing) for existing in self._games.values()]
+            heapq.heapify(self._heap)
+            return True
+
+        if len(self._heap) < self.size:
+            heapq.heappush(self._heap, key)
+        elif key > self._heap[0]:
+            evicted = heapq.heapreplace(self._heap, key)
+            del self._games[evicted[2]]
+        else:
+            return False
+
+        self._games[title] = game
+        return True
+
+    async def add(self, games: Iterable[Dict]):
+        """
+        Учитывает оцененные игры: {'title', 'discount', 'price', 'score'}
+
+        При смене недели топ прошлой недели сначала сохраняется в базу.
+        """
+        week_start = current_week_start()
+        if week_start != self.week_start:
+            async with self._flush_lock:
+                # Параллельный add мог сменить неделю, пока мы ждали блокировку:
+                # повторный сброс потерял бы уже учтенные им игры новой недели
+                if week_start != self.week_start:
+                    await self._flush_locked()
+                    self._reset(week_start)
+
+        for game in games:
+            if self._offer(game):
+                self._dirty = True
+
+    def ranked(self) -> List[Dict]:
+        """Игры топа по убыванию рейтинга"""
+        return sorted(self._games.values(), key=_rank_key, reverse=True)
+
+    async def load(self):
+        """Восстанавливает топ текущей недели из базы после перезапуска"""
+        games = await self.async_db.get_weekly_top_games(self.size, self.week_start)
+        for game in games:
+            self._offer(game)
+        logger.info(f"Loaded {len(games)} weekly top games for week of {self.week_start}")
+
+    async def flush(self) -> bool:
+        """
+        Сохраняет топ в базу, если он изменился с прошлого сохранения
+
+        Returns:
+            True, если топ был записан
+        """
+        async with self._flush_lock:
+            return await self._flush_locked()
+
+    async def _flush_locked(self) -> bool:
+        """Сохранение топа; вызывается под _flush_lock"""
+        if not self._dirty:
+            return False
+        self._dirty = False
+        week_start = self.week_start
+        games = self.ranked()
+        if not await self.async_db.replace_weekly_top(week_start, games):
+            self._dirty = True
+            return False
+        logger.info(f"Flushed {len(games)} weekly top games for week of {week_start}")
+        return True
+
+    async def reset(self):
+        """
+        Очищает топ после отправки дайджеста - в памяти и в базе
+
+        Под _flush_lock: параллельный flush не запишет очищенный топ обратно.
+        """
+        async with self._flush_lock:
+            await self.async_db.clear_weekly_top(self.week_start)
+            self._reset(current_week_start())
@@ -50,11 +50,12 @@ def toggle_full_check_mode(enable=True):
 def show_current_settings():
     """Показывает текущие настройки"""
     try:
-        from config import WISHLIST_MAX_GAMES_CHECK, WISHLIST_CHECK_DELAY, WISHLIST_ENABLE_FULL_CHECK
+        from config import WISHLIST_MAX_GAMES_CHECK, HOST_RATE_LIMITS, WISHLIST_PRICE_CONCURRENCY, WISHLIST_ENABLE_FULL_CHECK
         
+        start_rate, _, max_rate, _ = HOST_RATE_LIMITS['store.steampowered.com']
         print("📋 Текущие настройки Wishlist:")
         print(f"   Максимальное количество игр: {WISHLIST_MAX_GAMES_CHECK}")
-        print(f"   Задержка между проверками: {WISHLIST_CHECK_DELAY} сек")
+        print(f"   Частота запросов цен: от {start_rate} до {max_rate} в сек, параллельно: {WISHLIST_PRICE_CONCURRENCY}")
         print(f"   Полная проверка: {'✅ Включена' if WISHLIST_ENABLE_FULL_CHECK else '❌ Выключена'}")
         
         if WISHLIST_ENABLE_FULL_CHECK: